@@ -0,0 +1,142 @@
+GTIN_LENGTHS = (8, 12, 13, 14)
+GTIN14_LENGTH = 14
+
+def gtinCheckDigit(digits):
+    """Calculates the GS1 check digit for the digits of a GTIN, not including the check digit itself.
+
+    Args:
+        digits (string): Digits to calculate the check digit for.
+
+    Returns:
+        int: Returns the check digit, from 0 to 9.
+    """
+    # Weights alternate 3, 1, ... starting from the digit next to the check digit.
+    digits = digits[::-1]
+    total = 3 * sum(map(int, digits[0::2])) + sum(map(int, digits[1::2]))
+    return (10 - total % 10) % 10
+
+def isValidGtin(barcode):
+    """Checks if a barcode is a GTIN-8, UPC-A, EAN-13 or GTIN-14 with a correct check digit.
+
+    Args:
+        barcode (string): Barcode to check. Surrounding whitespace is ignored.
+
+    Returns:
+        bool: Returns True if the barcode is a valid GTIN.
+    """
+    if not isinstance(barcode, str): return False
+
+    barcode = barcode.strip()
+    if len(barcode) not in GTIN_LENGTHS or not barcode.isdigit() or not barcode.isascii(): return False
+
+    return gtinCheckDigit(barcode[:-1]) == int(barcode[-1])
+
+def canonicalBarcode(barcode):
+    """Converts a barcode into the key used to match its variants. Valid GTINs are zero padded to GTIN-14, so the same item
+        scanned as UPC-A, EAN-13 or GTIN-14 gets one key. Any other barcode, including a GTIN with a wrong check digit,
+        is only stripped of whitespace.
+
+    Args:
+        barcode (string): Barcode to convert.
+
+    Returns:
+        string: Returns the canonical barcode.
+    """
+    barcode = barcode.strip()
+    if isValidGtin(barcode): return barcode.zfill(GTIN14_LENGTH)
+    return barcode
+
+def gtinVariants(barcode):
+    """Lists the barcodes a GTIN could be stored under, from its GTIN-14 down to the shortest GTIN length its leading zeros
+        allow, so a food can be found by any variant of its barcode with a few lookups rather than an index of every barcode.
+
+    Args:
+        barcode (string): Barcode to list the variants of.
+
+    Returns:
+        list: Returns the variants, longest first, not including the barcode itself. Empty if the barcode is not a valid GTIN.
+    """
+    barcode = barcode.strip()
+    if not isValidGtin(barcode): return []
+
+    key = barcode.zfill(GTIN14_LENGTH)
+    return [key[-length:] for length in reversed(GTIN_LENGTHS)
+            if length != len(barcode) and key[:-length].strip("0") == ""]
+
+
+class BarcodeIndex(object):
+    def __init__(self):
+        """Creates a new BarcodeIndex object. Maps the canonical form of each stored barcode to the barcode it is stored under,
+            so a food can be found by any variant of its barcode. The index starts out empty and unbuilt, see build().
+        """
+        self.clear()
+
+    def clear(self):
+        """Empties the index and marks it unbuilt.
+        """
+        self.built = False
+
+        # Canonical barcode to stored barcode, and any further stored barcodes sharing the same canonical barcode.
+        self.keys = {}
+        self.duplicates = {}
+
+    def build(self, barcodes):
+        """Replaces the contents of the index.
+
+        Args:
+            barcodes (iterable): Stored barcodes.
+        """
+        self.clear()
+
+        for barcode in barcodes:
+            self._add(barcode)
+
+        self.built = True
+
+    def _add(self, barcode):
+        key = canonicalBarcode(barcode)
+        storedBarcode = self.keys.setdefault(key, barcode)
+
+        if storedBarcode != barcode:
+            self.duplicates.setdefault(key, set()).add(barcode)
+
+    def add(self, barcode):
+        """Adds a stored barcode. Does nothing until the index is built.
+        """
+        if not self.built: return
+        self._add(barcode)
+
+    def remove(self, barcode):
+        """Removes a stored barcode. Does nothing if the barcode is not in the index.
+        """
+        key = canonicalBarcode(barcode)
+        duplicates = self.duplicates.get(key)
+
+        if self.keys.get(key) == barcode:
+            if duplicates:
+                self.keys[key] = duplicates.pop()
+            else:
+                del self.keys[key]
+        elif duplicates:
+            duplicates.discard(barcode)
+
+        if duplicates is not None and len(duplicates) <= 0: del self.duplicates[key]
+
+    def find(self, barcode):
+        """Looks up the stored barcode of any variant of a barcode.
+
+        Args:
+            barcode (string): Barcode to find.
+
+        Returns:
+            string: Returns the stored barcode. Returns None if no stored barcode shares its canonical barcode.
+        """
+        return self.keys.get(canonicalBarcode(barcode))
+
+    def findDuplicates(self):
+        """Returns the stored barcodes that are variants of each other.
+
+        Returns:
+            dict: Dictionary of canonical barcode to a sorted list of the two or more stored barcodes sharing it.
+        """
+        return {key: sorted(duplicates | {self.keys[key]}) for key, duplicates in self.duplicates.items()}
@@ -0,0 +1,429 @@
+"""Benchmarks for CaloriePal's storage and data handling.
+
+Usage:
+    python benchmarks.py <benchmark> [--count N]
+"""
+import argparse
+import gc
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from barcodes import canonicalBarcode
+from caloriePal import CaloriePal, Food, ServingUomRegistry
+from foodBrowser import FoodBrowserView
+from foodColumns import FoodColumns
+from foodImporter import FoodImporter
+from foodRecordEdits import diffFoodRecords
+from foodSchema import OPEN_FOOD_FACTS_SCHEMA
+from foodStorage import FILE_FORMATS, COMPRESSIONS, JsonFoodStorage
+from uomConversion import MASS
+
+BENCHMARK_BRANDS = ["Acme", "Golden Farms", "Blue Ridge", "Harvest", "Sunny Day", "Northwind", "Maple Grove", "Red Barn"]
+BENCHMARK_FLAVOURS = ["Original", "Honey", "Chocolate", "Strawberry", "Sea Salt", "Garlic", "Vanilla", "Spicy", "Lemon", "Cheddar"]
+BENCHMARK_PRODUCTS = ["Peanut Butter", "Granola Bar", "Oat Cereal", "Potato Chips", "Yogurt", "Crackers", "Ice Cream",
+                      "Almond Milk", "Pasta Sauce", "Cookies", "Trail Mix", "Rice Cakes", "Salsa", "Bagels", "Soup"]
+
+BENCHMARK_UOMS = [
+    {'name': 'Grams', 'code': 'g'},
+    {'name': 'Pounds', 'code': 'lbs'},
+    {'name': 'Ounce', 'code': 'oz'}
+]
+
+def makeFoodData(count):
+    """Creates a synthetic catalog laid out like a food data file.
+
+    Args:
+        count (int): Number of foods to create.
+
+    Returns:
+        dict: Dictionary with a 'servingUoms' list and a 'foodData' dict of barcode to record.
+    """
+    foodData = {}
+
+    for x in range(count):
+        brand = BENCHMARK_BRANDS[x % len(BENCHMARK_BRANDS)]
+        flavour = BENCHMARK_FLAVOURS[(x // 3) % len(BENCHMARK_FLAVOURS)]
+        product = BENCHMARK_PRODUCTS[(x // 30) % len(BENCHMARK_PRODUCTS)]
+
+        foodData[f"{x:012d}"] = {
+            'description': f"{brand} {flavour} {product}",
+            'detailedDescription': f"{flavour} {product.lower()} made by {brand}, product number {x}.",
+            'caloriesPerServing': (x * 37) % 900,
+            'servingSize': 10 + (x * 13) % 240,
+            'servingSizeUom': dict(BENCHMARK_UOMS[x % len(BENCHMARK_UOMS)])
+        }
+
+    return {'servingUoms': [dict(uom) for uom in BENCHMARK_UOMS], 'foodData': foodData}
+
+@contextmanager
+def catalogDirectory(count, settings=None):
+    """Creates a temporary working directory holding a synthetic FoodData.json and Settings.json,
+        so CaloriePal objects created inside the with block load the synthetic catalog.
+
+    Args:
+        count (int): Number of foods in the catalog.
+        settings (dict, optional): Settings to write to Settings.json. Defaults to None.
+    """
+    previousDirectory = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            JsonFoodStorage("FoodData.json").writeSnapshot(makeFoodData(count))
+
+            with open("Settings.json", mode="w") as f:
+                f.write(json.dumps(settings or {}))
+
+            yield directory
+        finally:
+            os.chdir(previousDirectory)
+
+def timeCall(function, *args):
+    """Calls a function and returns a tuple of (result, seconds taken).
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return (result, time.perf_counter() - start)
+
+def benchmarkFileFormats(count):
+    """Compares file size, save time and load time of every food data file format and compression.
+    """
+    data = makeFoodData(count)
+    print(f"{count} foods")
+    print(f"{'format':<12}{'compression':<13}{'size (KiB)':>12}{'save (s)':>10}{'load (s)':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for fileFormat in FILE_FORMATS:
+            for compression in COMPRESSIONS:
+                filePath = os.path.join(directory, f"FoodData-{fileFormat}-{compression}.json")
+                storage = JsonFoodStorage(filePath, fileFormat=fileFormat, compression=compression)
+
+                _, saveTime = timeCall(storage.writeSnapshot, data)
+                _, loadTime = timeCall(storage.read)
+                size = os.path.getsize(filePath) / 1024
+
+                print(f"{fileFormat:<12}{compression:<13}{size:>12.0f}{saveTime:>10.3f}{loadTime:>10.3f}")
+
+def benchmarkDirtySave(count):
+    """Compares the first save after loading, which encodes every record, with saves after a few changes,
+        which only encode the changed records.
+    """
+    with catalogDirectory(count, {'writeBehindEnabled': False, 'journalEnabled': True, 'foodDataCacheEnabled': False}):
+        calPal = CaloriePal()
+        servingUom = calPal.servingUoms[0]
+
+        _, fullTime = timeCall(calPal.saveFoodDataFile)
+        print(f"{count} foods, first save: {fullTime:.3f}s")
+
+        for changes in (1, 10, 100, 1000):
+            for x in range(changes):
+                calPal.updateFood(Food(f"{x:012d}", f"Changed Food {x}", "Changed.", 100, 50, servingUom))
+
+            _, saveTime = timeCall(calPal.saveFoodDataFile)
+            print(f"save after {changes} changes: {saveTime:.3f}s")
+
+def measureAllocated(function, *args):
+    """Calls a function and returns a tuple of (result, bytes still allocated by it once it returns).
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function(*args)
+        return (result, tracemalloc.get_traced_memory()[0] - before)
+    finally:
+        tracemalloc.stop()
+
+def benchmarkMemory(count):
+    """Compares the memory held per food by Food objects that each own their ServingUom with Food objects
+        sharing one ServingUom per code. Strings are shared with the source records, so only the objects are counted.
+    """
+    records = []
+    for barcode, record in makeFoodData(count)['foodData'].items():
+        record['barcode'] = barcode
+        records.append(record)
+
+    def buildFoods(uomRegistry):
+        return [Food.fromDictionary(record, uomRegistry) for record in records]
+
+    print(f"{count} foods")
+    print(f"{'model':<24}{'bytes per food':>16}")
+
+    for name, uomRegistry in (("Food, own ServingUom", None), ("Food, shared ServingUom", ServingUomRegistry())):
+        result, allocated = measureAllocated(buildFoods, uomRegistry)
+        print(f"{name:<24}{allocated / count:>16.1f}")
+        del result
+
+def benchmarkSearch(count):
+    """Times building the word and trigram search indexes, answering a few typical queries and loading the
+        indexes back from the search index file.
+    """
+    with catalogDirectory(count, {'writeBehindEnabled': False}):
+        calPal = CaloriePal()
+
+        _, buildTime = timeCall(calPal.searchIndex.build, calPal._iterSearchEntries())
+        print(f"{count} foods, word index build: {buildTime:.3f}s, {len(calPal.searchIndex.postings)} terms")
+
+        for query in ("peanut butter", "honey granola acme", "spicy salsa northwind", f"{count // 2}", "chocolate"):
+            results, searchTime = timeCall(calPal.searchFoods, query)
+            print(f"{query!r:<28}{len(results):>4} results {searchTime * 1000:>9.2f}ms")
+
+        entries = ((barcode, description) for barcode, description, detailedDescription in calPal._iterSearchEntries())
+        _, buildTime = timeCall(calPal.fuzzyIndex.build, entries)
+        print(f"trigram index build: {buildTime:.3f}s, {len(calPal.fuzzyIndex.postings)} trigrams")
+
+        for query in ("peanut buter", "choclate cooky", "nortwind salsa", "grnola"):
+            results, searchTime = timeCall(calPal.fuzzySearchFoods, query)
+            print(f"{query!r:<28}{len(results):>4} results {searchTime * 1000:>9.2f}ms")
+
+        for prefix in ("p", "acme ho", "gra"):
+            results, completeTime = timeCall(calPal.completeDescription, prefix)
+            print(f"{prefix!r:<28}{len(results):>4} completions {completeTime * 1000:>5.2f}ms")
+
+        _, saveTime = timeCall(calPal.saveSearchIndexes)
+        size = os.path.getsize(calPal.foodDataFilePath + CaloriePal.SEARCH_INDEX_FILE_SUFFIX) / 1024
+        print(f"index file save: {saveTime:.3f}s, {size:.0f} KiB")
+
+        calPal = CaloriePal()
+        _, loadTime = timeCall(calPal._loadSearchIndexes)
+        print(f"index file load: {loadTime:.3f}s")
+
+def benchmarkRanges(count):
+    """Compares range and top-k queries answered by the sorted numeric indexes with a loop over every food.
+    """
+    with catalogDirectory(count, {'writeBehindEnabled': False, 'journalEnabled': True}):
+        calPal = CaloriePal()
+
+        _, buildTime = timeCall(calPal._prepareNumericIndexes)
+        print(f"{count} foods, numeric index build: {buildTime:.3f}s")
+
+        def loopRange():
+            return [food for food in calPal.foodData.values() if 100 <= float(food.caloriesPerServing) <= 200]
+
+        results, indexTime = timeCall(calPal.findFoodsInRange, "caloriesPerServing", 100, 200)
+        _, loopTime = timeCall(loopRange)
+        print(f"100-200 calories, {len(results)} foods: index {indexTime * 1000:.2f}ms, loop {loopTime * 1000:.2f}ms")
+
+        _, indexTime = timeCall(calPal.countFoodsInRange, "caloriesPerServing", 100, 200)
+        print(f"100-200 calories count: index {indexTime * 1000:.3f}ms")
+
+        results, indexTime = timeCall(calPal.findTopFoods, "caloriesPerGram", 10)
+        print(f"top 10 calorie density: index {indexTime * 1000:.3f}ms")
+
+        servingUom = calPal.servingUoms[0]
+        _, updateTime = timeCall(calPal.updateFood, Food(f"{count // 2:012d}", "Changed", "Changed.", 150, 20, servingUom))
+        print(f"update one food, indexes included: {updateTime * 1000:.3f}ms")
+
+def benchmarkColumns(count):
+    """Compares aggregates over the columnar view with the same aggregates computed by a loop over Food objects.
+        Foods are built in memory, so large counts do not need a food data file.
+    """
+    servingUoms = ServingUomRegistry.fromDictionaryList(BENCHMARK_UOMS)
+    foods = {}
+    for barcode, record in makeFoodData(count)['foodData'].items():
+        record['barcode'] = barcode
+        foods[barcode] = Food.fromDictionary(record, servingUoms)
+
+    gramRatios = servingUoms.converter().ratiosToBase(MASS)
+    entries = ((barcode, CaloriePal._numericValues(food.caloriesPerServing, food.servingSize, food.servingSizeUom.code, gramRatios))
+               for barcode, food in foods.items())
+
+    columns = FoodColumns(CaloriePal.NUMERIC_FIELDS)
+    _, buildTime = timeCall(columns.build, entries)
+    print(f"{count} foods, {'NumPy' if columns.useNumpy else 'array'} columns, build: {buildTime:.3f}s")
+
+    def columnAggregates():
+        return (columns.mean("caloriesPerServing"), columns.percentiles("caloriesPerGram", (10, 50, 90)),
+                columns.histogram("caloriesPerGram", 20))
+
+    def loopAggregates():
+        calories = []
+        density = []
+        for food in foods.values():
+            calories.append(float(food.caloriesPerServing))
+            if food.servingSizeUom.dimension == MASS and float(food.servingSize) > 0:
+                density.append(float(food.caloriesPerServing) / (float(food.servingSize) * food.servingSizeUom.factor))
+
+        density.sort()
+        low, high = density[0], density[-1]
+        width = (high - low) / 20
+        counts = [0] * 20
+        for value in density:
+            counts[min(int((value - low) / width), 19)] += 1
+
+        percentiles = [density[int((len(density) - 1) * percent / 100)] for percent in (10, 50, 90)]
+        return (sum(calories) / len(calories), percentiles, counts)
+
+    _, columnTime = timeCall(columnAggregates)
+    _, loopTime = timeCall(loopAggregates)
+    print(f"mean, percentiles and histogram: columns {columnTime:.3f}s, object loop {loopTime:.3f}s")
+
+    _, updateTime = timeCall(columns.update, f"{count // 2:012d}", (150, 20, 7.5))
+    print(f"update one row: {updateTime * 1000:.3f}ms")
+
+def benchmarkBarcodes(count):
+    """Compares finding foods by another variant of their barcode with a scan of every barcode, and times building the
+        canonical barcode index behind findDuplicateBarcodes() and re-keying to GTIN-14.
+    """
+    with catalogDirectory(count, {'writeBehindEnabled': False, 'journalEnabled': True}):
+        calPal = CaloriePal()
+
+        # Catalog barcodes are 12 digits, so zero padding one gives the EAN-13 variant when it is a valid UPC-A.
+        variants = ["0" + barcode for barcode in list(calPal.foodData)[::max(1, count // 1000)] if canonicalBarcode(barcode) != barcode]
+
+        def indexLookups():
+            return [calPal.findFoodDataByBarcode(variant) for variant in variants]
+
+        def scanLookups():
+            return [next((barcode for barcode in calPal.foodData if canonicalBarcode(barcode) == canonicalBarcode(variant)), None)
+                    for variant in variants[:10]]
+
+        results, indexTime = timeCall(indexLookups)
+        _, scanTime = timeCall(scanLookups)
+        print(f"{len(variants)} variant lookups, {sum(1 for food in results if food is not None)} found: "
+              f"lookup {indexTime * 1000 / max(1, len(variants)):.4f}ms each, scan {scanTime * 1000 / min(10, max(1, len(variants))):.2f}ms each")
+
+        _, buildTime = timeCall(calPal._prepareBarcodeIndex)
+        print(f"{count} foods, barcode index build: {buildTime:.3f}s")
+
+        rekeyed, rekeyTime = timeCall(calPal.canonicalizeBarcodes)
+        print(f"re-key {rekeyed[0]} foods to GTIN-14: {rekeyTime:.3f}s")
+
+def loadFoodData(calPal):
+    for progress in calPal.readFoodDataFileIncrementally():
+        pass
+
+def benchmarkIncrementalLoad(count):
+    """Loads the catalog on a worker thread with readFoodDataFileIncrementally() while the main thread ticks every 10ms,
+        as the Tk event loop would, and reports the longest the main thread was kept waiting.
+    """
+    with catalogDirectory(count, {'foodDataFileFormat': "compact"}):
+        for run in ("first load", "second load"):
+            calPal = CaloriePal(readFoodData=False)
+            loader = threading.Thread(target=loadFoodData, args=(calPal,))
+
+            longestTick = 0
+            startTime = time.perf_counter()
+
+            # Collection is paused from the main thread while the loader runs, as the GUI does.
+            gc.disable()
+            try:
+                loader.start()
+
+                lastTick = time.perf_counter()
+                while loader.is_alive():
+                    time.sleep(0.01)
+                    now = time.perf_counter()
+                    longestTick = max(longestTick, now - lastTick - 0.01)
+                    lastTick = now
+            finally:
+                gc.freeze()
+                gc.enable()
+
+            print(f"{run}, cache {calPal.foodDataCacheStatus}: {time.perf_counter() - startTime:.2f}s, "
+                  f"longest main thread stall {longestTick * 1000:.0f}ms")
+
+def benchmarkRecordPages(count):
+    """Times opening the raw food data viewer on its first and last page and jumping to a barcode, for each way the food
+        data can be held, compares a page with dumping the whole catalog as the viewer used to, and times saving
+        a one line edit of a page.
+    """
+    for name, settings in (("in memory", {}), ("lazy JSON", {'lazyLoading': True}), ("SQLite", {'storageBackend': "sqlite"})):
+        with catalogDirectory(count, {'writeBehindEnabled': False, 'journalEnabled': True, **settings}):
+            calPal = CaloriePal()
+
+            total, countTime = timeCall(len, calPal.foodData)
+            lastBarcode = next(iter(calPal.getFoodRecordsPage(total - 1, 1)))
+
+            pageText, firstTime = timeCall(lambda: json.dumps(calPal.getFoodRecordsPage(0), indent=4))
+            _, lastTime = timeCall(lambda: json.dumps(calPal.getFoodRecordsPage(total - CaloriePal.RECORDS_PAGE_SIZE), indent=4))
+            _, jumpTime = timeCall(calPal.findFoodPosition, lastBarcode)
+
+            print(f"{name}, {total} foods: count {countTime * 1000:.2f}ms, first page {firstTime * 1000:.2f}ms, "
+                  f"last page {lastTime * 1000:.2f}ms, find last barcode {jumpTime * 1000:.2f}ms, page text {len(pageText) / 1024:.0f}KB")
+
+            shownRecords = calPal.getFoodRecordsPage(0)
+            editedText = pageText.replace('"caloriesPerServing": 0,', '"caloriesPerServing": 1,', 1)
+
+            changes, diffTime = timeCall(diffFoodRecords, calPal, shownRecords, editedText)
+            _, applyTime = timeCall(changes.apply, calPal)
+            print(f"one line edit: {len(changes)} change(s), parse and compare {diffTime * 1000:.2f}ms, apply {applyTime * 1000:.2f}ms")
+
+            if name == "in memory":
+                dumpText, dumpTime = timeCall(lambda: json.dumps(calPal.getFoodDataJson(), indent=4))
+                print(f"whole catalog: {dumpTime:.3f}s, text {len(dumpText) / 1024 / 1024:.0f}MB")
+
+            calPal.storage.close()
+
+def benchmarkBrowser(count):
+    """Times the food browser's sort orders, first read and read again, and its search steps as a query is typed.
+    """
+    with catalogDirectory(count, {'writeBehindEnabled': False}):
+        calPal = CaloriePal()
+
+        for field in CaloriePal.SORT_FIELDS:
+            _, buildTime = timeCall(calPal.getSortOrder, field)
+            _, sortTime = timeCall(calPal.getSortOrder, field, True)
+            print(f"{count} foods, sort by {field}: first {buildTime * 1000:.0f}ms, again {sortTime * 1000:.1f}ms")
+
+        view = FoodBrowserView(calPal)
+        for query in ("c", "ch", "che", "ched"):
+            view.search(query)
+            longestStep = 0
+            finished = False
+
+            startTime = time.perf_counter()
+            while not finished:
+                finished, stepTime = timeCall(view.searchStep)
+                longestStep = max(longestStep, stepTime)
+
+            print(f"search '{query}': {len(view)} found, {(time.perf_counter() - startTime) * 1000:.0f}ms, "
+                  f"longest step {longestStep * 1000:.1f}ms")
+
+def benchmarkParallelParsing(count):
+    """Times loading the catalog with the cache off and importing a TSV file of the same size, with 1, 2 and 4 worker
+        processes, and reports the CPU time this process spent, which is the part that does not shrink with more workers.
+    """
+    for workers in (1, 2, 4):
+        with catalogDirectory(count, {'foodDataCacheEnabled': False, 'foodDataFileFormat': "compact", 'loadWorkers': workers}):
+            cpuStart = time.process_time()
+            calPal, loadTime = timeCall(CaloriePal)
+            print(f"{workers} worker(s), load {len(calPal.foodData)} foods: {loadTime:.2f}s, "
+                  f"CPU in this process {time.process_time() - cpuStart:.2f}s")
+
+        with catalogDirectory(0, {'writeBehindEnabled': False}):
+            with open("Import.tsv", mode="w", encoding="utf-8") as f:
+                f.write("code\tproduct_name\tgeneric_name\tenergy-kcal_100g\n")
+                for x in range(count):
+                    f.write(f"{x:013d}\t{BENCHMARK_PRODUCTS[x % len(BENCHMARK_PRODUCTS)]}\tProduct number {x}\t{(x * 37) % 900}\n")
+
+            importer = FoodImporter(CaloriePal(), OPEN_FOOD_FACTS_SCHEMA, workers=workers)
+            cpuStart = time.process_time()
+            result = importer.importFile("Import.tsv")
+            print(f"{workers} worker(s), import {result}, CPU in this process {time.process_time() - cpuStart:.2f}s")
+
+BENCHMARKS = {
+    'formats': benchmarkFileFormats,
+    'save': benchmarkDirtySave,
+    'memory': benchmarkMemory,
+    'search': benchmarkSearch,
+    'ranges': benchmarkRanges,
+    'columns': benchmarkColumns,
+    'barcodes': benchmarkBarcodes,
+    'loading': benchmarkIncrementalLoad,
+    'pages': benchmarkRecordPages,
+    'browser': benchmarkBrowser,
+    'parallel': benchmarkParallelParsing
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs CaloriePal benchmarks.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--count", type=int, default=100000, help="Number of foods in the synthetic catalog.")
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](args.count)
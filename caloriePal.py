@@ -1,37 +1,82 @@
+import bisect
+import csv
+import gc
 import json
+import logging
 import os
 import os.path
+import sys
+import itertools
+import multiprocessing
+import operator
+import threading
+from collections.abc import MutableMapping, Sequence
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+from barcodes import BarcodeIndex, canonicalBarcode, gtinVariants
+from foodColumns import FoodColumns
+from foodDataCache import FoodDataCache
+from foodDataSaver import FoodDataSaver
+from foodJournal import FoodJournal
+from foodSearch import FoodFuzzyIndex, FoodSearchIndex, SortedValueIndex
+from foodStorage import NORMALIZED_LAYOUT, FoodStorage, migrateJsonToSqlite, readRecordRange
+from uomConversion import MASS, UomConverter, standardConversion, toNumber, validateConversion
+
+logger = logging.getLogger(__name__)
 
 class ServingUom(object):
     REQUIRED_KEYS = ["name", "code"]
 
-    def __init__(self, name, code):
+    __slots__ = ("name", "code", "dimension", "factor")
+
+    def __init__(self, name, code, dimension=None, factor=None):
         """Creates a new ServingUom object.
 
         Args:
             name (string): Name for the UOM.
             code (string)): UOM abbreviation.
+            dimension (string, optional): What the UOM measures, one of uomConversion.DIMENSIONS.
+                Defaults to None, which looks the code up in uomConversion.STANDARD_CONVERSIONS.
+            factor (float, optional): Size of one unit in the base unit of its dimension, grams, millilitres or items.
+                Required with dimension. Defaults to None.
+
+        Raises:
+            ValueError: Raised if dimension or factor are not valid, see uomConversion.validateConversion().
         """
-        self.name = name
-        self.code = code
+        # Names and codes repeat across every food of the catalog, interning keeps a single copy of each.
+        self.name = sys.intern(name) if isinstance(name, str) else name
+        self.code = sys.intern(code) if isinstance(code, str) else code
+
+        if dimension is None and factor is None:
+            dimension, factor = standardConversion(code)
+        validateConversion(dimension, factor)
+
+        self.dimension = dimension
+        self.factor = factor
 
     @classmethod
-    def fromDictionary(cls, data):
+    def fromDictionary(cls, data, registry=None):
         """Creates a new ServingUom object from a dictionary.
 
         Args:
-            data (dict): Dictionary containing a 'name' and 'code' key value pair.
+            data (dict): Dictionary containing a 'name' and 'code' key value pair, and optionally a 'dimension' and 'factor'.
+            registry (ServingUomRegistry, optional): When provided, the shared object for the code is returned
+                instead of a new one, and new UOMs are shared through it. Defaults to None.
 
         Raises:
             TypeError: Raised if object provided is not of type dict().
             KeyError: Raised if a required key is missing.
 
         Returns:
-            ServingUom Object: Returns a new ServingUom object.
+            ServingUom Object: Returns a new ServingUom object, or the registered one for its code.
         """
         if not isinstance(data, dict):
             raise TypeError("data must be of type dict().")
-        
+
+        if registry is not None:
+            servingUom = registry.getShared(data.get('code'))
+            if servingUom is not None: return servingUom
+
         missingKeys = []
         for requiredKey in cls.REQUIRED_KEYS:
             if requiredKey not in data.keys():
@@ -41,8 +86,13 @@ class ServingUom(object):
 
         name = data['name']
         code = data['code']
+        dimension = data.get('dimension')
+        factor = data.get('factor')
 
-        return ServingUom(name, code)
+        servingUom = ServingUom(name, code, dimension, factor)
+        if registry is not None: servingUom = registry.share(servingUom)
+
+        return servingUom
     
     @classmethod
     def fromDictionaryList(cls, dataList):
@@ -71,27 +121,181 @@ class ServingUom(object):
         return toReturn
 
     @staticmethod
-    def toDict(servingUom):
+    def toDict(servingUom, includeConversion=True):
         """Converts ServingUom object attributes into key: value pairs.
 
         Args:
             servingUom (ServingUom Object): ServingUom object to convert.
+            includeConversion (bool, optional): Adds the 'dimension' and 'factor' keys when set True and the UOM
+                can be converted. Defaults to True.
 
         Returns:
             dict: ServingUom object attributes as key: value pairs.
         """
-        objData = {}
         if not isinstance(servingUom, ServingUom): raise TypeError("food must be of type ServingUom().")
 
-        for item in vars(servingUom):
-            objData[item] = getattr(servingUom, item)
+        objData = {'name': servingUom.name, 'code': servingUom.code}
+        if includeConversion and servingUom.dimension is not None:
+            objData['dimension'] = servingUom.dimension
+            objData['factor'] = servingUom.factor
         return objData
 
 
 
+class ServingUomRegistry(Sequence):
+    def __init__(self, servingUoms=()):
+        """Creates an ordered collection of the serving UOMs a user can pick from, indexed by name, code and position.
+            It also holds the single shared ServingUom object for every UOM code used by a food, including codes
+            found on food records but missing from the list.
+
+        Args:
+            servingUoms (iterable, optional): ServingUom objects to add, in order. Defaults to ().
+
+        Raises:
+            ValueError: Raised if two UOMs share a name or code.
+        """
+        self._uoms = []
+        self._byName = {}
+        self._byCode = {}
+        self._positions = {}
+        self._shared = {}
+        self._names = None
+        self._converter = None
+
+        for servingUom in servingUoms:
+            self.add(servingUom)
+
+    @classmethod
+    def fromDictionaryList(cls, dataList):
+        """Creates a new ServingUomRegistry from a dictionary list.
+
+        Args:
+            dataList (list): List of dictionaries containing a 'name' and 'code' key value pair.
+
+        Raises:
+            ValueError: Raised if two UOMs share a name or code. See also ServingUom.fromDictionaryList().
+
+        Returns:
+            ServingUomRegistry Object: Returns a new ServingUomRegistry object.
+        """
+        return cls(ServingUom.fromDictionaryList(dataList))
+
+    def __getitem__(self, index):
+        return self._uoms[index]
+
+    def __len__(self):
+        return len(self._uoms)
+
+    def __iter__(self):
+        return iter(self._uoms)
+
+    def __contains__(self, servingUom):
+        return isinstance(servingUom, ServingUom) and self._byCode.get(servingUom.code) is servingUom
+
+    def index(self, servingUom, start=0, stop=None):
+        """Returns the position of a UOM in the list.
+
+        Raises:
+            ValueError: Raised if the UOM is not in the list.
+        """
+        if servingUom not in self: raise ValueError(f"{servingUom!r} is not in the registry.")
+
+        position = self._positions[servingUom.code]
+        if position < start or (stop is not None and position >= stop): raise ValueError(f"{servingUom!r} is not in the registry.")
+        return position
+
+    def findByName(self, name):
+        """Returns the UOM with the name provided. Returns None if not found.
+        """
+        return self._byName.get(name)
+
+    def findByCode(self, code):
+        """Returns the UOM with the code provided. Returns None if not found.
+        """
+        return self._byCode.get(code)
+
+    def names(self):
+        """Returns a tuple of the UOM names in list order. The tuple is kept until the list changes.
+        """
+        if self._names is None:
+            self._names = tuple(servingUom.name for servingUom in self._uoms)
+        return self._names
+
+    def add(self, servingUom):
+        """Appends a UOM to the list.
+
+        Args:
+            servingUom (ServingUom Object): UOM to add.
+
+        Raises:
+            TypeError: Raised if object passed is not of type ServingUom().
+            ValueError: Raised if a UOM with the same name or code is already in the list.
+        """
+        if not isinstance(servingUom, ServingUom): raise TypeError("Must be of class ServingUom()")
+        if servingUom.name in self._byName or servingUom.code in self._byCode:
+            raise ValueError(f"A UOM with the name '{servingUom.name}' or code '{servingUom.code}' already exists.")
+
+        self._positions[servingUom.code] = len(self._uoms)
+        self._uoms.append(servingUom)
+        self._byName[servingUom.name] = servingUom
+        self._byCode[servingUom.code] = servingUom
+        self._shared.setdefault(servingUom.code, servingUom)
+        self._names = None
+        self._converter = None
+
+    def truncate(self, length):
+        """Removes every UOM after the first length UOMs of the list. Used to undo UOMs added by a failed batch.
+
+        Args:
+            length (int): Number of UOMs to keep.
+        """
+        for servingUom in self._uoms[length:]:
+            del self._byName[servingUom.name]
+            del self._byCode[servingUom.code]
+            del self._positions[servingUom.code]
+            if self._shared.get(servingUom.code) is servingUom: del self._shared[servingUom.code]
+
+        del self._uoms[length:]
+        self._names = None
+        self._converter = None
+
+    def getShared(self, code):
+        """Returns the shared ServingUom object for a code. Returns None if no food or list entry uses the code yet.
+        """
+        return self._shared.get(code)
+
+    def share(self, servingUom):
+        """Returns the shared ServingUom object with the same code, making the one provided the shared object
+            if the code is new. Does not add it to the list.
+
+        Args:
+            servingUom (ServingUom Object): UOM a food is about to hold.
+
+        Returns:
+            ServingUom Object: Returns the shared object for the UOM's code.
+        """
+        shared = self._shared.setdefault(servingUom.code, servingUom)
+        if shared is servingUom: self._converter = None
+        return shared
+
+    def converter(self):
+        """Returns a UomConverter covering every UOM in the list and every shared UOM. The converter, and the
+            conversion matrix it precomputes, is kept until a UOM is added.
+
+        Returns:
+            UomConverter Object: Returns the converter.
+        """
+        if self._converter is None:
+            self._converter = UomConverter(itertools.chain(self._uoms, list(self._shared.values())))
+        return self._converter
+
+
+
 class Food(object):
     REQUIRED_KEYS = ["barcode", "description", "detailedDescription", "caloriesPerServing", "servingSize", "servingSizeUom"]
 
+    __slots__ = ("barcode", "description", "detailedDescription", "caloriesPerServing", "servingSize", "servingSizeUom")
+
     def __init__(self, barcode, description, detailedDescription, caloriesPerServing, servingSize, servingSizeUom):
         """Creates a new Food object.
 
@@ -113,11 +317,13 @@ class Food(object):
         self.servingSizeUom = servingSizeUom
 
     @classmethod
-    def fromDictionary(cls, data):
+    def fromDictionary(cls, data, uomRegistry=None):
         """Creates a new Food object from a dictionary.
 
         Args:
             data (dict): Dictionary containing all required key value pairs.
+            uomRegistry (ServingUomRegistry, optional): Registry to share ServingUom objects through, so foods with
+                the same UOM hold a single ServingUom object. See ServingUom.fromDictionary(). Defaults to None.
 
         Raises:
             TypeError: Raised if object provided is not of type dict().
@@ -141,7 +347,7 @@ class Food(object):
         detailedDescription = data['detailedDescription']
         caloriesPerServing = data['caloriesPerServing']
         servingSize = data['servingSize']
-        servingSizeUom = ServingUom.fromDictionary(data['servingSizeUom'])
+        servingSizeUom = ServingUom.fromDictionary(data['servingSizeUom'], uomRegistry)
 
         return Food(barcode, description, detailedDescription, caloriesPerServing, servingSize, servingSizeUom)
     
@@ -180,21 +386,227 @@ class Food(object):
         Returns:
             dict: Food object attributes as key: value pairs.
         """
-        objData = {}
         if not isinstance(food, Food): raise TypeError("food must be of type Food().")
 
-        for item in vars(food):
-            if item == "servingSizeUom":
-                objData[item] = ServingUom.toDict(getattr(food, item))
-            else:
-                objData[item] = getattr(food, item)
-        
-        if removeBarcode:
-            objData.pop("barcode", None)
+        objData = {}
+        if not removeBarcode:
+            objData['barcode'] = food.barcode
+
+        objData['description'] = food.description
+        objData['detailedDescription'] = food.detailedDescription
+        objData['caloriesPerServing'] = food.caloriesPerServing
+        objData['servingSize'] = food.servingSize
+        # Conversions are kept once in the 'servingUoms' list rather than repeated in every food.
+        objData['servingSizeUom'] = ServingUom.toDict(food.servingSizeUom, includeConversion=False)
         return objData
     
             
 
+class LazyFoodData(MutableMapping):
+    def __init__(self, records, uomRegistry=None):
+        """Creates a dictionary-like view of food records that only creates a Food object when a barcode is first accessed.
+            Foods keep the order of the records, with foods added since the records were read after them.
+
+        Args:
+            records (Mapping): Mapping of barcode to record, as stored by a FoodStorage backend. Must also provide
+                iterRecords(), count(), page() and position() methods, see JsonRecordIndex.
+            uomRegistry (ServingUomRegistry, optional): Registry sharing ServingUom objects between the foods created.
+                See Food.fromDictionary(). Defaults to None.
+        """
+        self.records = records
+        self.uomRegistry = uomRegistry
+        self._foods = {}
+        # Barcodes of records hidden by a removal, and of foods added that are not among the records, in the order added.
+        self._removed = set()
+        self._added = {}
+        # Number of foods, kept as foods are added and removed so len() does not have to count the records.
+        self._count = records.count()
+
+    def __getitem__(self, barcode):
+        if barcode in self._foods: return self._foods[barcode]
+        if barcode in self._removed: raise KeyError(barcode)
+
+        foodObjData = dict(self.records[barcode])
+        foodObjData['barcode'] = barcode
+
+        food = Food.fromDictionary(foodObjData, self.uomRegistry)
+        self._foods[barcode] = food
+        return food
+
+    def __setitem__(self, barcode, food):
+        if barcode not in self: self._count += 1
+
+        self._removed.discard(barcode)
+        if barcode not in self.records: self._added[barcode] = None
+        self._foods[barcode] = food
+
+    def __delitem__(self, barcode):
+        if barcode not in self: raise KeyError(barcode)
+        self._count -= 1
+
+        self._foods.pop(barcode, None)
+        self._added.pop(barcode, None)
+        if barcode in self.records: self._removed.add(barcode)
+
+    def __contains__(self, barcode):
+        if barcode in self._foods: return True
+        if barcode in self._removed: return False
+        return barcode in self.records
+
+    def __iter__(self):
+        removed = set(self._removed)
+        for barcode in self.records:
+            if barcode not in removed:
+                yield barcode
+
+        yield from self._addedBarcodes()
+
+    def __len__(self):
+        return self._count
+
+    def _addedBarcodes(self):
+        """Returns the barcodes of foods added that are not among the records. Records written since may hold some of them.
+        """
+        return [barcode for barcode in self._added if barcode not in self.records]
+
+    def _removedPositions(self):
+        """Returns the sorted positions among the records of the records hidden by a removal.
+        """
+        return sorted(position for position in map(self.records.position, self._removed) if position is not None)
+
+    def page(self, offset, limit):
+        """Returns the barcodes of a run of foods in the order of iteration. Only the records on the page are read,
+            so a page costs about the same wherever it is.
+
+        Args:
+            offset (int): Position of the first food.
+            limit (int): Most barcodes to return.
+
+        Returns:
+            list: Returns a list of barcodes.
+        """
+        removedPositions = self._removedPositions()
+
+        # Position among the records of the food at offset, stepping over the records removed before it.
+        start = offset
+        for position in removedPositions:
+            if position > start: break
+            start += 1
+
+        barcodes = [barcode for barcode in self.records.page(start, limit + len(removedPositions)) if barcode not in self._removed]
+        del barcodes[limit:]
+
+        if len(barcodes) < limit:
+            addedStart = max(0, offset - (self.records.count() - len(removedPositions)))
+            barcodes.extend(self._addedBarcodes()[addedStart:addedStart + limit - len(barcodes)])
+
+        return barcodes
+
+    def position(self, barcode):
+        """Returns the position of a food in the order of iteration. Returns None if the barcode is not found.
+        """
+        if barcode not in self: return None
+
+        removedPositions = self._removedPositions()
+        position = self.records.position(barcode)
+
+        if position is not None: return position - bisect.bisect_left(removedPositions, position)
+        return self.records.count() - len(removedPositions) + self._addedBarcodes().index(barcode)
+
+    def getRecord(self, barcode):
+        """Returns the record of a food without creating a Food object if it was never accessed.
+
+        Raises:
+            KeyError: Raised if the barcode is not found.
+
+        Returns:
+            dict: Returns a record formatted like Food.toDict().
+        """
+        if barcode in self._foods: return Food.toDict(self._foods[barcode])
+        if barcode in self._removed: raise KeyError(barcode)
+        return dict(self.records[barcode])
+
+    def iterRecords(self):
+        """Iterates over every food as a record without creating Food objects for foods that were never accessed.
+
+        Yields:
+            tuple: Returns (barcode, record) pairs, where record is formatted like Food.toDict().
+        """
+        foods = dict(self._foods)
+
+        for barcode, record in self.records.iterRecords():
+            if barcode in self._removed: continue
+
+            if barcode in foods:
+                yield (barcode, Food.toDict(foods.pop(barcode)))
+            else:
+                yield (barcode, record)
+
+        for barcode, food in foods.items():
+            yield (barcode, Food.toDict(food))
+
+
+def foodsToChunk(foods):
+    """Turns foods into a tuple of plain value columns, the chunks of the food data cache. The chunk lists the UOMs its
+        foods use, and the foods refer to them by position.
+
+    Args:
+        foods (list): List of Food objects.
+
+    Returns:
+        tuple: Returns a tuple of (uomData, barcodes, descriptions, detailedDescriptions, calories, servingSizes, uomIndexes).
+    """
+    uomIndexes = {}
+    for food in foods:
+        uomIndexes.setdefault(id(food.servingSizeUom), (len(uomIndexes), food.servingSizeUom))
+    uomData = [ServingUom.toDict(servingUom) for _, servingUom in uomIndexes.values()]
+
+    return (uomData, [food.barcode for food in foods], [food.description for food in foods],
+            [food.detailedDescription for food in foods], [food.caloriesPerServing for food in foods],
+            [food.servingSize for food in foods], [uomIndexes[id(food.servingSizeUom)][0] for food in foods])
+
+def chunkToFoods(chunk, servingUoms):
+    """Turns a chunk made by foodsToChunk() back into foods.
+
+    Args:
+        chunk (tuple): Chunk returned by foodsToChunk().
+        servingUoms (ServingUomRegistry Object): Registry the UOMs of the foods are shared through.
+
+    Returns:
+        iterator: Returns (barcode, food) pairs.
+    """
+    uomData, barcodes, descriptions, detailedDescriptions, calories, servingSizes, uomIndexes = chunk
+    uoms = [ServingUom.fromDictionary(data, servingUoms) for data in uomData]
+    foods = map(Food, barcodes, descriptions, detailedDescriptions, calories, servingSizes, map(uoms.__getitem__, uomIndexes))
+    return zip(barcodes, foods)
+
+def _parseFoodDataRange(filePath, start, end, servingUomData, layout, chunkSize):
+    """Parses and validates a range of a food data file in a worker process, see CaloriePal._parseFoodDataInParallel().
+        The foods are sent back as chunks made by foodsToChunk(), which are far cheaper to send between processes
+        than Food objects.
+
+    Returns:
+        list: Returns the chunks of every chunkSize foods of the range.
+    """
+    uomsByCode = {uom['code']: uom for uom in servingUomData} if layout == NORMALIZED_LAYOUT else None
+    servingUoms = ServingUomRegistry.fromDictionaryList(servingUomData)
+    foods = []
+
+    # Every food of the range is kept until it is sent back; pausing the garbage collector meanwhile roughly halves the time taken.
+    gcWasEnabled = gc.isenabled()
+    gc.disable()
+
+    try:
+        for barcode, record in readRecordRange(filePath, start, end, uomsByCode):
+            record['barcode'] = barcode
+            foods.append(Food.fromDictionary(record, servingUoms))
+
+        return [foodsToChunk(foods[position:position + chunkSize]) for position in range(0, len(foods), chunkSize)]
+    finally:
+        if gcWasEnabled: gc.enable()
+
+
+
 class CaloriePal(object):
     DEFAULT_FOOD_SAVE_DATA = {
                         'servingUoms':
@@ -207,22 +619,88 @@ class CaloriePal(object):
     }
 
     DEFAULT_SETTINGS = {
-        'foodDataSaveLocation': ''
+        'foodDataSaveLocation': '',
+        'journalEnabled': False,
+        'storageBackend': 'json',
+        'foodDataCacheEnabled': True,
+        'loadWorkers': 1,
+        'lazyLoading': False,
+        'writeBehindEnabled': True,
+        'foodDataFileFormat': 'pretty',
+        'foodDataFileCompression': 'none',
+        'searchIndexCacheEnabled': True
     }
 
-    def __init__(self):
+    EXPORT_FORMATS = ("ndjson", "csv")
+    EXPORT_CSV_COLUMNS = ("barcode", "description", "detailedDescription", "caloriesPerServing", "servingSize", "servingSizeUomName", "servingSizeUomCode")
+
+    # Foods returned by getFoodRecordsPage() when no count is given.
+    RECORDS_PAGE_SIZE = 100
+
+    SQLITE_FOOD_DATA_FILE_PATH = "FoodData.db"
+    SEARCH_INDEX_FILE_SUFFIX = ".search"
+    # Foods read between each yield of readFoodDataFileIncrementally().
+    LOAD_CHUNK_SIZE = 2000
+    # Ranges of the food data file parsed by each worker process when 'loadWorkers' is above 1, so the ranges stay
+    # balanced between processes that finish at different times.
+    LOAD_RANGES_PER_WORKER = 4
+
+    # Food values kept in sorted indexes for range and top-k queries.
+    NUMERIC_FIELDS = ("caloriesPerServing", "servingSize", "caloriesPerGram")
+    # Fields getSortOrder() can sort by. Descriptions are sorted without regard to case.
+    TEXT_SORT_FIELDS = ("barcode", "description")
+    SORT_FIELDS = TEXT_SORT_FIELDS + NUMERIC_FIELDS
+
+    def __init__(self, readFoodData=True):
         """Creates a CaloriePal object.
+
+        Args:
+            readFoodData (bool, optional): Reads the food data file straight away when True. When False, readFoodDataFile()
+                must be called before the food data is used, such as from a background thread. Defaults to True.
         """
         self.foodData = {}
-        self.servingUoms = []
+        self.servingUoms = ServingUomRegistry()
         self.settings = {}
         self.foodDataFileOk = False
+        # One of 'hit', 'miss' or 'disabled', set each time the food data file is read.
+        self.foodDataCacheStatus = "disabled"
 
         self.foodDataFilePath = "FoodData.json"
         self.settingsFilePath = "Settings.json"
+        self.storage = None
+
+        # Guards foodData and servingUoms against the background saver reading them mid change.
+        self._lock = threading.RLock()
+        self.saver = FoodDataSaver(self._writeFoodDataFile)
+
+        # Each thread's active batch(), see _activeBatch().
+        self._batchState = threading.local()
+
+        # Encoded JSON fragments of records kept between saves, and the barcodes changed since the last save.
+        self._recordEncoder = None
+        self._recordFragments = {}
+        self._dirtyBarcodes = set()
+
+        # Word and trigram indexes over food descriptions. Loaded from the search index file beside the food data file,
+        # or built, on first use and kept up to date as foods change.
+        self.searchIndex = FoodSearchIndex()
+        self.fuzzyIndex = FoodFuzzyIndex()
+        # Sorted index for each of NUMERIC_FIELDS. Built on the first query and kept up to date as foods change.
+        self.numericIndexes = {field: SortedValueIndex() for field in CaloriePal.NUMERIC_FIELDS}
+        # Sorted index for each of TEXT_SORT_FIELDS, the sort orders of a food list. Built on first use and kept up to date.
+        self.textSortIndexes = {field: SortedValueIndex() for field in CaloriePal.TEXT_SORT_FIELDS}
+        # Columnar view of NUMERIC_FIELDS for aggregates. Built on first use and kept up to date as foods change.
+        self.foodColumns = FoodColumns(CaloriePal.NUMERIC_FIELDS)
+        # Canonical barcode of each food, for finding foods stored under more than one variant of a barcode.
+        # Built on first use and kept up to date.
+        self.barcodeIndex = BarcodeIndex()
+
+        # False until a food changes after the food data file is read. While False, the indexes match the stored food data.
+        self._foodDataChangedSinceRead = False
+        self._searchIndexFileChecked = False
 
         self.readSettingsFile()
-        self.readFoodDataFile()
+        if readFoodData: self.readFoodDataFile()
 
     def readSettingsFile(self):
         """Reads settings file saved on disk.
@@ -238,10 +716,16 @@ class CaloriePal(object):
         else:
             data = CaloriePal.DEFAULT_SETTINGS
         
-        self.settings = data
+        self.settings = dict(CaloriePal.DEFAULT_SETTINGS)
+        self.settings.update(data)
 
         if self.settings['foodDataSaveLocation'] != "" and os.path.exists(self.settings['foodDataSaveLocation']):
             self.foodDataFilePath = self.settings['foodDataSaveLocation']
+
+        elif self.settings['storageBackend'] == "sqlite":
+            if not os.path.exists(CaloriePal.SQLITE_FOOD_DATA_FILE_PATH) and os.path.exists(self.foodDataFilePath):
+                migrateJsonToSqlite(self.foodDataFilePath, CaloriePal.SQLITE_FOOD_DATA_FILE_PATH)
+            self.foodDataFilePath = CaloriePal.SQLITE_FOOD_DATA_FILE_PATH
     
     def saveSettingsFile(self):
         """Saves settings data to disk.
@@ -253,34 +737,248 @@ class CaloriePal(object):
             f.write(json.dumps(data))
 
 
+    def openStorage(self):
+        """Opens the storage backend for the current food data file, closing any previously open backend.
+        """
+        if self.storage is not None:
+            self.storage.close()
+
+        self.storage = FoodStorage.forFile(self.foodDataFilePath, self.settings['journalEnabled'], self.settings['lazyLoading'],
+                                           self.settings['foodDataFileFormat'], self.settings['foodDataFileCompression'])
+
     def readFoodDataFile(self):
-        """Reads food data file saved on disk.
+        """Reads food data file saved on disk. Uses the binary snapshot cache when it matches the file on disk,
+            otherwise parses the file and rebuilds the cache.
         """
-        data = {}
+        for progress in self.readFoodDataFileIncrementally():
+            pass
 
-        if os.path.exists(self.foodDataFilePath):
-            with open(self.foodDataFilePath, mode="r") as f:
-                try:
-                    data = json.loads(f.read())
-                    self.foodDataFileOk = True
-                except json.JSONDecodeError:
-                    data = CaloriePal.DEFAULT_FOOD_SAVE_DATA
-                    self.foodDataFileOk = False
-        else:
+    def readFoodDataFileIncrementally(self, chunkSize=LOAD_CHUNK_SIZE):
+        """Reads food data file saved on disk as readFoodDataFile() does, yielding control after every chunk of foods,
+            so a GUI can stay responsive while a large file loads. Run it on a worker thread, or step it with next() from
+            Tk after() callbacks. The food data must not be used until the generator is exhausted.
+
+        Args:
+            chunkSize (int, optional): Number of foods read between yields. Defaults to LOAD_CHUNK_SIZE.
+
+        Yields:
+            float: Returns the fraction of the file read so far, from 0 to 1. The last value is always 1.
+        """
+        # Finish writing to the current file before it is closed or replaced.
+        if self.storage is not None:
+            self.flush()
+
+        self.openStorage()
+        self._recordEncoder = None
+        self._recordFragments = {}
+        self._dirtyBarcodes = set()
+        self.searchIndex.clear()
+        self.fuzzyIndex.clear()
+        for index in self.numericIndexes.values():
+            index.clear()
+        for index in self.textSortIndexes.values():
+            index.clear()
+        self.foodColumns.clear()
+        self.barcodeIndex.clear()
+        self._foodDataChangedSinceRead = False
+        self._searchIndexFileChecked = False
+
+        cache = None
+        fingerprint = None
+        self.foodDataCacheStatus = "disabled"
+        yield 0.0
+
+        if self.settings['foodDataCacheEnabled'] and not self.storage.LAZY_RECORDS and os.path.exists(self.foodDataFilePath):
+            cache = FoodDataCache.forDataFile(self.foodDataFilePath)
+            fingerprint = FoodDataCache.fingerprint(self.foodDataFilePath)
+            yield from self._loadCachedFoodData(cache, fingerprint)
+
+        if self.foodDataCacheStatus != "hit":
+            yield from self._parseFoodData(chunkSize)
+
+            if cache is not None and self.foodDataFileOk:
+                cache.saveChunks(fingerprint, self._iterFoodDataChunks(chunkSize))
+
+        logger.info("Food data cache %s for '%s'.", self.foodDataCacheStatus, self.foodDataFilePath)
+
+        self.replayJournal()
+        yield 1.0
+
+    def _loadCachedFoodData(self, cache, fingerprint):
+        """Loads the food data from the cache a chunk at a time, see _iterFoodDataChunks(). Sets foodDataCacheStatus.
+
+        Yields:
+            float: Returns the fraction of the cache read so far.
+        """
+        servingUoms = None
+        foodData = {}
+
+        try:
+            for chunk, progress in cache.loadChunks(fingerprint):
+                if servingUoms is None:
+                    servingUoms = ServingUomRegistry.fromDictionaryList(chunk)
+                else:
+                    foodData.update(chunkToFoods(chunk, servingUoms))
+                yield progress
+        except (KeyError, TypeError, ValueError, IndexError):
+            servingUoms = None
+
+        if servingUoms is None:
+            self.foodDataCacheStatus = "miss"
+            return
+
+        self.foodData = foodData
+        self.servingUoms = servingUoms
+        self.foodDataFileOk = True
+        self.foodDataCacheStatus = "hit"
+
+    def _iterFoodDataChunks(self, chunkSize):
+        """Splits the food data for the cache into plain values, the serving UOM list first and then a chunk made by
+            foodsToChunk() for every chunkSize foods.
+        """
+        yield [ServingUom.toDict(servingUom) for servingUom in self.servingUoms]
+
+        foods = iter(self.foodData.values())
+        while True:
+            chunk = list(itertools.islice(foods, chunkSize))
+            if len(chunk) <= 0: return
+
+            yield foodsToChunk(chunk)
+
+    def _parseFoodData(self, chunkSize=LOAD_CHUNK_SIZE):
+        """Reads food data from the storage backend and builds Food and ServingUom objects from it a record at a time,
+            or in a process pool when the 'loadWorkers' setting is above 1 and the backend can split its records.
+            Lazily loaded food data and files that can not be read are handled by _readFoodData().
+
+        Yields:
+            float: Returns the fraction of the file read, after every chunkSize foods.
+        """
+        if self.settings['loadWorkers'] > 1 and not self.storage.LAZY_RECORDS:
+            loaded = yield from self._parseFoodDataInParallel(self.settings['loadWorkers'], chunkSize)
+            if loaded: return
+
+        contents = None if self.storage.LAZY_RECORDS else self.storage.readIncrementally()
+        if contents is None:
+            self._readFoodData()
+            return
+
+        servingUomData, records = contents
+        servingUoms = ServingUomRegistry.fromDictionaryList(servingUomData)
+        foodData = {}
+
+        try:
+            for position, (barcode, foodObjData, progress) in enumerate(records, 1):
+                foodObjData['barcode'] = barcode
+                foodData[barcode] = Food.fromDictionary(foodObjData, servingUoms)
+
+                if position % chunkSize == 0: yield progress
+        except ValueError:
+            # The file is damaged past its first record, treat it as unreadable like read() does.
+            self._readFoodData()
+            return
+
+        self.foodData = foodData
+        self.servingUoms = servingUoms
+        self.foodDataFileOk = True
+
+    def _parseFoodDataInParallel(self, workers, chunkSize):
+        """Parses the food data file in byte ranges split by FoodStorage.splitRecords(), each in a worker process, and adds
+            the foods of the ranges in file order, so the outcome matches _parseFoodData() in this process.
+            Worker processes are started fresh rather than forked, since the GUI loads food data beside the Tk thread.
+
+        Args:
+            workers (int): Number of worker processes.
+            chunkSize (int): Number of foods added between yields.
+
+        Yields:
+            float: Returns the fraction of the ranges added so far.
+
+        Returns:
+            bool: Returns False without changing the food data if the file can not be split, or any range can not be
+                parsed, so it can be read in this process instead.
+        """
+        split = self.storage.splitRecords(workers * CaloriePal.LOAD_RANGES_PER_WORKER)
+        if split is None: return False
+
+        servingUomData, layout, ranges = split
+        servingUoms = ServingUomRegistry.fromDictionaryList(servingUomData)
+        foodData = {}
+
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [pool.submit(_parseFoodDataRange, self.storage.filePath, start, end, servingUomData, layout, chunkSize)
+                       for start, end in ranges]
+
+            for position, future in enumerate(futures):
+                chunks = future.result()
+
+                for chunkPosition, chunk in enumerate(chunks, 1):
+                    foodData.update(chunkToFoods(chunk, servingUoms))
+                    yield (position + chunkPosition / len(chunks)) / len(futures)
+        except (KeyError, TypeError, ValueError, OSError, BrokenExecutor) as err:
+            logger.info("Parsing '%s' in worker processes failed, parsing it here instead: %s", self.foodDataFilePath, err)
+            return False
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+        self.foodData = foodData
+        self.servingUoms = servingUoms
+        self.foodDataFileOk = True
+        return True
+
+    def _readFoodData(self):
+        """Reads food data from the storage backend in one go and builds Food and ServingUom objects from it.
+        """
+        data = self.storage.read()
+        self.foodDataFileOk = data is not None
+        loadedLazily = self.storage.LAZY_RECORDS
+
+        if data is None:
             data = CaloriePal.DEFAULT_FOOD_SAVE_DATA
-            self.foodDataFileOk = False
+            loadedLazily = False
+
+            if not self.storage.WRITES_SNAPSHOTS:
+                self.storage.writeSnapshot(data)
+                data = self.storage.read()
+                loadedLazily = self.storage.LAZY_RECORDS
+
+        self.servingUoms = ServingUomRegistry.fromDictionaryList(data["servingUoms"])
 
         rawFoodData = data["foodData"]
-        self.foodData = {}
 
-        if len(rawFoodData) > 0:
+        if loadedLazily:
+            self.foodData = LazyFoodData(rawFoodData, self.servingUoms)
+        else:
+            self.foodData = {}
+
             for barcode in rawFoodData:
                 foodObjData = rawFoodData[barcode]
                 foodObjData['barcode'] = barcode
                 
-                self.foodData[barcode] = Food.fromDictionary(foodObjData)
+                self.foodData[barcode] = Food.fromDictionary(foodObjData, self.servingUoms)
 
-        self.servingUoms = ServingUom.fromDictionaryList(data["servingUoms"])
+    def replayJournal(self):
+        """Applies changes recorded in the journal on top of the loaded food data.
+            Replaying is idempotent, so a journal left behind by an interrupted save is harmless.
+        """
+        for entry in self.storage.readChanges():
+            op = entry["op"]
+            key = entry["key"]
+
+            if op == FoodJournal.ADD or op == FoodJournal.UPDATE:
+                foodObjData = dict(entry["data"])
+                foodObjData['barcode'] = key
+                self.foodData[key] = Food.fromDictionary(foodObjData, self.servingUoms)
+
+            elif op == FoodJournal.REMOVE:
+                self.foodData.pop(key, None)
+
+            elif op == FoodJournal.ADD_UOM:
+                servingUom = ServingUom.fromDictionary(entry["data"], self.servingUoms)
+                try:
+                    self.servingUoms.add(servingUom)
+                except ValueError:
+                    continue
 
     def getFoodDataJson(self, returnAsString=False):
         """Creates data structure for saving food data to disk.
@@ -299,18 +997,319 @@ class CaloriePal(object):
 
         data["foodData"] = {}
 
-        for barcode in self.foodData:
-            data["foodData"][barcode] = Food.toDict(self.foodData[barcode])
+        if isinstance(self.foodData, LazyFoodData):
+            for barcode, record in self.foodData.iterRecords():
+                data["foodData"][barcode] = record
+        else:
+            for barcode in self.foodData:
+                data["foodData"][barcode] = Food.toDict(self.foodData[barcode])
         
         return data
 
+    def iterFoodRecords(self, where=None):
+        """Yields every food as a record, one at a time, so the catalog is never copied whole.
+            Lazily loaded food data is read as records, without building Food objects.
+            Foods must not be added or removed while iterating, as with a dict.
+
+        Args:
+            where (callable, optional): Called with each record, only records it returns True for are yielded. Defaults to None.
+
+        Yields:
+            dict: Returns records formatted like Food.toDict(food, removeBarcode=False).
+        """
+        if isinstance(self.foodData, LazyFoodData):
+            records = ({'barcode': barcode, **record} for barcode, record in self.foodData.iterRecords())
+        else:
+            records = (Food.toDict(food, removeBarcode=False) for food in self.foodData.values())
+
+        for record in records:
+            if where is None or where(record):
+                yield record
+
+    def exportFoods(self, f, fileFormat="ndjson", where=None):
+        """Writes foods to a file object one record at a time, as newline delimited JSON or CSV.
+            CSV files have a header line of EXPORT_CSV_COLUMNS, with the serving UOM split into its name and code.
+
+        Args:
+            f (file): Text file object to write to. CSV files should be opened with newline="".
+            fileFormat (string, optional): One of EXPORT_FORMATS. Defaults to "ndjson".
+            where (callable, optional): Filters the records exported, see iterFoodRecords(). Defaults to None.
+
+        Raises:
+            ValueError: Raised if fileFormat is unknown.
+
+        Returns:
+            int: Returns the number of foods written.
+        """
+        if fileFormat not in CaloriePal.EXPORT_FORMATS:
+            raise ValueError(f"fileFormat must be one of {CaloriePal.EXPORT_FORMATS}, not '{fileFormat}'.")
+
+        count = 0
+
+        with self._lock:
+            if fileFormat == "ndjson":
+                for record in self.iterFoodRecords(where):
+                    f.write(json.dumps(record) + "\n")
+                    count += 1
+            else:
+                writer = csv.writer(f)
+                writer.writerow(CaloriePal.EXPORT_CSV_COLUMNS)
+
+                for record in self.iterFoodRecords(where):
+                    servingSizeUom = record['servingSizeUom']
+                    writer.writerow((record['barcode'], record['description'], record['detailedDescription'], record['caloriesPerServing'],
+                                     record['servingSize'], servingSizeUom['name'], servingSizeUom['code']))
+                    count += 1
+
+        return count
+
+    def getFoodRecordsPage(self, start=0, count=RECORDS_PAGE_SIZE):
+        """Returns the records of one page of foods, in the order they are stored. The foods before the page are skipped
+            over without being read and the foods after it are never reached, so a page costs about the same however
+            large the catalog is. Lazily loaded food data is read as records, without building Food objects.
+
+        Args:
+            start (int, optional): Position of the first food on the page. Defaults to 0.
+            count (int, optional): Most foods on the page. Defaults to RECORDS_PAGE_SIZE.
+
+        Raises:
+            ValueError: Raised if start is negative or count is less than 1.
+
+        Returns:
+            dict: Returns a dictionary of barcode to record formatted like Food.toDict(), in the order stored.
+        """
+        if start < 0: raise ValueError("start must not be negative.")
+        if count < 1: raise ValueError("count must be at least 1.")
+
+        with self._lock:
+            if isinstance(self.foodData, LazyFoodData):
+                return {barcode: self.foodData.getRecord(barcode) for barcode in self.foodData.page(start, count)}
+
+            barcodes = list(itertools.islice(self.foodData, start, start + count))
+            return {barcode: Food.toDict(self.foodData[barcode]) for barcode in barcodes}
+
+    def findFoodPosition(self, barcode):
+        """Finds the position of a food in the order used by getFoodRecordsPage(). Barcodes are matched as findFoodDataByBarcode() matches them.
+
+        Args:
+            barcode (string): Barcode string to find.
+
+        Returns:
+            tuple: Returns a tuple of (position, barcode stored under). Returns None if not found.
+        """
+        with self._lock:
+            barcode = self._resolveBarcode(barcode)
+            if barcode is None: return None
+
+            if isinstance(self.foodData, LazyFoodData): return (self.foodData.position(barcode), barcode)
+            return (operator.indexOf(self.foodData, barcode), barcode)
+
     def saveFoodDataFile(self):
-        """Saves food data to disk.
+        """Saves food data to disk. Does nothing for storage backends that persist every change as it is made.
+            With the 'writeBehindEnabled' setting on, the save runs on a background thread and saves requested
+            in quick succession are written once; call flush() to wait for it.
         """
-        data = self.getFoodDataJson()
+        if not self.storage.WRITES_SNAPSHOTS: return
+
+        if self.settings['writeBehindEnabled']:
+            self.saver.requestSave()
+        else:
+            self._writeFoodDataFile()
+
+    def _writeFoodDataFile(self):
+        """Collects the food data under the lock and writes it to storage. When the backend supports it,
+            only records changed since the last save are encoded and the cached fragments of the rest are reused.
+        """
+        with self._lock:
+            if isinstance(self.foodData, LazyFoodData) or self.storage.createRecordEncoder() is None:
+                data = self.getFoodDataJson()
+                fragments = None
+            else:
+                servingUoms, fragments = self._getFoodDataFragments()
 
-        with open(self.foodDataFilePath, mode="w") as f:
-            f.write(json.dumps(data, indent=4))
+            self.storage.beginSnapshot()
+
+        if fragments is None:
+            self.storage.writeSnapshot(data)
+        else:
+            self.storage.writeFragments(servingUoms, fragments, self._recordEncoder)
+
+    def _getFoodDataFragments(self):
+        """Encodes records changed since the last save and collects the cached fragments of all others.
+
+        Returns:
+            tuple: Returns a tuple of (servingUoms, fragments), where fragments is a list of (barcode, fragment) pairs.
+        """
+        encoder = self._recordEncoder
+        if encoder is None or encoder.fileFormat != self.storage.fileFormat:
+            self._recordEncoder = encoder = self.storage.createRecordEncoder()
+            self._recordFragments = {}
+
+        cache = self._recordFragments
+        for barcode in self._dirtyBarcodes:
+            cache.pop(barcode, None)
+        self._dirtyBarcodes = set()
+
+        fragments = []
+        for barcode, food in self.foodData.items():
+            fragment = cache.get(barcode)
+
+            if fragment is None:
+                fragment = encoder.encode(Food.toDict(food))
+                cache[barcode] = fragment
+
+            fragments.append((barcode, fragment))
+
+        servingUoms = [ServingUom.toDict(uom) for uom in self.servingUoms]
+        return (servingUoms, fragments)
+
+    def flush(self):
+        """Waits for any background save to finish.
+
+        Raises:
+            Exception: Re-raises the error of the last background save if it failed.
+        """
+        self.saver.flush()
+
+    def _saveFoodChange(self, op, key, data=None):
+        """Persists a single change. Hands it to the storage backend, which journals it or writes the single record,
+            and falls back to rewriting the whole food data file when the backend can not.
+
+        Args:
+            op (string): Journal operation, see FoodJournal.
+            key (string): Barcode of the food changed.
+            data (dict, optional): Food data as returned by Food.toDict(). Defaults to None.
+        """
+        batch = self._activeBatch()
+        if batch is not None:
+            batch[0].append((op, key, data))
+            return
+
+        if not self.storage.writeChange(op, key, data) or self.storage.needsCompaction():
+            self.saveFoodDataFile()
+
+    @contextmanager
+    def batch(self):
+        """Groups any number of addFood(), updateFood(), removeFood() and addUom() calls so they are persisted once.
+            Changes apply in memory straight away and are persisted before the with block exits: journaled, or when the
+            storage backend can not journal them, by writing the food data file on the calling thread rather than the
+            background saver. If an exception is raised inside the block, or while persisting, every change made in the
+            batch is undone and the exception re-raised. Compacting the journal after a batch is left to the background
+            saver, as the changes are already persisted; call flush() to wait for it.
+            Each thread has its own batch. A batch started inside another batch on the same thread joins the outer one.
+
+        Example:
+            with calPal.batch():
+                for food in foods:
+                    calPal.addFood(food)
+        """
+        if self._activeBatch() is not None:
+            yield
+            return
+
+        changes = []
+        undo = []
+        self._batchState.active = (changes, undo)
+        uomCount = len(self.servingUoms)
+
+        try:
+            yield
+            self._batchState.active = None
+
+            if len(changes) > 0:
+                with self._lock:
+                    persisted = self.storage.writeChanges(changes)
+
+                if not persisted and self.storage.WRITES_SNAPSHOTS:
+                    # Waits for a save already running, so the two do not write the file at once. An error it raises is
+                    # already logged, and the file written next replaces what it failed to write.
+                    try:
+                        self.saver.flush()
+                    except Exception:
+                        pass
+                    self._writeFoodDataFile()
+                elif self.storage.needsCompaction():
+                    self.saveFoodDataFile()
+        except BaseException:
+            self._batchState.active = None
+
+            with self._lock:
+                for barcode, previousFood in reversed(undo):
+                    self._dirtyBarcodes.add(barcode)
+                    self._indexFood(barcode, previousFood)
+
+                    if previousFood is None:
+                        self.foodData.pop(barcode, None)
+                    else:
+                        self.foodData[barcode] = previousFood
+                self.servingUoms.truncate(uomCount)
+            raise
+        finally:
+            self._batchState.active = None
+
+    def _activeBatch(self):
+        """Returns the calling thread's active batch() as a tuple of (changes, undo), the changes waiting to be persisted
+            and the (barcode, previousFood) pairs to restore on rollback. Returns None outside of a batch.
+        """
+        return getattr(self._batchState, 'active', None)
+
+    def _foodChanged(self, barcode, previousFood, food):
+        """Called when the food held by a barcode changes. Marks the barcode for re-encoding on the next save,
+            updates the indexes and remembers the previous food, so an active batch can be rolled back.
+
+        Args:
+            barcode (string): Barcode of the food changed.
+            previousFood (Food Object): Food previously held by the barcode, None if it is being added.
+            food (Food Object): Food now held by the barcode, None if it is being removed.
+        """
+        self._dirtyBarcodes.add(barcode)
+        self._foodDataChangedSinceRead = True
+        self._indexFood(barcode, food)
+
+        batch = self._activeBatch()
+        if batch is not None:
+            batch[1].append((barcode, previousFood))
+
+    def _indexFood(self, barcode, food):
+        """Brings the indexes up to date for one barcode.
+
+        Args:
+            barcode (string): Barcode of the food changed.
+            food (Food Object): Food now held by the barcode, None if it was removed.
+        """
+        if food is None:
+            self.searchIndex.remove(barcode)
+            self.fuzzyIndex.remove(barcode)
+
+            for index in self.numericIndexes.values():
+                index.remove(barcode)
+            for index in self.textSortIndexes.values():
+                index.remove(barcode)
+            self.foodColumns.remove(barcode)
+            self.barcodeIndex.remove(barcode)
+        else:
+            self.barcodeIndex.add(barcode)
+            self.textSortIndexes['barcode'].update(barcode, barcode)
+            self.textSortIndexes['description'].update(barcode, str(food.description).casefold())
+            self.searchIndex.update(barcode, food.description, food.detailedDescription)
+            self.fuzzyIndex.update(barcode, food.description)
+
+            if self.numericIndexes['caloriesPerServing'].built or self.foodColumns.built:
+                gramRatios = self.servingUoms.converter().ratiosToBase(MASS)
+                values = CaloriePal._numericValues(food.caloriesPerServing, food.servingSize, food.servingSizeUom.code, gramRatios)
+
+                for field, value in zip(CaloriePal.NUMERIC_FIELDS, values):
+                    self.numericIndexes[field].update(barcode, value)
+                self.foodColumns.update(barcode, values)
+
+    def _shareServingUom(self, food):
+        """Swaps the food's ServingUom for the registered object with the same code, registering it if the code is new.
+
+        Args:
+            food (Food Object): Food about to be stored.
+        """
+        servingUom = food.servingSizeUom
+        food.servingSizeUom = self.servingUoms.share(servingUom)
 
     def changeFoodDataFile(self, newFilePath):
         """Changes food data file path and try's to reload file from new path.
@@ -355,7 +1354,8 @@ class CaloriePal(object):
             return (True, msg)
 
     def addFood(self, food):
-        """Adds a new food to database.
+        """Adds a new food to database. A valid GTIN is stored under its GTIN-14, see canonicalBarcode(), and a food
+            already stored under any variant of the barcode is left as it is. The food provided is not changed.
 
         Args:
             food (Food Object): Food object to add.
@@ -364,13 +1364,19 @@ class CaloriePal(object):
             TypeError: Raised if object passed is not of type Food().
         """
         if not isinstance(food, Food): raise TypeError("Must be of class Food()")
-        if food.barcode in self.foodData: return
-        self.foodData[food.barcode] = food
 
-        self.saveFoodDataFile()
+        with self._lock:
+            food = self._storedFood(food)
+            if food.barcode in self.foodData: return
+            self._shareServingUom(food)
+            self._foodChanged(food.barcode, None, food)
+            self.foodData[food.barcode] = food
+
+            self._saveFoodChange(FoodJournal.ADD, food.barcode, Food.toDict(food))
     
     def updateFood(self, food):
-        """Updates an existing food, calls addFood() if barcode not found.
+        """Updates an existing food, calls addFood() if barcode not found. Any variant of a GTIN updates the food stored
+            under it. The food provided is not changed.
 
         Args:
             food (Food Object): Food object to update.
@@ -379,16 +1385,21 @@ class CaloriePal(object):
             TypeError: Raised if object passed is not of type Food().
         """
         if not isinstance(food, Food): raise TypeError("Must be of class Food()")
-        if food.barcode not in self.foodData:
-            self.addFood(food)
-            return
 
-        self.foodData[food.barcode] = Food.toDict(food)
+        with self._lock:
+            food = self._storedFood(food)
+            if food.barcode not in self.foodData:
+                self.addFood(food)
+                return
 
-        self.saveFoodDataFile()
+            self._shareServingUom(food)
+            self._foodChanged(food.barcode, self.foodData[food.barcode], food)
+            self.foodData[food.barcode] = food
+
+            self._saveFoodChange(FoodJournal.UPDATE, food.barcode, Food.toDict(food))
     
     def removeFood(self, food):
-        """Removes a food using barcode value.
+        """Removes a food using barcode value. Any variant of a GTIN removes the food, as with findFoodDataByBarcode().
 
         Args:
             food (Food Object): Food object to remove.
@@ -397,12 +1408,20 @@ class CaloriePal(object):
             TypeError: Raised if object passed is not of type Food().
         """
         if not isinstance(food, Food): raise TypeError("Must be of class Food()")
-        self.foodData.pop(food.barcode, None)
 
-        self.saveFoodDataFile()
+        with self._lock:
+            barcode = self._resolveBarcode(food.barcode)
+            if barcode is None: return
+
+            previousFood = self.foodData.pop(barcode, None)
+            if previousFood is None: return
+            self._foodChanged(barcode, previousFood, None)
+
+            self._saveFoodChange(FoodJournal.REMOVE, barcode)
     
     def findFoodDataByBarcode(self, barcode):
-        """Looks for a food item with barcode provided.
+        """Looks for a food item with barcode provided. Any variant of a GTIN finds the food, so a UPC-A finds the food
+            stored under its EAN-13 or GTIN-14 barcode and the other way around.
 
         Args:
             barcode (string): Barcode string to find.
@@ -410,15 +1429,253 @@ class CaloriePal(object):
         Returns:
             Food Object: Returns Food object matching barcode. Returns None if not found.
         """
+        with self._lock:
+            barcode = self._resolveBarcode(barcode)
+            if barcode is None: return None
+
+            return self.foodData.get(barcode)
+
+    def findFoodsByBarcodes(self, barcodes):
+        """Looks up many barcodes at once, holding the lock once for all of them rather than once per barcode.
+            Barcodes are matched as findFoodDataByBarcode() matches them.
+
+        Args:
+            barcodes (iterable): Barcode strings to find.
+
+        Returns:
+            list: Returns a Food object for each barcode, in the order provided. Holds None for barcodes not found.
+        """
+        foods = []
+
+        with self._lock:
+            foodData = self.foodData
+            for barcode in barcodes:
+                food = foodData.get(barcode)
+                if food is None:
+                    barcode = self._resolveBarcode(barcode)
+                    if barcode is not None: food = foodData.get(barcode)
+                foods.append(food)
+
+        return foods
+
+    def _resolveBarcode(self, barcode):
+        """Finds the barcode a food is stored under from any variant of its barcode.
+
+        Args:
+            barcode (string): Barcode to resolve.
+
+        Returns:
+            string: Returns the stored barcode. Returns None if no food matches.
+        """
         barcode = barcode.strip()
 
         if len(barcode) <= 0: return None
+        if barcode in self.foodData: return barcode
 
-        if barcode in self.foodData:
-            return self.foodData[barcode]
-        else:
-            return None
+        # Looks up each variant directly rather than through barcodeIndex, so a miss never waits on the index being built.
+        for variant in gtinVariants(barcode):
+            if variant in self.foodData: return variant
+
+        return None
+
+    def _storedFood(self, food):
+        """Returns the food to store for one being added or updated. The barcode it is stored under is the one of the food
+            matching any variant of its barcode, or for a new food its canonical barcode, see canonicalBarcode().
+
+        Returns:
+            Food Object: Returns the food provided if its barcode is already that one, otherwise a copy holding it,
+                so the caller's object is left as it was.
+        """
+        barcode = self._resolveBarcode(food.barcode) or canonicalBarcode(food.barcode)
+        if barcode == food.barcode: return food
+
+        return Food(barcode, food.description, food.detailedDescription, food.caloriesPerServing, food.servingSize,
+                    food.servingSizeUom)
+
+    def _prepareBarcodeIndex(self):
+        if not self.barcodeIndex.built:
+            self.barcodeIndex.build(iter(self.foodData))
+
+    def findDuplicateBarcodes(self):
+        """Finds foods stored under different variants of the same barcode, such as a UPC-A and its EAN-13.
+
+        Returns:
+            dict: Dictionary of canonical barcode to a sorted list of the stored barcodes sharing it.
+        """
+        with self._lock:
+            self._prepareBarcodeIndex()
+            return self.barcodeIndex.findDuplicates()
+
+    def canonicalizeBarcodes(self):
+        """Re-keys every food stored under a non-canonical GTIN, such as a UPC-A or EAN-13, to its GTIN-14 barcode.
+            Foods sharing a canonical barcode with another food are left as they are, see findDuplicateBarcodes().
+            The changes are persisted as a single batch.
+
+        Returns:
+            tuple: Returns a tuple of (rekeyed, conflicts), where rekeyed is the number of foods re-keyed and conflicts
+                is a sorted list of the barcodes left unchanged because another food holds their canonical barcode.
+        """
+        rekeyed = 0
+        conflicts = []
+
+        with self._lock, self.batch():
+            duplicates = self.findDuplicateBarcodes()
+
+            for barcode in list(self.foodData):
+                key = canonicalBarcode(barcode)
+                if key == barcode: continue
+
+                if key in duplicates:
+                    conflicts.append(barcode)
+                    continue
+
+                food = self.foodData[barcode]
+                self.removeFood(food)
+                self.addFood(Food(key, food.description, food.detailedDescription, food.caloriesPerServing,
+                                  food.servingSize, food.servingSizeUom))
+                rekeyed += 1
+
+        return (rekeyed, sorted(conflicts))
         
+    def searchFoods(self, query, limit=20, matchAll=True):
+        """Searches food descriptions and detailed descriptions for the words in a query.
+            The search index is built the first time this is called after the food data is read.
+
+        Args:
+            query (string): Words to search for.
+            limit (int, optional): Maximum number of foods to return. Defaults to 20.
+            matchAll (bool, optional): Only returns foods containing every word when True, otherwise foods containing
+                any of them. Defaults to True.
+
+        Returns:
+            list: Returns a list of Food objects, best match first.
+        """
+        with self._lock:
+            if not self.searchIndex.built:
+                self._loadSearchIndexes()
+
+            if not self.searchIndex.built:
+                self.searchIndex.build(self._iterSearchEntries())
+                self._searchIndexBuilt()
+
+            results = self.searchIndex.search(query, limit, matchAll)
+            return [self.foodData[barcode] for barcode, score in results]
+
+    def fuzzySearchFoods(self, query, limit=10, threshold=FoodFuzzyIndex.DEFAULT_THRESHOLD):
+        """Searches food descriptions for a partial or misspelled query.
+            The trigram index is loaded or built the first time this or completeDescription() is called.
+
+        Args:
+            query (string): Text to search for.
+            limit (int, optional): Maximum number of foods to return. Defaults to 10.
+            threshold (float, optional): Minimum similarity of a match, from 0 to 1. Defaults to FoodFuzzyIndex.DEFAULT_THRESHOLD.
+
+        Returns:
+            list: Returns a list of Food objects, most similar first.
+        """
+        with self._lock:
+            self._prepareFuzzyIndex()
+
+            results = self.fuzzyIndex.search(query, limit, threshold)
+            return [self.foodData[barcode] for barcode, similarity in results]
+
+    def completeDescription(self, prefix, limit=10):
+        """Suggests completions for a partly typed description, for type-ahead.
+
+        Args:
+            prefix (string): Text typed so far.
+            limit (int, optional): Maximum number of completions. Defaults to 10.
+
+        Returns:
+            list: Returns a list of completed texts, most used words first.
+        """
+        with self._lock:
+            self._prepareFuzzyIndex()
+            return self.fuzzyIndex.complete(prefix, limit)
+
+    def _prepareFuzzyIndex(self):
+        if not self.fuzzyIndex.built:
+            self._loadSearchIndexes()
+
+        if not self.fuzzyIndex.built:
+            self.fuzzyIndex.build((barcode, description) for barcode, description, detailedDescription in self._iterSearchEntries())
+            self._searchIndexBuilt()
+
+    def _searchIndexCache(self):
+        return FoodDataCache.forDataFile(self.foodDataFilePath, CaloriePal.SEARCH_INDEX_FILE_SUFFIX)
+
+    def _loadSearchIndexes(self):
+        """Loads indexes that are not built yet from the search index file, if it was saved for the food data as it is
+            stored now and no food has changed since the food data file was read. Only tried once per read.
+        """
+        if self._searchIndexFileChecked or self._foodDataChangedSinceRead or not self.settings['searchIndexCacheEnabled']: return
+        self._searchIndexFileChecked = True
+
+        fingerprint = self.storage.fingerprint()
+        if fingerprint is None: return
+
+        indexes = self._searchIndexCache().load(fingerprint)
+        if indexes is None: return
+
+        try:
+            searchIndex = FoodSearchIndex.fromState(indexes['searchIndex'])
+            fuzzyIndex = FoodFuzzyIndex.fromState(indexes['fuzzyIndex'])
+        except (KeyError, TypeError, AttributeError):
+            logger.warning("Search index file for '%s' is not valid, ignoring it.", self.foodDataFilePath)
+            return
+
+        if not self.searchIndex.built and searchIndex.built: self.searchIndex = searchIndex
+        if not self.fuzzyIndex.built and fuzzyIndex.built: self.fuzzyIndex = fuzzyIndex
+        logger.info("Search indexes loaded for '%s'.", self.foodDataFilePath)
+
+    def _searchIndexBuilt(self):
+        """Saves a newly built index straight away when the food data has not changed since it was read,
+            so the next start does not have to build it again. Called with the lock held.
+        """
+        # Waiting for a background save here would deadlock on the lock, leave the index for saveSearchIndexes() instead.
+        if self._foodDataChangedSinceRead or self.saver.isPending(): return
+
+        try:
+            self._saveSearchIndexes()
+        except Exception:
+            logger.exception("Search indexes could not be saved.")
+
+    def saveSearchIndexes(self):
+        """Saves the built search indexes beside the food data file, keyed to the stored food data.
+            Waits for any background save first, so the indexes match what is on disk.
+
+        Raises:
+            Exception: Re-raises the error of the last background save if it failed.
+        """
+        self.flush()
+
+        with self._lock:
+            self._saveSearchIndexes()
+
+    def _saveSearchIndexes(self):
+        if not self.settings['searchIndexCacheEnabled']: return
+        if not self.searchIndex.built and not self.fuzzyIndex.built: return
+
+        fingerprint = self.storage.fingerprint()
+        if fingerprint is None: return
+
+        self._searchIndexCache().save(fingerprint, {'searchIndex': self.searchIndex.toState(),
+                                                    'fuzzyIndex': self.fuzzyIndex.toState()})
+
+    def _iterSearchEntries(self):
+        """Yields the fields FoodSearchIndex needs for every food. Lazily loaded food data is read as records,
+            so building the index does not create a Food object for every food.
+
+        Yields:
+            tuple: Returns (barcode, description, detailedDescription) tuples.
+        """
+        if isinstance(self.foodData, LazyFoodData):
+            for barcode, record in self.foodData.iterRecords():
+                yield (barcode, record['description'], record['detailedDescription'])
+        else:
+            for barcode, food in self.foodData.items():
+                yield (barcode, food.description, food.detailedDescription)
+
     def findUomByName(self, uomName):
         """Looks for a ServingUom object matching the UOM name provided.
 
@@ -432,19 +1689,243 @@ class CaloriePal(object):
         
         if len(uomName) <= 0: return None
 
-        foundUom = None
+        return self.servingUoms.findByName(uomName)
 
-        for x, uom in enumerate(self.servingUoms):
-            if uomName == uom.name:
-                foundUom = self.servingUoms[x]
-                break
-        
-        return foundUom
+    def convertServingSizes(self, pairs, toUom):
+        """Converts many serving sizes into a single UOM in one call.
+
+        Args:
+            pairs (iterable): Iterable of (servingSize, ServingUom) tuples.
+            toUom (ServingUom Object): UOM to convert to.
+
+        Returns:
+            list: Returns the converted serving sizes in the order provided. Holds None for sizes that can not be converted.
+        """
+        with self._lock:
+            return self.servingUoms.converter().convertMany(pairs, toUom)
+
+    def caloriesPerGram(self, barcodes=None):
+        """Works out the calories per gram of many foods at once.
+
+        Args:
+            barcodes (iterable, optional): Barcodes of the foods to include. Defaults to None, which includes every food.
+
+        Returns:
+            dict: Dictionary of barcode to calories per gram. Holds None for foods whose serving size is not a mass
+                or whose values are not numbers. Barcodes not found are left out.
+        """
+        with self._lock:
+            if barcodes is None:
+                foods = list(self.foodData.values())
+            else:
+                foods = [food for food in map(self.foodData.get, barcodes) if food is not None]
+
+            grams = self.servingUoms.converter().convertManyToBase(((food.servingSize, food.servingSizeUom) for food in foods), MASS)
+
+        toReturn = {}
+        for food, servingGrams in zip(foods, grams):
+            calories = toNumber(food.caloriesPerServing)
+
+            if calories is None or servingGrams is None or servingGrams <= 0:
+                toReturn[food.barcode] = None
+            else:
+                toReturn[food.barcode] = calories / servingGrams
+        return toReturn
+
+    @staticmethod
+    def _numericValues(caloriesPerServing, servingSize, uomCode, gramRatios):
+        """Works out the values of NUMERIC_FIELDS for one food. Values stored as text, as the GUI does, are converted.
+
+        Args:
+            caloriesPerServing (float): Calories per serving of the food.
+            servingSize (float): Serving size of the food.
+            uomCode (string): Code of the food's serving size UOM.
+            gramRatios (dict): Dictionary of UOM code to grams per unit, see UomConverter.ratiosToBase().
+
+        Returns:
+            tuple: Returns the values in the order of NUMERIC_FIELDS. Holds None for values that are not numbers.
+        """
+        calories = toNumber(caloriesPerServing)
+        size = toNumber(servingSize)
+        gramRatio = gramRatios.get(uomCode)
+
+        caloriesPerGram = None
+        if calories is not None and size is not None and gramRatio is not None and size > 0:
+            caloriesPerGram = calories / (size * gramRatio)
+
+        return (calories, size, caloriesPerGram)
+
+    def _iterNumericValues(self):
+        """Yields the values of NUMERIC_FIELDS for every food. Lazily loaded food data is read as records,
+            so this does not create a Food object for every food.
+
+        Yields:
+            tuple: Returns (barcode, values) tuples, see _numericValues().
+        """
+        if isinstance(self.foodData, LazyFoodData):
+            entries = ((barcode, record['caloriesPerServing'], record['servingSize'], record['servingSizeUom']['code'])
+                       for barcode, record in self.foodData.iterRecords())
+        else:
+            entries = ((barcode, food.caloriesPerServing, food.servingSize, food.servingSizeUom.code)
+                       for barcode, food in self.foodData.items())
+
+        gramRatios = self.servingUoms.converter().ratiosToBase(MASS)
+
+        for barcode, caloriesPerServing, servingSize, uomCode in entries:
+            yield (barcode, CaloriePal._numericValues(caloriesPerServing, servingSize, uomCode, gramRatios))
+
+    def _prepareNumericIndexes(self):
+        """Builds the numeric indexes if they are not built.
+        """
+        if self.numericIndexes['caloriesPerServing'].built: return
+
+        columns = [[] for field in CaloriePal.NUMERIC_FIELDS]
+
+        for barcode, values in self._iterNumericValues():
+            for column, value in zip(columns, values):
+                column.append((barcode, value))
+
+        for field, column in zip(CaloriePal.NUMERIC_FIELDS, columns):
+            self.numericIndexes[field].build(column)
+
+    def _numericIndex(self, field):
+        if field not in self.numericIndexes: raise ValueError(f"field must be one of {CaloriePal.NUMERIC_FIELDS}, not '{field}'.")
+
+        self._prepareNumericIndexes()
+        return self.numericIndexes[field]
+
+    def getFoodColumns(self):
+        """Returns the columnar view of NUMERIC_FIELDS, building it on first use. The view is kept up to date as foods
+            change, so aggregates such as getFoodColumns().mean('caloriesPerGram') always cover the current food data.
+
+        Returns:
+            FoodColumns Object: Returns the view.
+        """
+        with self._lock:
+            if not self.foodColumns.built:
+                self.foodColumns.build(self._iterNumericValues())
+            return self.foodColumns
+
+    def findFoodsInRange(self, field, low=None, high=None, limit=None):
+        """Finds the foods with a value from low to high, both inclusive, such as all foods from 100 to 200 calories
+            per serving. Foods whose value is not a number are never returned.
+
+        Args:
+            field (string): One of NUMERIC_FIELDS.
+            low (float, optional): Smallest value to return. Defaults to None, no lower bound.
+            high (float, optional): Largest value to return. Defaults to None, no upper bound.
+            limit (int, optional): Maximum number of foods to return. Defaults to None, no limit.
+
+        Raises:
+            ValueError: Raised if field is not one of NUMERIC_FIELDS.
+
+        Returns:
+            list: Returns a list of Food objects, smallest value first.
+        """
+        with self._lock:
+            barcodes = self._numericIndex(field).range(low, high, limit)
+            return list(map(self.foodData.__getitem__, barcodes))
+
+    def countFoodsInRange(self, field, low=None, high=None):
+        """Counts the foods with a value from low to high, both inclusive. See findFoodsInRange().
+
+        Returns:
+            int: Returns the number of foods in the range.
+        """
+        with self._lock:
+            return self._numericIndex(field).count(low, high)
+
+    def findTopFoods(self, field, count=10, largest=True):
+        """Finds the foods with the largest, or smallest, value, such as the highest calorie density foods.
+
+        Args:
+            field (string): One of NUMERIC_FIELDS.
+            count (int, optional): Number of foods to return. Defaults to 10.
+            largest (bool, optional): Returns the largest values when True, otherwise the smallest. Defaults to True.
+
+        Raises:
+            ValueError: Raised if field is not one of NUMERIC_FIELDS.
+
+        Returns:
+            list: Returns a list of Food objects, most extreme value first.
+        """
+        with self._lock:
+            barcodes = self._numericIndex(field).top(count, largest)
+            return list(map(self.foodData.__getitem__, barcodes))
+
+    def getSortOrder(self, field, descending=False):
+        """Returns the barcode of every food sorted by a field. The order is read from a sorted index kept up to date as foods
+            change, rather than sorting the food data each time. Equal values are ordered by barcode, smallest first, in either
+            direction.
+
+        Args:
+            field (string): One of SORT_FIELDS.
+            descending (bool, optional): Sorts the largest value first when True. Defaults to False.
+
+        Raises:
+            ValueError: Raised if field is not one of SORT_FIELDS.
+
+        Returns:
+            list: Returns a new list of barcodes. Foods whose value is not a number come last.
+        """
+        with self._lock:
+            index = self._sortIndex(field)
+            barcodes = index.descendingBarcodes() if descending else list(index.barcodes)
+
+            if len(barcodes) < len(self.foodData):
+                indexed = index.valuesByBarcode
+                barcodes.extend(barcode for barcode in self.foodData if barcode not in indexed)
+
+            return barcodes
+
+    def getSortKeys(self, field):
+        """Returns the value each food is sorted by for a field, such as the casefolded description of each food.
+
+        Args:
+            field (string): One of SORT_FIELDS.
+
+        Raises:
+            ValueError: Raised if field is not one of SORT_FIELDS.
+
+        Returns:
+            dict: Returns a dictionary of barcode to value. The dictionary is not copied, so it changes as foods change.
+        """
+        with self._lock:
+            return self._sortIndex(field).valuesByBarcode
+
+    def _sortIndex(self, field):
+        if field not in CaloriePal.SORT_FIELDS: raise ValueError(f"field must be one of {CaloriePal.SORT_FIELDS}, not '{field}'.")
+        if field in self.numericIndexes: return self._numericIndex(field)
+
+        index = self.textSortIndexes[field]
+        if not index.built:
+            if field == "barcode":
+                index.build((barcode, barcode) for barcode in self.foodData)
+            else:
+                index.build((barcode, str(description).casefold()) for barcode, description, detailedDescription in self._iterSearchEntries())
+
+        return index
 
     def addUom(self, uom):
-        #TODO: Add UOM coversion.
+        """Adds a new serving UOM.
+
+        Args:
+            uom (ServingUom Object): ServingUom object to add.
+
+        Raises:
+            TypeError: Raised if object passed is not of type ServingUom().
+            ValueError: Raised if a UOM with the same name or code already exists.
+        """
         if not isinstance(uom, ServingUom): raise TypeError("Must be of class ServingUom()")
-        self.servingUoms.append(uom)
+
+        with self._lock:
+            self.servingUoms.add(uom)
+
+            batch = self._activeBatch()
+            if batch is not None:
+                batch[0].append((FoodJournal.ADD_UOM, uom.code, ServingUom.toDict(uom)))
+            else:
+                self.storage.writeChange(FoodJournal.ADD_UOM, uom.code, ServingUom.toDict(uom))
         return
 
 
@@ -0,0 +1,133 @@
+class FoodBrowserView(object):
+    # Foods checked against the query by each searchStep() call when no count is given.
+    SEARCH_STEP_SIZE = 20000
+
+    def __init__(self, calPal, sortField="description", descending=False, sortedBarcodes=None):
+        """Creates a new FoodBrowserView object. Holds the barcodes of the foods a food list shows, sorted and narrowed
+            by a search, so a list window only has to show the rows scrolled into view. Sort orders come from
+            CaloriePal.getSortOrder(), rather than sorting the food data on each change of sort.
+
+        Args:
+            calPal (CaloriePal Object): CaloriePal holding the food data.
+            sortField (string, optional): One of CaloriePal.SORT_FIELDS. Defaults to "description".
+            descending (bool, optional): Sorts the largest value first when True. Defaults to False.
+            sortedBarcodes (list, optional): Sort order already read with CaloriePal.getSortOrder(). Defaults to None, which reads it.
+
+        Raises:
+            ValueError: Raised if sortField is not one of CaloriePal.SORT_FIELDS.
+        """
+        self.calPal = calPal
+        self.query = ""
+        self.searching = False
+
+        # Barcodes of every food in sort order, and of the foods matching the query in the same order.
+        self._sortedBarcodes = []
+        self.barcodes = []
+
+        # Foods a search still has to check, and how many of them it has checked.
+        self._candidates = None
+        self._searched = 0
+
+        self.sort(sortField, descending, sortedBarcodes)
+
+    def sort(self, field, descending=False, sortedBarcodes=None):
+        """Sorts the foods by a field. A search is started over on the new order, see searchStep().
+
+        Args:
+            field (string): One of CaloriePal.SORT_FIELDS.
+            descending (bool, optional): Sorts the largest value first when True. Defaults to False.
+            sortedBarcodes (list, optional): Sort order already read with CaloriePal.getSortOrder(), such as on a background
+                thread. Defaults to None, which reads it.
+
+        Raises:
+            ValueError: Raised if field is not one of CaloriePal.SORT_FIELDS.
+        """
+        if sortedBarcodes is None: sortedBarcodes = self.calPal.getSortOrder(field, descending)
+
+        self._sortedBarcodes = sortedBarcodes
+        self.sortField = field
+        self.descending = descending
+
+        self._startSearch(self._sortedBarcodes, self.query)
+
+    def refresh(self):
+        """Picks up foods added, changed or removed since the view was sorted.
+        """
+        self.sort(self.sortField, self.descending)
+
+    def search(self, query):
+        """Starts showing only the foods whose barcode or description contains a query, ignoring case. The foods are checked
+            a step at a time, see searchStep(), so a search over a large catalog can be spread over several Tk callbacks.
+
+        Args:
+            query (string): Text to search for. A blank query shows every food straight away.
+
+        Returns:
+            bool: Returns True if the search changed, False if the query is the same as before.
+        """
+        query = query.strip().casefold()
+        if query == self.query: return False
+
+        # Typing more of a query can only narrow the foods it matches, so only the foods already matched are checked again.
+        if query.startswith(self.query) and not self.searching:
+            candidates = self.barcodes
+        else:
+            candidates = self._sortedBarcodes
+
+        self._startSearch(candidates, query)
+        return True
+
+    def _startSearch(self, candidates, query):
+        self.query = query
+
+        if len(query) <= 0:
+            self.barcodes = candidates
+            self._candidates = None
+            self.searching = False
+            return
+
+        self.barcodes = []
+        self._candidates = candidates
+        self._searched = 0
+        self.searching = True
+
+    def searchStep(self, count=SEARCH_STEP_SIZE):
+        """Checks the next foods against the query, adding the ones matching to barcodes.
+
+        Args:
+            count (int, optional): Most foods to check. Defaults to SEARCH_STEP_SIZE, None checks every food left.
+
+        Returns:
+            bool: Returns True once the search is finished.
+        """
+        if not self.searching: return True
+
+        start = self._searched
+        end = len(self._candidates) if count is None else start + count
+
+        query = self.query
+        descriptions = self.calPal.getSortKeys("description")
+        self.barcodes.extend(barcode for barcode in self._candidates[start:end] if query in descriptions.get(barcode, "") or query in barcode)
+
+        self._searched = end
+        if end >= len(self._candidates):
+            self._candidates = None
+            self.searching = False
+
+        return not self.searching
+
+    def __len__(self):
+        return len(self.barcodes)
+
+    def rows(self, start, count):
+        """Returns the foods shown from a position on.
+
+        Args:
+            start (int): Position of the first food.
+            count (int): Most foods to return.
+
+        Returns:
+            list: Returns (barcode, food) tuples. food is None if the food was removed since the view was sorted.
+        """
+        foodData = self.calPal.foodData
+        return [(barcode, foodData.get(barcode)) for barcode in self.barcodes[start:start + count]]
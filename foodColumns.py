@@ -0,0 +1,246 @@
+import array
+import importlib.util
+import math
+
+class FoodColumns(object):
+    MISSING = math.nan
+
+    def __init__(self, fields, useNumpy=None):
+        """Creates a new FoodColumns object. Holds numeric food values column by column in contiguous arrays of floats,
+            one row per food, aligned with a list of barcodes. Aggregates run over whole columns instead of over Food objects.
+            Uses NumPy arrays when NumPy is installed and the array module otherwise. Values that are not numbers are
+            held as NaN and left out of every aggregate. The view starts out empty and unbuilt, see build().
+
+        Args:
+            fields (iterable): Names of the columns.
+            useNumpy (bool, optional): Forces NumPy on or off. Defaults to None, which uses NumPy when it is installed.
+
+        Raises:
+            ValueError: Raised if useNumpy is True and NumPy is not installed.
+        """
+        # NumPy is only looked for here. It is imported by the methods using it, as importing it takes longer than
+        # the rest of startup.
+        numpyInstalled = importlib.util.find_spec("numpy") is not None
+        if useNumpy and not numpyInstalled: raise ValueError("NumPy is not installed.")
+
+        self.fields = tuple(fields)
+        self.useNumpy = numpyInstalled if useNumpy is None else useNumpy
+        self.clear()
+
+    def clear(self):
+        """Empties the view and marks it unbuilt.
+        """
+        self.built = False
+
+        # Barcode of each row, and the row of each barcode.
+        self.barcodes = []
+        self.rows = {}
+
+        # NumPy columns grow by doubling, so only the first len(self.barcodes) values of each are in use.
+        # Columns are made by build(), so NumPy is not imported before a view is needed.
+        self._columns = {}
+
+    def _newColumn(self, values):
+        column = array.array("d", values)
+        if self.useNumpy:
+            import numpy
+            column = numpy.frombuffer(column, dtype=numpy.float64).copy()
+        return column
+
+    def build(self, entries):
+        """Replaces the contents of the view.
+
+        Args:
+            entries (iterable): Iterable of (barcode, values) tuples, where values holds a number or None for each field.
+        """
+        self.clear()
+
+        missing = FoodColumns.MISSING
+        columns = [array.array("d") for field in self.fields]
+
+        for barcode, values in entries:
+            self.rows[barcode] = len(self.barcodes)
+            self.barcodes.append(barcode)
+
+            for column, value in zip(columns, values):
+                column.append(missing if value is None else value)
+
+        for field, column in zip(self.fields, columns):
+            self._columns[field] = self._newColumn(column)
+
+        self.built = True
+
+    def update(self, barcode, values):
+        """Sets the values of a food, adding a row for it if it is new. Does nothing until the view is built.
+
+        Args:
+            barcode (string): Barcode of the food.
+            values (iterable): A number or None for each field.
+        """
+        if not self.built: return
+
+        row = self.rows.get(barcode)
+        if row is None:
+            row = self._appendRow(barcode)
+
+        for field, value in zip(self.fields, values):
+            self._columns[field][row] = FoodColumns.MISSING if value is None else value
+
+    def _appendRow(self, barcode):
+        row = len(self.barcodes)
+        self.rows[barcode] = row
+        self.barcodes.append(barcode)
+
+        for field in self.fields:
+            column = self._columns[field]
+
+            if not self.useNumpy:
+                column.append(FoodColumns.MISSING)
+            elif row >= len(column):
+                import numpy
+                grown = numpy.full(max(16, len(column) * 2), FoodColumns.MISSING)
+                grown[:row] = column[:row]
+                self._columns[field] = grown
+
+        return row
+
+    def remove(self, barcode):
+        """Removes the row of a food, moving the last row into its place. Does nothing if the barcode is not in the view.
+
+        Args:
+            barcode (string): Barcode of the food to remove.
+        """
+        row = self.rows.pop(barcode, None)
+        if row is None: return
+
+        last = len(self.barcodes) - 1
+        lastBarcode = self.barcodes.pop()
+
+        if row != last:
+            self.barcodes[row] = lastBarcode
+            self.rows[lastBarcode] = row
+
+        for field in self.fields:
+            column = self._columns[field]
+            column[row] = column[last]
+            if not self.useNumpy: column.pop()
+
+    def __len__(self):
+        return len(self.barcodes)
+
+    def column(self, field):
+        """Returns the values of a field, in the order of barcodes. The column is not copied, so it changes with the view.
+
+        Args:
+            field (string): One of the fields.
+
+        Raises:
+            ValueError: Raised if field is not one of the fields.
+
+        Returns:
+            object: Returns a NumPy array or an array.array of floats, with NaN for values that are not numbers.
+        """
+        if field not in self.fields: raise ValueError(f"field must be one of {self.fields}, not '{field}'.")
+        if not self.built: return self._newColumn([])
+
+        column = self._columns[field]
+        if self.useNumpy: return column[:len(self.barcodes)]
+        return column
+
+    def values(self, field):
+        """Returns the values of a field that are numbers, in no particular order.
+        """
+        column = self.column(field)
+
+        if self.useNumpy:
+            import numpy
+            return column[~numpy.isnan(column)]
+        return [value for value in column if value == value]
+
+    def count(self, field):
+        """Returns the number of foods whose value of a field is a number.
+        """
+        return len(self.values(field))
+
+    def mean(self, field):
+        """Returns the mean of a field. Returns None if no value is a number.
+        """
+        values = self.values(field)
+        if len(values) <= 0: return None
+
+        if self.useNumpy: return float(values.mean())
+        return math.fsum(values) / len(values)
+
+    def percentiles(self, field, percents=(25, 50, 75)):
+        """Returns percentiles of a field, interpolating linearly between values as NumPy does by default.
+
+        Args:
+            field (string): One of the fields.
+            percents (iterable, optional): Percentiles to return, from 0 to 100. Defaults to (25, 50, 75).
+
+        Raises:
+            ValueError: Raised if a percent is not from 0 to 100.
+
+        Returns:
+            list: Returns one value per percent. Returns None for each if no value is a number.
+        """
+        percents = list(percents)
+        if any(percent < 0 or percent > 100 for percent in percents): raise ValueError("Percents must be from 0 to 100.")
+
+        values = self.values(field)
+        if len(values) <= 0: return [None] * len(percents)
+
+        if self.useNumpy:
+            import numpy
+            return [float(value) for value in numpy.percentile(values, percents)]
+
+        values = sorted(values)
+        toReturn = []
+        for percent in percents:
+            position = (len(values) - 1) * percent / 100
+            lower = math.floor(position)
+            upper = min(lower + 1, len(values) - 1)
+            toReturn.append(values[lower] + (values[upper] - values[lower]) * (position - lower))
+
+        return toReturn
+
+    def histogram(self, field, bins=10, valueRange=None):
+        """Counts the values of a field falling in equal width bins, as numpy.histogram() does.
+
+        Args:
+            field (string): One of the fields.
+            bins (int, optional): Number of bins. Defaults to 10.
+            valueRange (tuple, optional): (lowest, highest) value covered. Defaults to None, the smallest and largest value.
+
+        Raises:
+            ValueError: Raised if bins is less than 1.
+
+        Returns:
+            tuple: Returns a tuple of (counts, edges), a list of bins counts and a list of the bins + 1 edges.
+        """
+        if bins < 1: raise ValueError("bins must be at least 1.")
+
+        values = self.values(field)
+
+        if self.useNumpy:
+            import numpy
+            counts, edges = numpy.histogram(values, bins, valueRange)
+            return ([int(count) for count in counts], [float(edge) for edge in edges])
+
+        if valueRange is None:
+            valueRange = (min(values), max(values)) if len(values) > 0 else (0.0, 1.0)
+
+        low, high = float(valueRange[0]), float(valueRange[1])
+        if low == high:
+            low -= 0.5
+            high += 0.5
+
+        width = (high - low) / bins
+        counts = [0] * bins
+
+        for value in values:
+            if value < low or value > high: continue
+            counts[min(int((value - low) / width), bins - 1)] += 1
+
+        edges = [low + width * x for x in range(bins)] + [high]
+        return (counts, edges)
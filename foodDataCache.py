@@ -0,0 +1,193 @@
+import gc
+import hashlib
+import marshal
+import os
+import os.path
+
+class FoodDataCache(object):
+    FILE_SUFFIX = ".cache"
+    VERSION = 4
+    HASH_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, filePath, dataFilePath=None):
+        """Creates a new FoodDataCache object. The cache holds already read food data in binary form, so a food data file
+            that has not changed since it was last read does not have to be parsed again. Only plain values are stored,
+            written with marshal, so loading a cache file never runs code from it the way unpickling can.
+
+        Args:
+            filePath (string): Path to the cache file.
+            dataFilePath (string, optional): Path to the data file the cache belongs to. When provided, the contents of
+                the data file are hashed into the cache file and checked on load. Defaults to None.
+        """
+        self.filePath = filePath
+        self.dataFilePath = dataFilePath
+
+    @classmethod
+    def forDataFile(cls, dataFilePath, suffix=FILE_SUFFIX):
+        """Creates a FoodDataCache object stored beside the data file provided.
+
+        Args:
+            dataFilePath (string): Path to the food data file this cache belongs to.
+            suffix (string, optional): Added to the data file path to name the cache file. Defaults to FILE_SUFFIX.
+
+        Returns:
+            FoodDataCache Object: Returns a new FoodDataCache object.
+        """
+        return cls(dataFilePath + suffix, dataFilePath)
+
+    @classmethod
+    def fingerprint(cls, dataFilePath):
+        """Identifies the current version of a data file without reading it. The contents are only hashed once the
+            fingerprint matches the one a cache file was saved with, see load().
+
+        Args:
+            dataFilePath (string): Path to the food data file.
+
+        Returns:
+            tuple: Returns a tuple of (size, mtime in nanoseconds).
+        """
+        stat = os.stat(dataFilePath)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def contentHash(cls, dataFilePath):
+        """Hashes the contents of a data file.
+
+        Args:
+            dataFilePath (string): Path to the food data file.
+
+        Returns:
+            string: Returns the hex digest of the contents.
+        """
+        contentHash = hashlib.blake2b()
+
+        with open(dataFilePath, mode="rb") as f:
+            for block in iter(lambda: f.read(cls.HASH_BLOCK_SIZE), b""):
+                contentHash.update(block)
+
+        return contentHash.hexdigest()
+
+    def _header(self, fingerprint, chunked):
+        contentHash = None if self.dataFilePath is None else FoodDataCache.contentHash(self.dataFilePath)
+        return {"version": FoodDataCache.VERSION, "fingerprint": fingerprint, "contentHash": contentHash, "chunked": chunked}
+
+    def _readHeader(self, f, fingerprint, chunked):
+        """Reads the header of an open cache file and checks it matches. The data file is only hashed when everything
+            else matches, so a stale cache is turned down without reading the data file.
+
+        Returns:
+            bool: Returns True if the cache was saved for the same data file contents.
+        """
+        try:
+            header = marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            return False
+
+        if not isinstance(header, dict): return False
+        if header.get("version") != FoodDataCache.VERSION or header.get("chunked") != chunked: return False
+        if header.get("fingerprint") != fingerprint: return False
+
+        if self.dataFilePath is None: return True
+        return header.get("contentHash") == FoodDataCache.contentHash(self.dataFilePath)
+
+    def load(self, fingerprint):
+        """Loads the cached data if it was saved for the same data file contents.
+
+        Args:
+            fingerprint (tuple): Data file fingerprint as returned by fingerprint().
+
+        Returns:
+            object: Returns the cached data. Returns None if the cache is missing, stale or unreadable.
+        """
+        if not os.path.exists(self.filePath): return None
+
+        # Loading creates a large number of containers at once; pausing the garbage collector roughly halves load time.
+        gcWasEnabled = gc.isenabled()
+        gc.disable()
+
+        try:
+            with open(self.filePath, mode="rb") as f:
+                if not self._readHeader(f, fingerprint, False): return None
+                return marshal.loads(marshal.load(f))
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        finally:
+            if gcWasEnabled: gc.enable()
+
+    def save(self, fingerprint, data):
+        """Saves data to the cache, replacing the previous cache file in a single step.
+
+        Args:
+            fingerprint (tuple): Fingerprint of the data file the data was read from.
+            data (object): Data to cache, made of dict, list, set, tuple, str, bytes, int, float, bool and None values.
+
+        Raises:
+            ValueError: Raised if data holds a value of any other type.
+        """
+        tempFilePath = self.filePath + ".tmp"
+
+        with open(tempFilePath, mode="wb") as f:
+            marshal.dump(self._header(fingerprint, False), f)
+            # Written as one bytes value, which is read in one go. marshal reads the values in a file a few bytes at a time.
+            marshal.dump(marshal.dumps(data), f)
+
+        os.replace(tempFilePath, self.filePath)
+
+    def loadChunks(self, fingerprint):
+        """Loads data saved with saveChunks() a chunk at a time, if it was saved for the same data file contents.
+
+        Args:
+            fingerprint (tuple): Data file fingerprint as returned by fingerprint().
+
+        Raises:
+            ValueError: Raised part way through if the cache file is cut short or unreadable.
+
+        Yields:
+            tuple: Returns (chunk, progress) pairs, where progress is the fraction of the cache file read, from 0 to 1.
+                Yields nothing if the cache is missing or stale.
+        """
+        if not os.path.exists(self.filePath): return
+
+        with open(self.filePath, mode="rb") as f:
+            size = max(1, os.fstat(f.fileno()).st_size)
+            if not self._readHeader(f, fingerprint, True): return
+
+            while True:
+                try:
+                    chunk = marshal.load(f)
+                    if chunk is not None: chunk = marshal.loads(chunk)
+                except (EOFError, ValueError, TypeError) as err:
+                    raise ValueError(f"Cache file is unreadable: {err}")
+
+                if chunk is None: return
+                yield (chunk, f.tell() / size)
+
+    def saveChunks(self, fingerprint, chunks):
+        """Saves data to the cache as a series of chunks, so it can be loaded a chunk at a time with loadChunks().
+            Each chunk is written on its own, which keeps every step short however much data there is.
+
+        Args:
+            fingerprint (tuple): Fingerprint of the data file the data was read from.
+            chunks (iterable): Plain values to cache, as for save(), none of them None.
+
+        Raises:
+            ValueError: Raised if a chunk holds a value save() can not store.
+        """
+        tempFilePath = self.filePath + ".tmp"
+
+        with open(tempFilePath, mode="wb") as f:
+            marshal.dump(self._header(fingerprint, True), f)
+
+            # Each chunk is written as one bytes value, as in save().
+            for chunk in chunks:
+                marshal.dump(marshal.dumps(chunk), f)
+            # Marks the end, so a file cut short between two chunks is not taken for complete.
+            marshal.dump(None, f)
+
+        os.replace(tempFilePath, self.filePath)
+
+    def clear(self):
+        """Removes the cache file.
+        """
+        if os.path.exists(self.filePath):
+            os.remove(self.filePath)
@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class FoodDataSaver(object):
+    DEFAULT_DELAY = 0.5
+
+    def __init__(self, saveFunction, delay=DEFAULT_DELAY):
+        """Creates a new FoodDataSaver object. Runs saves on a background thread, coalescing save requests
+            made in quick succession into a single save.
+
+        Args:
+            saveFunction (callable): Function that performs the save. Called on the saver thread.
+            delay (float, optional): Seconds to wait for further requests before saving. Defaults to DEFAULT_DELAY.
+        """
+        self.saveFunction = saveFunction
+        self.delay = delay
+        self.lastError = None
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pending = False
+        self._flushing = False
+
+    def requestSave(self):
+        """Schedules a save. Returns straight away, starting the saver thread if it is not running.
+        """
+        with self._condition:
+            self._pending = True
+
+            if self._thread is None:
+                # Not a daemon thread, so a pending save still completes if the program exits without calling flush().
+                self._thread = threading.Thread(target=self._run, name="FoodDataSaver")
+                self._thread.start()
+
+            self._condition.notify_all()
+
+    def isPending(self):
+        """Returns True if a save has been requested or is in progress.
+        """
+        with self._condition:
+            return self._thread is not None
+
+    def flush(self):
+        """Runs any pending save without waiting out the delay and blocks until it has finished.
+
+        Raises:
+            Exception: Re-raises the error of the last save if it failed.
+        """
+        if threading.current_thread() is self._thread: return
+
+        with self._condition:
+            self._flushing = True
+            self._condition.notify_all()
+
+            while self._thread is not None:
+                self._condition.wait()
+
+            self._flushing = False
+            error = self.lastError
+            self.lastError = None
+
+        if error is not None: raise error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.delay
+
+                while not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0: break
+                    self._condition.wait(remaining)
+
+                self._pending = False
+
+            error = None
+            try:
+                self.saveFunction()
+            except Exception as err:
+                error = err
+                logger.exception("Background save failed.")
+
+            with self._condition:
+                self.lastError = error
+
+                if not self._pending:
+                    self._thread = None
+                    self._condition.notify_all()
+                    return
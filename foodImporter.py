@@ -0,0 +1,529 @@
+"""Imports foods in bulk from CSV, TSV and JSONL files, such as vendor catalogs and Open Food Facts dumps.
+
+Usage:
+    python foodImporter.py <file> [--schema openfoodfacts|<schema.json>] [--format csv|tsv|jsonl] [--rejected PATH] [--keep-existing]
+                           [--commit-every N] [--workers N]
+
+Files are read a row at a time, so dumps of any size import without being loaded whole. Files ending in .gz are decompressed
+while they are read. With more than one worker, rows are parsed and validated by a process pool a block of the file at a time.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import os.path
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from caloriePal import CaloriePal, Food, ServingUom
+from foodSchema import CALORIE_PAL_EXPORT_SCHEMA, OPEN_FOOD_FACTS_SCHEMA, ImportSchema
+from uomConversion import standardConversion
+
+IMPORT_FORMATS = ("csv", "tsv", "jsonl")
+
+# Bytes of an import file read at a time and sent to a worker process, see splitBlocks().
+BLOCK_SIZE = 1024 * 1024
+
+SCHEMA_PRESETS = {
+    'openfoodfacts': OPEN_FOOD_FACTS_SCHEMA,
+    'caloriepal': CALORIE_PAL_EXPORT_SCHEMA
+}
+
+def detectFormat(filePath):
+    """Guesses the format of an import file from its extension, ignoring a trailing .gz.
+
+    Returns:
+        string: Returns one of IMPORT_FORMATS. Returns "csv" for unknown extensions.
+    """
+    name = filePath.lower()
+    if name.endswith(".gz"): name = name[:-3]
+
+    extension = os.path.splitext(name)[1]
+    if extension in (".tsv", ".tab"): return "tsv"
+    if extension in (".jsonl", ".ndjson"): return "jsonl"
+    return "csv"
+
+def openImportFile(filePath, binary=False):
+    """Opens an import file for reading as text, or as bytes when binary is True, decompressing it while it is read
+        when it ends in .gz.
+    """
+    if binary: return gzip.open(filePath, mode="rb") if filePath.lower().endswith(".gz") else open(filePath, mode="rb")
+
+    if filePath.lower().endswith(".gz"): return gzip.open(filePath, mode="rt", encoding="utf-8", newline="")
+    return open(filePath, mode="r", encoding="utf-8", newline="")
+
+def _parseHeader(header, fileFormat):
+    """Reads the columns of a CSV header line.
+
+    Returns:
+        tuple: Returns a tuple of (columns, delimiter).
+    """
+    delimiter = "\t" if fileFormat == "tsv" or header.count("\t") > header.count(",") else ","
+    # Open Food Facts rows hold fields far longer than the csv module allows by default.
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+    return (next(csv.reader([header], delimiter=delimiter)), delimiter)
+
+def splitRows(lines, fileFormat):
+    """Splits an import file into rows, one line at a time, without turning them into dictionaries, see parseRow().
+
+    Args:
+        lines (iterable): Lines of the file, such as an open file.
+        fileFormat (string): One of IMPORT_FORMATS. CSV files whose header line holds more tabs than commas are read as TSV,
+            since Open Food Facts names its tab separated exports .csv.
+
+    Raises:
+        ValueError: Raised if fileFormat is unknown.
+
+    Returns:
+        tuple: Returns a tuple of (columns, rows). columns is the list of CSV columns, None for JSONL. rows is an iterator of
+            (lineNumber, payload) pairs, where payload is the list of CSV fields or the JSONL line.
+    """
+    if fileFormat not in IMPORT_FORMATS: raise ValueError(f"fileFormat must be one of {IMPORT_FORMATS}, not '{fileFormat}'.")
+
+    if fileFormat == "jsonl":
+        return (None, ((lineNumber, line) for lineNumber, line in enumerate(lines, 1) if len(line.strip()) > 0))
+
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None: return ([], iter(()))
+
+    columns, delimiter = _parseHeader(header, fileFormat)
+    reader = csv.reader(lines, delimiter=delimiter)
+
+    # The header was read before the reader, so its line numbers are one short.
+    return (columns, ((reader.line_num + 1, fields) for fields in reader if len(fields) > 0))
+
+def splitBlocks(f, fileFormat, blockSize=BLOCK_SIZE):
+    """Splits an import file into blocks of whole rows, for parsing in worker processes, see _buildBlock(). Blocks end
+        on a line break outside of any quoted CSV field, so every row is parsed from a single block.
+
+    Args:
+        f (file Object): Import file opened in binary mode, see openImportFile().
+        fileFormat (string): One of IMPORT_FORMATS, see splitRows().
+        blockSize (int, optional): Bytes read at a time. A block is cut at the end of the last whole row read.
+            Defaults to BLOCK_SIZE.
+
+    Raises:
+        ValueError: Raised if fileFormat is unknown.
+
+    Returns:
+        tuple: Returns a tuple of (columns, delimiter, blocks). columns is the list of CSV columns and delimiter the CSV
+            delimiter, both None for JSONL. blocks is an iterator of (lineNumber, data) pairs, where data is the UTF-8
+            encoded text of the block and lineNumber the line it starts on.
+    """
+    if fileFormat not in IMPORT_FORMATS: raise ValueError(f"fileFormat must be one of {IMPORT_FORMATS}, not '{fileFormat}'.")
+
+    if fileFormat == "jsonl":
+        return (None, None, _iterBlocks(f, 1, blockSize, lambda data: data.rfind(b"\n") + 1))
+
+    header = f.readline()
+    if len(header) <= 0: return ([], None, iter(()))
+
+    columns, delimiter = _parseHeader(header.decode("utf-8"), fileFormat)
+    # A quote only starts a quoted field at the start of a field, elsewhere the csv module keeps it as it is.
+    fieldQuote = re.compile(rb'"(?<![^' + re.escape(delimiter.encode("utf-8")) + rb'\r\n]")')
+
+    return (columns, delimiter, _iterBlocks(f, 2, blockSize, lambda data: _csvRowsEnd(data, fieldQuote)))
+
+def _iterBlocks(f, lineNumber, blockSize, rowsEnd):
+    """Yields (lineNumber, data) for each block of whole rows of a file, see splitBlocks().
+
+    Args:
+        rowsEnd (callable): Returns the end of the last whole row in the bytes provided, 0 if there is none.
+    """
+    data = b""
+
+    for read in iter(lambda: f.read(blockSize), b""):
+        data += read
+
+        end = rowsEnd(data)
+        if end <= 0: continue
+
+        block = data[:end]
+        data = data[end:]
+        yield (lineNumber, block)
+        lineNumber += _countLines(block)
+
+    if len(data) > 0: yield (lineNumber, data)
+
+def _countLines(data):
+    """Counts the lines of text the way a file opened with newline="" splits them, on "\\n", "\\r" and "\\r\\n".
+    """
+    return data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+
+# Rest of a quoted CSV field after its opening quote, up to the closing quote. Doubled quotes are part of the field.
+QUOTED_FIELD_REST = re.compile(rb'[^"]*(?:""[^"]*)*"(?!")')
+
+def _csvRowsEnd(data, fieldQuote):
+    """Finds the end of the last whole CSV row in bytes starting at the start of a row, skipping line breaks inside
+        quoted fields.
+
+    Args:
+        data (bytes): Rows of the file.
+        fieldQuote (re.Pattern Object): Matches a quote starting a quoted field.
+
+    Returns:
+        int: Returns the position after the last line break outside a quoted field, 0 if there is none.
+    """
+    end = 0
+    position = 0
+
+    while True:
+        quote = fieldQuote.search(data, position)
+        lineEnd = data.rfind(b"\n", position, len(data) if quote is None else quote.start())
+        if lineEnd >= 0: end = lineEnd + 1
+        if quote is None: return end
+
+        # A quoted field running past the end of the data leaves the rest of the data for the next block.
+        quoted = QUOTED_FIELD_REST.match(data, quote.end())
+        if quoted is None: return end
+        position = quoted.end()
+
+def parseRow(columns, payload):
+    """Turns a row returned by splitRows() into a dictionary of column to value.
+
+    Returns:
+        dict: Returns the row. Returns None for JSONL lines that are not a JSON object.
+    """
+    if columns is not None: return dict(zip(columns, payload))
+
+    try:
+        row = json.loads(payload)
+    except json.JSONDecodeError:
+        return None
+    return row if isinstance(row, dict) else None
+
+def iterRows(lines, fileFormat):
+    """Yields each row of an import file as a dictionary of column to value, one line at a time. See splitRows().
+
+    Yields:
+        tuple: Returns (lineNumber, row) pairs. row is None for JSONL lines that are not a JSON object.
+    """
+    columns, rows = splitRows(lines, fileFormat)
+
+    for lineNumber, payload in rows:
+        yield (lineNumber, parseRow(columns, payload))
+
+def buildFood(schema, row):
+    """Builds the Food of a row. Its servingSizeUom is a stand in holding the UOM code or name found in the row,
+        to be swapped for a registered UOM, see FoodImporter.
+
+    Args:
+        schema (ImportSchema Object): Maps the columns of the row onto Food fields.
+        row (dict): Dictionary of column to value, None for a line that could not be parsed.
+
+    Raises:
+        ValueError: Raised if the row can not make a valid food.
+        KeyError: Raised by Food.fromDictionary() if a field is missing.
+
+    Returns:
+        Food Object: Returns the food.
+    """
+    if row is None: raise ValueError("Line is not a JSON object.")
+
+    record = schema.mapRow(row)
+    uom = record['servingSizeUom']
+    record['servingSizeUom'] = {'name': uom, 'code': uom}
+
+    return Food.fromDictionary(record)
+
+def _buildRow(schema, columns, lineNumber, payload):
+    """Parses and validates a single row.
+
+    Returns:
+        tuple: Returns (lineNumber, row, food, reason). row and reason are None if the row is valid, food is None if it is not.
+    """
+    row = parseRow(columns, payload)
+
+    try:
+        return (lineNumber, None, buildFood(schema, row), None)
+    except (KeyError, TypeError, ValueError) as err:
+        return (lineNumber, row, None, str(err))
+
+# Schema, CSV columns and delimiter of the import running in a worker process, set once by _initWorker() rather than sent with every block.
+_workerSchema = None
+_workerColumns = None
+_workerDelimiter = None
+
+def _initWorker(schema, columns, delimiter):
+    global _workerSchema, _workerColumns, _workerDelimiter
+    _workerSchema = schema
+    _workerColumns = columns
+    _workerDelimiter = delimiter
+    # Raised for the worker as _parseHeader() does for this process.
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+
+def _buildBlock(block):
+    """Parses and validates a block of rows in a worker process, see splitBlocks(). Valid rows are sent back as the fields
+        of their food rather than a Food object, since plain tuples are far cheaper to send between processes.
+
+    Args:
+        block (tuple): (lineNumber, data) pair, see splitBlocks().
+
+    Returns:
+        list: Returns a (lineNumber, row, fields, reason) tuple for each row, as _buildRow() does, with fields holding
+            the barcode, description, detailed description, calories per serving, serving size and UOM code of the food.
+    """
+    firstLine, data = block
+    lines = io.StringIO(data.decode("utf-8"), newline="")
+
+    if _workerColumns is None:
+        rawRows = ((lineNumber, line) for lineNumber, line in enumerate(lines, firstLine) if len(line.strip()) > 0)
+    else:
+        reader = csv.reader(lines, delimiter=_workerDelimiter)
+        rawRows = ((firstLine - 1 + reader.line_num, fields) for fields in reader if len(fields) > 0)
+
+    builtRows = []
+    for lineNumber, payload in rawRows:
+        lineNumber, row, food, reason = _buildRow(_workerSchema, _workerColumns, lineNumber, payload)
+        if food is not None:
+            food = (food.barcode, food.description, food.detailedDescription, food.caloriesPerServing, food.servingSize,
+                    food.servingSizeUom.code)
+        builtRows.append((lineNumber, row, food, reason))
+
+    return builtRows
+
+
+class ImportResult(object):
+    def __init__(self, rows, imported, rejected, seconds, rejectedFilePath):
+        """Creates a new ImportResult object, holding the outcome of FoodImporter.importFile().
+
+        Args:
+            rows (int): Number of rows read.
+            imported (int): Number of foods added or updated.
+            rejected (int): Number of rows rejected.
+            seconds (float): Time taken.
+            rejectedFilePath (string): File the rejected rows were written to, None if no row was rejected.
+        """
+        self.rows = rows
+        self.imported = imported
+        self.rejected = rejected
+        self.seconds = seconds
+        self.rejectedFilePath = rejectedFilePath
+
+    @property
+    def rowsPerSecond(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        toReturn = f"{self.rows} rows, {self.imported} imported, {self.rejected} rejected in {self.seconds:.2f}s ({self.rowsPerSecond:,.0f} rows/s)"
+        if self.rejectedFilePath is not None: toReturn += f", rejected rows written to '{self.rejectedFilePath}'"
+        return toReturn
+
+
+class FoodImporter(object):
+    REJECTED_FILE_SUFFIX = ".rejected.jsonl"
+
+    def __init__(self, calPal, schema, updateExisting=True, progress=None, progressEvery=100000, commitEvery=None, workers=1,
+                 blockSize=BLOCK_SIZE):
+        """Creates a new FoodImporter object.
+
+        Args:
+            calPal (CaloriePal Object): CaloriePal to import foods into.
+            schema (ImportSchema Object): Maps the columns of import files onto Food fields.
+            updateExisting (bool, optional): Replaces foods already stored under a row's barcode when True,
+                otherwise rejects the row. Defaults to True.
+            progress (callable, optional): Called with the number of rows read and the seconds taken so far
+                every progressEvery rows. Defaults to None.
+            progressEvery (int, optional): Rows between calls to progress. Defaults to 100000.
+            commitEvery (int, optional): Commits the import a batch of this many rows at a time, so the changes held
+                until a batch is persisted stay bounded. If a batch fails, the batches before it stay imported.
+                Defaults to None, which imports the whole file as a single batch.
+            workers (int, optional): Number of processes parsing and validating rows. With more than 1, the file is split
+                into blocks of whole rows sent to a process pool, and their foods are added in file order, so the outcome
+                matches an import with 1. Defaults to 1, which does everything in this process.
+            blockSize (int, optional): Bytes of the file sent to a worker process at a time, see splitBlocks().
+                Defaults to BLOCK_SIZE.
+
+        Raises:
+            ValueError: Raised if commitEvery, workers or blockSize is less than 1.
+        """
+        if commitEvery is not None and commitEvery < 1: raise ValueError("commitEvery must be at least 1.")
+        if workers < 1: raise ValueError("workers must be at least 1.")
+        if blockSize < 1: raise ValueError("blockSize must be at least 1.")
+
+        self.calPal = calPal
+        self.schema = schema
+        self.updateExisting = updateExisting
+        self.progress = progress
+        self.progressEvery = progressEvery
+        self.commitEvery = commitEvery
+        self.workers = workers
+        self.blockSize = blockSize
+
+    def importFile(self, filePath, fileFormat=None, rejectedFilePath=None):
+        """Imports every row of a file as a single batch, see CaloriePal.batch(), or a batch of commitEvery rows at a time
+            when it is set. Rows that can not make a valid food are written to the rejected rows file as JSON lines holding
+            the line number, the reason and the row. If a batch fails to persist, none of its foods are kept and the error
+            is raised; with a single batch, no food from the file is kept.
+
+        Args:
+            filePath (string): File to import.
+            fileFormat (string, optional): One of IMPORT_FORMATS. Defaults to None, which guesses it from the extension.
+            rejectedFilePath (string, optional): File to write rejected rows to. Replaced if it exists.
+                Defaults to None, which is filePath with REJECTED_FILE_SUFFIX added.
+
+        Returns:
+            ImportResult Object: Returns the counts and time taken.
+        """
+        if fileFormat is None: fileFormat = detectFormat(filePath)
+        if rejectedFilePath is None: rejectedFilePath = filePath + FoodImporter.REJECTED_FILE_SUFFIX
+        if os.path.exists(rejectedFilePath): os.remove(rejectedFilePath)
+
+        rows = 0
+        imported = 0
+        rejected = 0
+        rejectedFile = None
+        startTime = time.perf_counter()
+
+        builtRows = self._buildRows(filePath, fileFormat)
+
+        try:
+            if self.commitEvery is None:
+                chunks = [builtRows]
+            else:
+                chunks = iter(lambda: list(islice(builtRows, self.commitEvery)), [])
+
+            for chunk in chunks:
+                with self.calPal.batch():
+                    for lineNumber, row, food, reason in chunk:
+                        rows += 1
+
+                        if reason is None: reason = self._importFood(food)
+                        if reason is None:
+                            imported += 1
+                        else:
+                            rejected += 1
+                            if rejectedFile is None: rejectedFile = open(rejectedFilePath, mode="w", encoding="utf-8")
+                            rejectedFile.write(json.dumps({'line': lineNumber, 'reason': reason, 'row': row}) + "\n")
+
+                        if self.progress is not None and rows % self.progressEvery == 0:
+                            self.progress(rows, time.perf_counter() - startTime)
+        finally:
+            builtRows.close()
+            if rejectedFile is not None: rejectedFile.close()
+
+        return ImportResult(rows, imported, rejected, time.perf_counter() - startTime, rejectedFilePath if rejected > 0 else None)
+
+    def _buildRows(self, filePath, fileFormat):
+        """Reads a file and parses and validates its rows, in this process or in a process pool.
+
+        Yields:
+            tuple: Returns a (lineNumber, row, food, reason) tuple for each row, in file order, see _buildRow().
+        """
+        if self.workers <= 1:
+            with openImportFile(filePath) as f:
+                columns, rawRows = splitRows(f, fileFormat)
+                for lineNumber, payload in rawRows:
+                    yield _buildRow(self.schema, columns, lineNumber, payload)
+            return
+
+        with openImportFile(filePath, binary=True) as f:
+            columns, delimiter, blocks = splitBlocks(f, fileFormat, self.blockSize)
+            pool = ProcessPoolExecutor(self.workers, initializer=_initWorker, initargs=(self.schema, columns, delimiter))
+            pending = deque()
+            # Stand in UOM of each code, shared by the foods rebuilt from the fields the workers send, see buildFood().
+            standIns = {}
+
+            try:
+                for block in blocks:
+                    pending.append(pool.submit(_buildBlock, block))
+
+                    # Keeps a couple of blocks per worker in flight, so the file is still read in constant memory.
+                    if len(pending) >= self.workers * 2:
+                        yield from self._rebuildFoods(pending.popleft().result(), standIns)
+
+                while len(pending) > 0:
+                    yield from self._rebuildFoods(pending.popleft().result(), standIns)
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _rebuildFoods(builtRows, standIns):
+        """Turns the rows built by _buildBlock() back into the tuples _buildRow() returns.
+        """
+        for lineNumber, row, fields, reason in builtRows:
+            if fields is not None:
+                uomCode = fields[5]
+                standIn = standIns.get(uomCode)
+                if standIn is None: standIn = standIns[uomCode] = ServingUom(uomCode, uomCode)
+
+                fields = Food(fields[0], fields[1], fields[2], fields[3], fields[4], standIn)
+            yield (lineNumber, row, fields, reason)
+
+    def _importFood(self, food):
+        """Adds or updates the food of a single valid row.
+
+        Returns:
+            string: Returns the reason the row was rejected. Returns None if it was imported.
+        """
+        try:
+            food.servingSizeUom = self._findUom(food.servingSizeUom.code)
+        except ValueError as err:
+            return str(err)
+
+        if not self.updateExisting and self.calPal.findFoodDataByBarcode(food.barcode) is not None:
+            return f"Barcode '{food.barcode}' already exists."
+
+        self.calPal.updateFood(food)
+        return None
+
+    def _findUom(self, uom):
+        """Finds the serving UOM of a row by code, then by name. Standard units that are not registered yet,
+            see uomConversion.STANDARD_CONVERSIONS, are added.
+
+        Raises:
+            ValueError: Raised if the UOM is unknown.
+        """
+        servingUoms = self.calPal.servingUoms
+        servingUom = servingUoms.findByCode(uom) or servingUoms.findByName(uom) or servingUoms.findByCode(uom.lower())
+        if servingUom is not None: return servingUom
+
+        dimension, factor = standardConversion(uom)
+        if dimension is None: raise ValueError(f"Unknown serving UOM '{uom}'.")
+
+        servingUom = ServingUom(uom, uom)
+        self.calPal.addUom(servingUom)
+        return servingUom
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Imports foods from a CSV, TSV or JSONL file.")
+    parser.add_argument("file", help="File to import. Files ending in .gz are decompressed while read.")
+    parser.add_argument("--schema", default="openfoodfacts",
+                        help=f"One of {sorted(SCHEMA_PRESETS)}, or a JSON file with 'columns' and 'defaults'. Defaults to openfoodfacts.")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Format of the file. Defaults to guessing from the extension.")
+    parser.add_argument("--rejected", help="File to write rejected rows to. Defaults to the file name with .rejected.jsonl added.")
+    parser.add_argument("--keep-existing", action="store_true", help="Rejects rows whose barcode is already stored instead of updating the food.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes parsing and validating rows. Defaults to 1.")
+    parser.add_argument("--commit-every", type=int,
+                        help="Commits the import this many rows at a time, keeping the rows committed if a later batch fails. "
+                             "Defaults to committing the whole file at once.")
+    args = parser.parse_args(args)
+
+    if args.schema in SCHEMA_PRESETS:
+        schema = SCHEMA_PRESETS[args.schema]
+    else:
+        with open(args.schema, mode="r") as f:
+            schema = ImportSchema.fromDictionary(json.load(f))
+
+    def progress(rows, seconds):
+        sys.stderr.write(f"{rows} rows, {rows / seconds if seconds > 0 else 0:,.0f} rows/s\n")
+
+    calPal = CaloriePal()
+    importer = FoodImporter(calPal, schema, not args.keep_existing, progress, commitEvery=args.commit_every,
+                            workers=args.workers)
+    result = importer.importFile(args.file, args.format, args.rejected)
+    calPal.flush()
+
+    sys.stderr.write(f"{result}\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
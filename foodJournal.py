@@ -0,0 +1,142 @@
+import json
+import os
+import os.path
+
+class FoodJournal(object):
+    FILE_SUFFIX = ".journal"
+    ROTATED_FILE_SUFFIX = ".old"
+    DEFAULT_COMPACT_THRESHOLD = 1024 * 1024
+
+    ADD = "add"
+    UPDATE = "update"
+    REMOVE = "remove"
+    ADD_UOM = "addUom"
+
+    def __init__(self, filePath, compactThreshold=DEFAULT_COMPACT_THRESHOLD):
+        """Creates a new FoodJournal object. A journal is an append-only log of changes made
+            since the food data file was last written in full.
+
+        Args:
+            filePath (string): Path to the journal file.
+            compactThreshold (int, optional): Journal size in bytes after which it should be folded back into the
+                food data file. Defaults to DEFAULT_COMPACT_THRESHOLD.
+        """
+        self.filePath = filePath
+        self.rotatedFilePath = filePath + FoodJournal.ROTATED_FILE_SUFFIX
+        self.compactThreshold = compactThreshold
+
+    @classmethod
+    def forDataFile(cls, dataFilePath, compactThreshold=DEFAULT_COMPACT_THRESHOLD):
+        """Creates a FoodJournal object stored beside the data file provided.
+
+        Args:
+            dataFilePath (string): Path to the food data file this journal belongs to.
+            compactThreshold (int, optional): See FoodJournal(). Defaults to DEFAULT_COMPACT_THRESHOLD.
+
+        Returns:
+            FoodJournal Object: Returns a new FoodJournal object.
+        """
+        return cls(dataFilePath + cls.FILE_SUFFIX, compactThreshold)
+
+    def append(self, op, key, data=None):
+        """Appends one change record to the journal and forces it to disk.
+
+        Args:
+            op (string): One of ADD, UPDATE, REMOVE or ADD_UOM.
+            key (string): Barcode of the food changed, or the UOM code for ADD_UOM.
+            data (dict, optional): Record data as it is stored in the food data file. Defaults to None.
+        """
+        self.appendMany([(op, key, data)])
+
+    def appendMany(self, changes):
+        """Appends several change records to the journal, forcing them to disk once.
+
+        Args:
+            changes (list): List of (op, key, data) tuples, see append().
+        """
+        lines = []
+        for op, key, data in changes:
+            entry = {"op": op, "key": key}
+            if data is not None: entry["data"] = data
+            lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+
+        with open(self.filePath, mode="a") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def readEntries(self):
+        """Reads change records from the journal in the order they were written, starting with a rotated journal
+            that was not cleared. Lines that can not be decoded, such as a write cut short by a crash, are skipped.
+
+        Yields:
+            dict: Change record containing an 'op', 'key' and optionally a 'data' key.
+        """
+        for filePath in (self.rotatedFilePath, self.filePath):
+            if not os.path.exists(filePath): continue
+
+            with open(filePath, mode="r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+                    if not isinstance(entry, dict) or "op" not in entry or "key" not in entry: continue
+                    yield entry
+
+    def size(self):
+        """Returns the journal size in bytes. Returns 0 if the journal does not exist.
+        """
+        if not os.path.exists(self.filePath): return 0
+        return os.path.getsize(self.filePath)
+
+    def fingerprint(self):
+        """Identifies the current state of the journal files.
+
+        Returns:
+            tuple: Returns a (size, mtime in nanoseconds) tuple for the rotated and current journal, None for a missing file.
+        """
+        states = []
+        for filePath in (self.rotatedFilePath, self.filePath):
+            if os.path.exists(filePath):
+                stat = os.stat(filePath)
+                states.append((stat.st_size, stat.st_mtime_ns))
+            else:
+                states.append(None)
+
+        return tuple(states)
+
+    def needsCompaction(self):
+        """Returns True once the journal has grown past its compaction threshold.
+        """
+        return self.size() >= self.compactThreshold
+
+    def rotate(self):
+        """Moves the current journal aside before a snapshot is taken, so changes appended while the snapshot
+            is written go to a new journal. The rotated journal is removed by clearRotated() once the snapshot is on disk.
+        """
+        if not os.path.exists(self.filePath): return
+
+        if not os.path.exists(self.rotatedFilePath):
+            os.replace(self.filePath, self.rotatedFilePath)
+            return
+
+        # A previous snapshot never completed, keep its changes ahead of the current ones.
+        with open(self.filePath, mode="r") as source, open(self.rotatedFilePath, mode="a") as target:
+            target.write(source.read())
+        os.remove(self.filePath)
+
+    def clearRotated(self):
+        """Removes the rotated journal. Called after its changes have been written to the food data file.
+        """
+        if os.path.exists(self.rotatedFilePath):
+            os.remove(self.rotatedFilePath)
+
+    def clear(self):
+        """Removes the journal files. Called after their changes have been written to the food data file.
+        """
+        self.clearRotated()
+
+        if os.path.exists(self.filePath):
+            os.remove(self.filePath)
@@ -0,0 +1,164 @@
+"""Turns the edited text of a page of foods, as the raw food data viewer shows it, into the changes it makes.
+
+Only the records added, changed or removed are validated and applied, so saving a one line edit costs the same however
+large the catalog is.
+"""
+import json
+from caloriePal import Food
+from foodStorage import JsonRecordIndex
+
+def parseFoodRecords(text):
+    """Parses a JSON object of barcode to record, keeping the line each record starts on.
+
+    Args:
+        text (string): JSON text, formatted as the raw food data viewer shows a page of foods.
+
+    Raises:
+        json.JSONDecodeError: Raised if the text is not a JSON object, or a barcode appears more than once.
+            Its lineno and colno give where.
+
+    Returns:
+        dict: Returns a dictionary of barcode to (lineNumber, record), in the order written.
+    """
+    decoder = json.JSONDecoder()
+    records = {}
+
+    idx = JsonRecordIndex.WHITESPACE.match(text).end()
+    if text[idx:idx + 1] != "{": raise json.JSONDecodeError("Expecting '{'", text, idx)
+    idx = JsonRecordIndex.WHITESPACE.match(text, idx + 1).end()
+
+    if text[idx:idx + 1] == "}":
+        end = idx
+    else:
+        members = JsonRecordIndex.iterMembers(text, idx, decoder)
+        # Lines are counted from the previous record on, rather than from the start of the text for each record.
+        lineNumber = 1
+        counted = 0
+
+        while True:
+            try:
+                barcode, record, start, valueEnd = next(members)
+            except StopIteration as stop:
+                end = stop.value
+                break
+
+            if barcode in records: raise json.JSONDecodeError(f"Barcode '{barcode}' appears more than once", text, start)
+
+            lineNumber += text.count("\n", counted, start)
+            counted = start
+            records[barcode] = (lineNumber, record)
+
+    idx = JsonRecordIndex.WHITESPACE.match(text, end + 1).end()
+    if idx < len(text): raise json.JSONDecodeError("Extra data", text, idx)
+
+    return records
+
+
+class FoodRecordChanges(object):
+    def __init__(self):
+        """Creates a new, empty FoodRecordChanges object. Holds the foods added, updated and removed by an edit,
+            and the records that could not be made into valid foods, see diffFoodRecords().
+        """
+        self.added = []
+        self.updated = []
+        self.removed = []
+
+        # (lineNumber, barcode, reason) of each record that is not valid, in the order written.
+        self.errors = []
+
+    def __len__(self):
+        return len(self.added) + len(self.updated) + len(self.removed)
+
+    def apply(self, calPal):
+        """Applies the changes through removeFood(), updateFood() and addFood(), as a single batch.
+
+        Args:
+            calPal (CaloriePal Object): CaloriePal to apply the changes to.
+
+        Raises:
+            ValueError: Raised if any record is not valid. Nothing is applied.
+        """
+        if len(self.errors) > 0: raise ValueError(f"{len(self.errors)} record(s) are not valid.")
+
+        with calPal.batch():
+            # Removed first, so a food can be moved to another variant of its barcode in one edit.
+            for barcode in self.removed:
+                food = calPal.foodData.get(barcode)
+                if food is not None: calPal.removeFood(food)
+
+            for food in self.updated:
+                calPal.updateFood(food)
+
+            for food in self.added:
+                calPal.addFood(food)
+
+def buildEditedFood(calPal, barcode, record):
+    """Builds the Food of an edited record through Food.fromDictionary(), as foods read from the food data file are,
+        so fields the edit did not touch are kept as they are. Uses the serving UOM registered with the same code or name.
+
+    Args:
+        calPal (CaloriePal Object): CaloriePal holding the serving UOMs.
+        barcode (string): Barcode the record is written under.
+        record (dict): Record formatted like Food.toDict().
+
+    Raises:
+        KeyError: Raised if a required key is missing.
+        TypeError: Raised if the record or its servingSizeUom is not a JSON object.
+        ValueError: Raised if the serving UOM is not registered.
+
+    Returns:
+        Food Object: Returns the food.
+    """
+    if not isinstance(record, dict): raise TypeError("Record is not a JSON object.")
+
+    food = Food.fromDictionary({**record, 'barcode': barcode})
+
+    uom = food.servingSizeUom
+    servingUom = calPal.servingUoms.findByCode(uom.code) or calPal.findUomByName(uom.name)
+    if servingUom is None: raise ValueError(f"Unknown serving UOM '{uom.code}'.")
+
+    food.servingSizeUom = servingUom
+    return food
+
+def diffFoodRecords(calPal, shownRecords, text):
+    """Compares the edited text of a page of foods with the records it started from. Only reads from calPal,
+        so it can run on a background thread while the changes are applied on the thread owning calPal.
+
+    Args:
+        calPal (CaloriePal Object): CaloriePal the records were read from.
+        shownRecords (dict): Dictionary of barcode to record the text started from, see CaloriePal.getFoodRecordsPage().
+        text (string): Edited JSON text.
+
+    Raises:
+        json.JSONDecodeError: Raised if the text can not be parsed, see parseFoodRecords().
+
+    Returns:
+        FoodRecordChanges Object: Returns the changes, along with any record that is not valid.
+    """
+    editedRecords = parseFoodRecords(text)
+    changes = FoodRecordChanges()
+
+    changes.removed = [barcode for barcode in shownRecords if barcode not in editedRecords]
+    removed = set(changes.removed)
+
+    for barcode, (lineNumber, record) in editedRecords.items():
+        isNew = barcode not in shownRecords
+        if not isNew and record == shownRecords[barcode]: continue
+
+        try:
+            if isNew:
+                storedFood = calPal.findFoodDataByBarcode(barcode)
+                if storedFood is not None and storedFood.barcode not in removed:
+                    raise ValueError(f"Barcode already exists as '{storedFood.barcode}'.")
+
+            food = buildEditedFood(calPal, barcode, record)
+        except (KeyError, TypeError, ValueError) as err:
+            changes.errors.append((lineNumber, barcode, str(err)))
+            continue
+
+        if isNew:
+            changes.added.append(food)
+        else:
+            changes.updated.append(food)
+
+    return changes
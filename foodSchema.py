@@ -0,0 +1,108 @@
+"""Maps rows of food data, such as the columns of an import file or the records of an edit, onto Food fields.
+
+Kept apart from foodImporter, so modules reading records in the Calorie Pal export format do not import the importer.
+"""
+from uomConversion import toNumber
+
+class ImportSchema(object):
+    FOOD_FIELDS = ("barcode", "description", "detailedDescription", "caloriesPerServing", "servingSize", "servingSizeUom")
+
+    def __init__(self, columns, defaults=None):
+        """Creates a new ImportSchema object. Maps the columns of an import file onto Food fields.
+
+        Args:
+            columns (dict): Dictionary of Food field to the column holding it. A list of columns may be given instead,
+                the first one that is not blank is used. The servingSizeUom column holds a UOM code or name,
+                or a dictionary with a 'code' key.
+            defaults (dict, optional): Dictionary of Food field to the value used when its columns are blank or missing.
+                Defaults to None.
+
+        Raises:
+            ValueError: Raised if a key is not a Food field, or a Food field has neither a column nor a default.
+        """
+        defaults = {} if defaults is None else dict(defaults)
+
+        unknownFields = [field for field in list(columns) + list(defaults) if field not in ImportSchema.FOOD_FIELDS]
+        if len(unknownFields) > 0: raise ValueError(f"Unknown Food field(s) '{unknownFields}'.")
+
+        missingFields = [field for field in ImportSchema.FOOD_FIELDS if field not in columns and field not in defaults]
+        if len(missingFields) > 0: raise ValueError(f"No column or default for Food field(s) '{missingFields}'.")
+
+        self.columns = {field: (column,) if isinstance(column, str) else tuple(column) for field, column in columns.items()}
+        self.defaults = defaults
+
+    @classmethod
+    def fromDictionary(cls, data):
+        """Creates a new ImportSchema object from a dictionary with a 'columns' and optionally a 'defaults' key,
+            as saved in a schema JSON file.
+        """
+        if not isinstance(data, dict): raise TypeError("data must be of type dict().")
+        if 'columns' not in data: raise KeyError("Missing required key 'columns'")
+
+        return cls(data['columns'], data.get('defaults'))
+
+    def _value(self, row, field):
+        for column in self.columns.get(field, ()):
+            value = row.get(column)
+            if isinstance(value, str): value = value.strip()
+            if value is not None and value != "": return value
+
+        return self.defaults.get(field)
+
+    def mapRow(self, row):
+        """Maps a row of an import file onto a record formatted like Food.toDict(), with the barcode included.
+            Numbers held as text are converted, and the servingSizeUom is left as the code or name found in the row.
+
+        Args:
+            row (dict): Dictionary of column to value.
+
+        Raises:
+            ValueError: Raised if the row can not make a valid food. The message gives the reason.
+
+        Returns:
+            dict: Returns the record.
+        """
+        record = {field: self._value(row, field) for field in ImportSchema.FOOD_FIELDS}
+
+        # JSON rows may hold the serving UOM as a dictionary, as Food.toDict() writes it.
+        if isinstance(record['servingSizeUom'], dict): record['servingSizeUom'] = record['servingSizeUom'].get('code')
+
+        for field in ("barcode", "description", "detailedDescription", "servingSizeUom"):
+            if record[field] is None: raise ValueError(f"{field} is blank.")
+            record[field] = str(record[field])
+
+        caloriesPerServing = toNumber(record['caloriesPerServing'])
+        if caloriesPerServing is None or caloriesPerServing < 0:
+            raise ValueError(f"caloriesPerServing '{record['caloriesPerServing']}' is not a number of 0 or more.")
+
+        servingSize = toNumber(record['servingSize'])
+        if servingSize is None or servingSize <= 0:
+            raise ValueError(f"servingSize '{record['servingSize']}' is not a number above 0.")
+
+        record['caloriesPerServing'] = caloriesPerServing
+        record['servingSize'] = servingSize
+        return record
+
+
+# Open Food Facts CSV exports are tab separated, with calories given per 100 g.
+OPEN_FOOD_FACTS_SCHEMA = ImportSchema(
+    {
+        'barcode': "code",
+        'description': ("product_name", "generic_name"),
+        'detailedDescription': ("generic_name", "product_name"),
+        'caloriesPerServing': "energy-kcal_100g"
+    },
+    {'servingSize': 100, 'servingSizeUom': "g"}
+)
+
+# Reads the CSV and NDJSON files written by CaloriePal.exportFoods().
+CALORIE_PAL_EXPORT_SCHEMA = ImportSchema(
+    {
+        'barcode': "barcode",
+        'description': "description",
+        'detailedDescription': "detailedDescription",
+        'caloriesPerServing': "caloriesPerServing",
+        'servingSize': "servingSize",
+        'servingSizeUom': ("servingSizeUomCode", "servingSizeUom")
+    }
+)
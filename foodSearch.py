@@ -0,0 +1,697 @@
+import bisect
+import heapq
+import math
+import operator
+import re
+import sys
+from collections import Counter
+from itertools import chain, compress, islice, repeat
+
+class FoodSearchIndex(object):
+    TOKEN_PATTERN = re.compile(r"\w+")
+
+    # A term found in a food's description counts for more than one found in its detailed description.
+    DESCRIPTION_WEIGHT = 2
+    DETAILED_DESCRIPTION_WEIGHT = 1
+
+    def __init__(self):
+        """Creates a new FoodSearchIndex object. The index maps every word of every food's description and detailed
+            description to the barcodes of the foods containing it, so a query only looks at foods sharing its words.
+            The index starts out empty and unbuilt, see build().
+        """
+        self.built = False
+
+        # Dictionary of term to a dictionary of barcode to term weight in that food.
+        self.postings = {}
+        # Dictionary of barcode to the terms indexed for that food, so a food can be removed without its old text.
+        self.documents = {}
+
+    @classmethod
+    def tokenize(cls, text):
+        """Splits text into lower case search terms.
+
+        Args:
+            text (string): Text to split. Values that are not strings are converted first.
+
+        Returns:
+            list: Returns the terms in the order they appear, repeats included.
+        """
+        if text is None: return []
+        if not isinstance(text, str): text = str(text)
+
+        return cls.TOKEN_PATTERN.findall(text.lower())
+
+    def build(self, entries):
+        """Replaces the contents of the index.
+
+        Args:
+            entries (iterable): Iterable of (barcode, description, detailedDescription) tuples.
+        """
+        self.clear()
+
+        for barcode, description, detailedDescription in entries:
+            self._add(barcode, description, detailedDescription)
+
+        self.built = True
+
+    def clear(self):
+        """Empties the index and marks it unbuilt.
+        """
+        self.built = False
+        self.postings = {}
+        self.documents = {}
+
+    def update(self, barcode, description, detailedDescription):
+        """Adds a food to the index, replacing what was indexed for its barcode before. Does nothing until the index is built.
+
+        Args:
+            barcode (string): Barcode of the food.
+            description (string): Description of the food.
+            detailedDescription (string): Detailed description of the food.
+        """
+        if not self.built: return
+
+        self.remove(barcode)
+        self._add(barcode, description, detailedDescription)
+
+    def remove(self, barcode):
+        """Removes a food from the index. Does nothing if the barcode is not indexed.
+
+        Args:
+            barcode (string): Barcode of the food to remove.
+        """
+        terms = self.documents.pop(barcode, None)
+        if terms is None: return
+
+        for term in terms:
+            postings = self.postings[term]
+            del postings[barcode]
+            if len(postings) <= 0: del self.postings[term]
+
+    def _add(self, barcode, description, detailedDescription):
+        weights = {}
+
+        for term in self.tokenize(description):
+            weights[term] = weights.get(term, 0) + FoodSearchIndex.DESCRIPTION_WEIGHT
+        for term in self.tokenize(detailedDescription):
+            weights[term] = weights.get(term, 0) + FoodSearchIndex.DETAILED_DESCRIPTION_WEIGHT
+
+        terms = []
+        for term, weight in weights.items():
+            postings = self.postings.get(term)
+
+            if postings is None:
+                # Terms repeat across many foods, interning keeps a single copy of each.
+                term = sys.intern(term)
+                postings = self.postings[term] = {}
+
+            postings[barcode] = weight
+            terms.append(term)
+
+        self.documents[barcode] = tuple(terms)
+
+    def toState(self):
+        """Returns the contents of the index as plain dictionaries, for saving with FoodDataCache. See fromState().
+
+        Returns:
+            dict: Returns the state of the index.
+        """
+        return {'built': self.built, 'postings': self.postings, 'documents': self.documents}
+
+    @classmethod
+    def fromState(cls, state):
+        """Creates a new FoodSearchIndex object from the state toState() returned.
+
+        Args:
+            state (dict): State of an index.
+
+        Raises:
+            KeyError: Raised if a required key is missing.
+
+        Returns:
+            FoodSearchIndex Object: Returns the index.
+        """
+        index = cls()
+        index.postings = state['postings']
+        index.documents = state['documents']
+        index.built = state['built']
+        return index
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query, limit=20, matchAll=True):
+        """Finds the foods best matching a query. Foods are ranked by the weight of each query term in the food,
+            scaled so terms found in fewer foods count for more.
+
+        Args:
+            query (string): Words to search for.
+            limit (int, optional): Maximum number of results. Defaults to 20.
+            matchAll (bool, optional): Only returns foods containing every query term when True, otherwise foods
+                containing any of them. Defaults to True.
+
+        Returns:
+            list: Returns a list of (barcode, score) tuples, best match first.
+        """
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if len(terms) <= 0 or limit <= 0: return []
+
+        termPostings = [self.postings.get(term) for term in terms]
+
+        if matchAll:
+            if any(postings is None for postings in termPostings): return []
+
+            # Intersect starting from the rarest term, so only its foods are checked against the other terms.
+            termPostings.sort(key=len)
+            candidates = termPostings[0].keys()
+            for postings in termPostings[1:]:
+                candidates = candidates & postings.keys()
+                if len(candidates) <= 0: return []
+        else:
+            termPostings = [postings for postings in termPostings if postings is not None]
+            candidates = set()
+            for postings in termPostings:
+                candidates.update(postings.keys())
+
+        candidates = list(candidates)
+        if len(candidates) <= 0: return []
+
+        foodCount = len(self.documents)
+
+        # Scores are summed a term at a time with map(), which keeps the per-food work out of the interpreter loop.
+        scores = repeat(0.0, len(candidates))
+        for postings in termPostings:
+            documentFrequency = len(postings)
+            idf = math.log(1 + (foodCount - documentFrequency + 0.5) / (documentFrequency + 0.5))
+
+            weights = map(postings.get, candidates, repeat(0))
+            scores = list(map(operator.add, scores, map(idf.__mul__, weights)))
+
+        best = heapq.nlargest(limit, range(len(candidates)), key=scores.__getitem__)
+        return [(candidates[position], scores[position]) for position in best]
+
+
+
+class PrefixTrie(object):
+    def __init__(self):
+        """Creates a new PrefixTrie object. Holds words with a count each and completes a prefix to the most counted
+            words starting with it. Chains of single child nodes are merged into one edge to keep the trie small.
+        """
+        # Each node is a list of [count, children], where children is a dictionary of the first character of an edge
+        # to a list of [edge label, child node].
+        self.root = [0, {}]
+
+    def add(self, word, count=1):
+        """Adds to the count of a word, inserting the word if it is new. A word whose count drops to 0 is no longer completed.
+
+        Args:
+            word (string): Word to count.
+            count (int, optional): Amount to add, negative to remove. Defaults to 1.
+        """
+        node = self.root
+        rest = word
+
+        while len(rest) > 0:
+            edge = node[1].get(rest[0])
+
+            if edge is None:
+                child = [0, {}]
+                node[1][rest[0]] = [rest, child]
+                node = child
+                break
+
+            label, child = edge
+            common = 1
+            while common < len(label) and common < len(rest) and label[common] == rest[common]:
+                common += 1
+
+            if common < len(label):
+                # The word leaves the edge part way, split the edge at that point.
+                middle = [0, {label[common]: [label[common:], child]}]
+                edge[0] = label[:common]
+                edge[1] = middle
+                child = middle
+
+            node = child
+            rest = rest[common:]
+
+        node[0] = max(node[0] + count, 0)
+
+    def count(self, word):
+        """Returns the count of a word. Returns 0 if the word was never added.
+        """
+        node, path = self._findPrefix(word)
+        if node is None or path != word: return 0
+        return node[0]
+
+    def complete(self, prefix, limit=10):
+        """Finds the most counted words starting with a prefix.
+
+        Args:
+            prefix (string): Start of the word.
+            limit (int, optional): Maximum number of words to return. Defaults to 10.
+
+        Returns:
+            list: Returns a list of (word, count) tuples, most counted first.
+        """
+        node, path = self._findPrefix(prefix)
+        if node is None: return []
+
+        words = []
+        stack = [(path, node)]
+        while len(stack) > 0:
+            path, node = stack.pop()
+            if node[0] > 0: words.append((node[0], path))
+
+            for label, child in node[1].values():
+                stack.append((path + label, child))
+
+        best = heapq.nsmallest(limit, words, key=lambda item: (-item[0], item[1]))
+        return [(word, count) for count, word in best]
+
+    def _findPrefix(self, prefix):
+        """Walks down the trie along a prefix.
+
+        Returns:
+            tuple: Returns (node, path), where node is the first node whose path starts with the prefix and path is
+                the word it ends. Returns (None, None) if no word starts with the prefix.
+        """
+        node = self.root
+        path = ""
+        rest = prefix
+
+        while len(rest) > 0:
+            edge = node[1].get(rest[0])
+            if edge is None: return (None, None)
+
+            label, child = edge
+            if label.startswith(rest) or rest.startswith(label):
+                path += label
+                node = child
+                rest = rest[len(label):]
+            else:
+                return (None, None)
+
+        return (node, path)
+
+
+
+class FoodFuzzyIndex(object):
+    # Default minimum similarity between a query and a description for the description to match.
+    DEFAULT_THRESHOLD = 0.5
+
+    def __init__(self):
+        """Creates a new FoodFuzzyIndex object. Breaks every food description into character trigrams,
+            so descriptions can be matched against partial or misspelled queries, and counts description words
+            in a PrefixTrie for type-ahead completion. The index starts out empty and unbuilt, see build().
+        """
+        self.clear()
+
+    @staticmethod
+    def normalize(text):
+        """Lower cases text and reduces it to its words separated by single spaces.
+        """
+        if text is None: return ""
+        if not isinstance(text, str): text = str(text)
+
+        return " ".join(FoodSearchIndex.TOKEN_PATTERN.findall(text.lower()))
+
+    @staticmethod
+    def trigrams(text):
+        """Returns the set of character trigrams of normalized text. Each word is padded with two spaces in front
+            and one behind, so word starts weigh more and single letter words still produce trigrams.
+        """
+        trigrams = set()
+
+        for word in text.split():
+            padded = "  " + word + " "
+            for x in range(len(padded) - 2):
+                trigrams.add(padded[x:x + 3])
+
+        return trigrams
+
+    def build(self, entries):
+        """Replaces the contents of the index.
+
+        Args:
+            entries (iterable): Iterable of (barcode, description) tuples.
+        """
+        self.clear()
+
+        # Words are counted first and added to the trie once each, rather than once per food.
+        wordCounts = Counter()
+        for barcode, description in entries:
+            wordCounts.update(self._add(barcode, description))
+
+        for word, count in wordCounts.items():
+            self.words.add(word, count)
+
+        self.built = True
+
+    def clear(self):
+        """Empties the index and marks it unbuilt.
+        """
+        self.built = False
+
+        # Foods sharing a description share one entry. Dictionary of normalized description to description id,
+        # and of description id to a list of [normalized description, trigram count, set of barcodes].
+        self.descriptionIds = {}
+        self.descriptions = {}
+        self.nextDescriptionId = 0
+
+        # Dictionary of trigram to the set of description ids containing it.
+        self.postings = {}
+        # Dictionary of barcode to its description id.
+        self.barcodes = {}
+        self.words = PrefixTrie()
+
+    def update(self, barcode, description):
+        """Adds a food to the index, replacing what was indexed for its barcode before. Does nothing until the index is built.
+
+        Args:
+            barcode (string): Barcode of the food.
+            description (string): Description of the food.
+        """
+        if not self.built: return
+
+        self.remove(barcode)
+        for word in self._add(barcode, description):
+            self.words.add(word)
+
+    def remove(self, barcode):
+        """Removes a food from the index. Does nothing if the barcode is not indexed.
+
+        Args:
+            barcode (string): Barcode of the food to remove.
+        """
+        descriptionId = self.barcodes.pop(barcode, None)
+        if descriptionId is None: return
+
+        text, trigramCount, barcodes = self.descriptions[descriptionId]
+        barcodes.discard(barcode)
+
+        for word in text.split():
+            self.words.add(word, -1)
+
+        if len(barcodes) > 0: return
+
+        del self.descriptions[descriptionId]
+        del self.descriptionIds[text]
+
+        for trigram in self.trigrams(text):
+            postings = self.postings[trigram]
+            postings.discard(descriptionId)
+            if len(postings) <= 0: del self.postings[trigram]
+
+    def _add(self, barcode, description):
+        """Indexes a food's description trigrams. Returns the words of the description, left for the caller to count.
+        """
+        text = self.normalize(description)
+        descriptionId = self.descriptionIds.get(text)
+
+        if descriptionId is None:
+            descriptionId = self.nextDescriptionId
+            self.nextDescriptionId += 1
+
+            trigrams = self.trigrams(text)
+            self.descriptionIds[text] = descriptionId
+            self.descriptions[descriptionId] = [text, len(trigrams), set()]
+
+            for trigram in trigrams:
+                postings = self.postings.get(trigram)
+                if postings is None: postings = self.postings[trigram] = set()
+                postings.add(descriptionId)
+
+        self.descriptions[descriptionId][2].add(barcode)
+        self.barcodes[barcode] = descriptionId
+
+        return text.split()
+
+    def toState(self):
+        """Returns the contents of the index as plain dictionaries, lists and sets, for saving with FoodDataCache.
+            See fromState().
+
+        Returns:
+            dict: Returns the state of the index.
+        """
+        return {'built': self.built, 'descriptions': self.descriptions, 'nextDescriptionId': self.nextDescriptionId,
+                'postings': self.postings, 'barcodes': self.barcodes, 'words': self.words.root}
+
+    @classmethod
+    def fromState(cls, state):
+        """Creates a new FoodFuzzyIndex object from the state toState() returned.
+
+        Args:
+            state (dict): State of an index.
+
+        Raises:
+            KeyError: Raised if a required key is missing.
+
+        Returns:
+            FoodFuzzyIndex Object: Returns the index.
+        """
+        index = cls()
+        index.descriptions = state['descriptions']
+        index.descriptionIds = {entry[0]: descriptionId for descriptionId, entry in index.descriptions.items()}
+        index.nextDescriptionId = state['nextDescriptionId']
+        index.postings = state['postings']
+        index.barcodes = state['barcodes']
+        index.words.root = state['words']
+        index.built = state['built']
+        return index
+
+    def __len__(self):
+        return len(self.barcodes)
+
+    def search(self, query, limit=10, threshold=DEFAULT_THRESHOLD):
+        """Finds the foods whose description is most similar to a query. Similarity is the share of the query's
+            trigrams found in the description, from 0 to 1, so a few words typed out of a long description still match.
+            Descriptions equally similar are ranked by the share of trigrams both have in common.
+
+        Args:
+            query (string): Partial or misspelled description to search for.
+            limit (int, optional): Maximum number of results. Defaults to 10.
+            threshold (float, optional): Minimum similarity of a match. Defaults to DEFAULT_THRESHOLD.
+
+        Returns:
+            list: Returns a list of (barcode, similarity) tuples, most similar first.
+        """
+        queryTrigrams = self.trigrams(self.normalize(query))
+        queryCount = len(queryTrigrams)
+        if queryCount <= 0 or limit <= 0: return []
+
+        # A match has to share at least this many trigrams with the query.
+        minShared = max(1, math.ceil(threshold * queryCount - 1e-9))
+
+        termPostings = sorted((self.postings.get(trigram, ()) for trigram in queryTrigrams), key=len)
+
+        # Any description sharing minShared trigrams shares at least one of the rarest queryCount - minShared + 1,
+        # so only those trigrams produce candidates. The rest only add to the counts of existing candidates.
+        prefixLength = queryCount - minShared + 1
+        shared = Counter(chain.from_iterable(termPostings[:prefixLength]))
+
+        for postings in termPostings[prefixLength:]:
+            shared.update(shared.keys() & postings)
+
+        matches = []
+        for descriptionId, sharedCount in shared.items():
+            if sharedCount < minShared: continue
+
+            trigramCount = self.descriptions[descriptionId][1]
+            overlap = sharedCount / (queryCount + trigramCount - sharedCount)
+            matches.append((sharedCount / queryCount, overlap, descriptionId))
+
+        results = []
+        for similarity, overlap, descriptionId in heapq.nlargest(limit, matches):
+            for barcode in sorted(self.descriptions[descriptionId][2]):
+                results.append((barcode, similarity))
+                if len(results) >= limit: return results
+
+        return results
+
+    def complete(self, prefix, limit=10):
+        """Completes the last word of a partly typed description to the words most used in descriptions.
+
+        Args:
+            prefix (string): Text typed so far.
+            limit (int, optional): Maximum number of completions. Defaults to 10.
+
+        Returns:
+            list: Returns a list of completed texts, the typed words followed by a completed last word, most used first.
+        """
+        words = self.normalize(prefix).split()
+        if len(words) <= 0 or not self.normalize(prefix[-1:]): return []
+
+        leading = " ".join(words[:-1])
+        if len(leading) > 0: leading += " "
+
+        return [leading + word for word, count in self.words.complete(words[-1], limit)]
+
+
+
+class SortedValueIndex(object):
+    # Neighbouring values compared in one go by descendingBarcodes().
+    COMPARE_BLOCK_SIZE = 50000
+
+    def __init__(self):
+        """Creates a new SortedValueIndex object. Keeps one value per food sorted, such as a number for range and top-k
+            queries or a text sort key for a sort order, so queries are answered by binary search instead of looking at every
+            food. Values of one index must all compare with each other. The index starts out empty and unbuilt, see build().
+        """
+        self.clear()
+
+    def build(self, entries):
+        """Replaces the contents of the index.
+
+        Args:
+            entries (iterable): Iterable of (barcode, value) tuples. Entries with a value of None are left out.
+        """
+        pairs = sorted((value, barcode) for barcode, value in entries if value is not None)
+
+        self.values = [value for value, barcode in pairs]
+        self.barcodes = [barcode for value, barcode in pairs]
+        self.valuesByBarcode = dict(zip(self.barcodes, self.values))
+        self._descendingBarcodes = None
+        self.built = True
+
+    def clear(self):
+        """Empties the index and marks it unbuilt.
+        """
+        self.built = False
+
+        # Values sorted ascending, with the barcode of each value at the same position. Equal values are ordered by barcode.
+        self.values = []
+        self.barcodes = []
+        self.valuesByBarcode = {}
+        # Barcodes in descending order, kept from the last descendingBarcodes() call until a value changes.
+        self._descendingBarcodes = None
+
+    def update(self, barcode, value):
+        """Sets the value of a food, replacing its previous value. Does nothing until the index is built.
+
+        Args:
+            barcode (string): Barcode of the food.
+            value (float): New value, None to leave the food out of the index.
+        """
+        if not self.built: return
+
+        self.remove(barcode)
+        if value is None: return
+
+        position = self._position(barcode, value)
+        self._descendingBarcodes = None
+        self.values.insert(position, value)
+        self.barcodes.insert(position, barcode)
+        self.valuesByBarcode[barcode] = value
+
+    def remove(self, barcode):
+        """Removes a food from the index. Does nothing if the barcode is not indexed.
+
+        Args:
+            barcode (string): Barcode of the food to remove.
+        """
+        value = self.valuesByBarcode.pop(barcode, None)
+        if value is None: return
+
+        position = self._position(barcode, value)
+        self._descendingBarcodes = None
+        del self.values[position]
+        del self.barcodes[position]
+
+    def _position(self, barcode, value):
+        """Returns the position of a (value, barcode) pair, or where it would be inserted.
+        """
+        start = bisect.bisect_left(self.values, value)
+        end = bisect.bisect_right(self.values, value, start)
+        return bisect.bisect_left(self.barcodes, barcode, start, end)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _bounds(self, low, high):
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        end = len(self.values) if high is None else bisect.bisect_right(self.values, high)
+        return (start, max(start, end))
+
+    def count(self, low=None, high=None):
+        """Counts the foods with a value from low to high, both inclusive.
+
+        Args:
+            low (float, optional): Smallest value to count. Defaults to None, no lower bound.
+            high (float, optional): Largest value to count. Defaults to None, no upper bound.
+
+        Returns:
+            int: Returns the number of foods in the range.
+        """
+        start, end = self._bounds(low, high)
+        return end - start
+
+    def range(self, low=None, high=None, limit=None):
+        """Finds the foods with a value from low to high, both inclusive.
+
+        Args:
+            low (float, optional): Smallest value to return. Defaults to None, no lower bound.
+            high (float, optional): Largest value to return. Defaults to None, no upper bound.
+            limit (int, optional): Maximum number of results. Defaults to None, no limit.
+
+        Returns:
+            list: Returns a list of barcodes, smallest value first.
+        """
+        start, end = self._bounds(low, high)
+        if limit is not None: end = min(end, start + max(limit, 0))
+
+        return self.barcodes[start:end]
+
+    def top(self, count=10, largest=True):
+        """Finds the foods with the largest, or smallest, values.
+
+        Args:
+            count (int, optional): Number of foods to return. Defaults to 10.
+            largest (bool, optional): Returns the largest values when True, otherwise the smallest. Defaults to True.
+
+        Returns:
+            list: Returns a list of barcodes, in order from the most extreme value.
+        """
+        if count <= 0: return []
+        if not largest: return self.barcodes[:count]
+
+        start = max(len(self.barcodes) - count, 0)
+        return self.barcodes[start:][::-1]
+
+    def descendingBarcodes(self):
+        """Returns every indexed barcode, largest value first. Equal values stay ordered by barcode, smallest first.
+
+        Returns:
+            list: Returns a new list of barcodes.
+        """
+        if self._descendingBarcodes is None: self._descendingBarcodes = self._sortDescending()
+        return list(self._descendingBarcodes)
+
+    def _sortDescending(self):
+        values = self.values
+        barcodes = self.barcodes[::-1]
+        total = len(values)
+
+        # Reversing the whole list also reverses the barcodes of equal values, so each run of equal values is put back.
+        # Runs are found by comparing neighbouring values in C, a block at a time so other threads are not held up
+        # for the whole list, and skipped over by binary search rather than walked.
+        equalStarts = []
+        for blockStart in range(0, total - 1, SortedValueIndex.COMPARE_BLOCK_SIZE):
+            blockEnd = min(blockStart + SortedValueIndex.COMPARE_BLOCK_SIZE, total - 1)
+            block = values[blockStart:blockEnd + 1]
+            equalStarts.extend(compress(range(blockStart, blockEnd), map(operator.eq, block, islice(block, 1, None))))
+
+        position = 0
+
+        while position < len(equalStarts):
+            start = equalStarts[position]
+            end = bisect.bisect_right(values, values[start], start)
+            barcodes[total - end:total - start] = self.barcodes[start:end]
+            position = bisect.bisect_left(equalStarts, end, position)
+
+        return barcodes
+
+    def value(self, barcode):
+        """Returns the indexed value of a food. Returns None if the barcode is not indexed.
+        """
+        return self.valuesByBarcode.get(barcode)
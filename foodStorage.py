@@ -0,0 +1,1365 @@
+import bisect
+import codecs
+import gzip
+import json
+import lzma
+import os
+import os.path
+import re
+import sqlite3
+import threading
+import zlib
+from collections.abc import Mapping
+from foodDataCache import FoodDataCache
+from foodJournal import FoodJournal
+
+FILE_FORMATS = ("pretty", "compact", "normalized")
+COMPRESSIONS = ("none", "gzip", "lzma")
+
+# Bytes of a food data file read and decoded at a time by JsonTextStream.
+READ_CHUNK_SIZE = 256 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+NORMALIZED_LAYOUT = "normalized"
+
+# End of one food record and the start of the next, where the 'foodData' object of a food data file can be split, see
+# JsonFoodStorage.splitRecords(). Matches the comma between the two records.
+RECORD_BOUNDARY = re.compile(rb'\}[ \t\n\r]*(,)[ \t\n\r]*"(?:[^"\\]|\\.)*"[ \t\n\r]*:[ \t\n\r]*\{')
+# Bytes searched for a record boundary from each point a food data file is split at.
+RECORD_BOUNDARY_WINDOW = 64 * 1024
+
+def encodeFoodData(data, fileFormat="pretty", compression="none"):
+    """Encodes food data for writing to a food data file.
+
+    Args:
+        data (dict): Dictionary with a 'servingUoms' list and a 'foodData' dict of barcode to record.
+        fileFormat (string, optional): 'pretty' for indented JSON, 'compact' for JSON without whitespace or
+            'normalized' for compact JSON where foods reference their serving UOM by code. Defaults to "pretty".
+        compression (string, optional): One of 'none', 'gzip' or 'lzma'. Defaults to "none".
+
+    Raises:
+        ValueError: Raised if the format or compression is not supported.
+
+    Returns:
+        bytes: Returns the encoded file contents.
+    """
+    if compression not in COMPRESSIONS: raise ValueError(f"Compression must be one of {COMPRESSIONS}.")
+
+    encoder = FoodRecordEncoder(fileFormat)
+    foodData = data['foodData']
+    fragments = ((barcode, encoder.encode(foodData[barcode])) for barcode in foodData)
+
+    return compressFoodData(encoder.encodeFile(data['servingUoms'], fragments).encode("utf-8"), compression)
+
+def decodeFoodData(content):
+    """Decodes the contents of a food data file written in any supported format, detecting compression from
+        the leading magic bytes.
+
+    Args:
+        content (bytes): File contents.
+
+    Raises:
+        ValueError: Raised if the contents can not be decoded.
+
+    Returns:
+        dict: Dictionary with a 'servingUoms' list and a 'foodData' dict of barcode to record.
+    """
+    try:
+        content = decompressFoodData(content)
+    except (OSError, EOFError, lzma.LZMAError) as err:
+        raise ValueError(f"Could not decompress food data: {err}")
+
+    data = json.loads(content)
+    if not isinstance(data, dict): raise ValueError("Food data must be a JSON object.")
+
+    if data.get("layout") == NORMALIZED_LAYOUT:
+        uomsByCode = {uom['code']: uom for uom in data['servingUoms']}
+        foodData = data['foodData']
+
+        for barcode in foodData:
+            foodData[barcode] = expandRecord(foodData[barcode], uomsByCode)
+
+        del data["layout"]
+
+    return data
+
+def isCompressed(content):
+    """Returns True if the bytes provided start with gzip or xz magic bytes.
+    """
+    return content.startswith(GZIP_MAGIC) or content.startswith(LZMA_MAGIC)
+
+def compressFoodData(content, compression):
+    """Compresses encoded food data with the compression provided, see encodeFoodData().
+    """
+    if compression == "gzip": return gzip.compress(content, compresslevel=6)
+    if compression == "lzma": return lzma.compress(content)
+    return content
+
+def decompressFoodData(content):
+    """Decompresses gzip or xz compressed contents. Returns anything else unchanged.
+    """
+    if content.startswith(GZIP_MAGIC): return gzip.decompress(content)
+    if content.startswith(LZMA_MAGIC): return lzma.decompress(content)
+    return content
+
+def expandRecord(record, uomsByCode):
+    """Replaces the serving UOM code of a normalized record with the UOM it references.
+
+    Args:
+        record (dict): Record in the normalized layout.
+        uomsByCode (dict): Dictionary of UOM code to UOM dictionary.
+
+    Returns:
+        dict: Returns the record with a full 'servingSizeUom' dictionary.
+    """
+    code = record.get('servingSizeUom')
+    if not isinstance(code, str): return record
+
+    # Keep foods whose UOM is missing from the list rather than losing them.
+    record['servingSizeUom'] = dict(uomsByCode.get(code, {'name': code, 'code': code}))
+    return record
+
+def scanFoodData(stream):
+    """Parses a food data file in any supported format a record at a time, reading it a chunk at a time, so a caller can
+        do other work between records instead of waiting for the whole file to be read and parsed in one call.
+
+    Args:
+        stream (JsonTextStream Object): Stream over the uncompressed file contents. It is closed once the records are read.
+
+    Raises:
+        ValueError: Raised if the text before the first record is not valid food data. Errors further on are raised
+            by the records iterator when it reaches them.
+
+    Returns:
+        tuple: Returns a tuple of (servingUoms, records). servingUoms is the list of UOM dictionaries and records an iterator
+            of (barcode, record, progress) tuples, where progress is the fraction of the file read, from 0 to 1.
+    """
+    decoder = json.JSONDecoder()
+    servingUoms = None
+    layout = None
+    foodData = None
+
+    try:
+        idx = stream.scan(JsonRecordIndex._expect, 0, "{")
+        while stream.scan(JsonRecordIndex._peek, idx)[0] != "}":
+            key, idx = stream.scan(JsonRecordIndex._scanKey, idx)
+
+            # Files written by FoodRecordEncoder list the UOMs first, so their records can be expanded as they are read.
+            if key == "foodData" and servingUoms is not None:
+                uomsByCode = {uom['code']: uom for uom in servingUoms} if layout == NORMALIZED_LAYOUT else None
+                return (servingUoms, _iterRecords(stream, idx, decoder, uomsByCode))
+
+            value, idx = stream.scan(decoder.raw_decode, idx)
+            if key == "servingUoms": servingUoms = value
+            if key == "layout": layout = value
+            if key == "foodData": foodData = value
+
+            idx = stream.scan(JsonRecordIndex._skipSeparator, idx, "}")
+    except Exception:
+        stream.close()
+        raise
+
+    stream.close()
+    if not isinstance(servingUoms, list) or not isinstance(foodData, dict): raise ValueError("Food data file is missing 'servingUoms' or 'foodData'.")
+
+    uomsByCode = {uom['code']: uom for uom in servingUoms} if layout == NORMALIZED_LAYOUT else None
+    total = max(1, len(foodData))
+    return (servingUoms, ((barcode, record if uomsByCode is None else expandRecord(record, uomsByCode), position / total)
+                          for position, (barcode, record) in enumerate(foodData.items(), 1)))
+
+def _iterRecords(stream, idx, decoder, uomsByCode):
+    """Yields (barcode, record, progress) for each member of the 'foodData' object starting at idx, see scanFoodData().
+        Errors reading a compressed file are raised as ValueError, like errors in the JSON.
+    """
+    try:
+        idx = stream.scan(JsonRecordIndex._expect, idx, "{")
+        if stream.scan(JsonRecordIndex._peek, idx)[0] == "}": return
+
+        for barcode, record, start, end in stream.iterMembers(idx, decoder):
+            if uomsByCode is not None: record = expandRecord(record, uomsByCode)
+            yield (barcode, record, stream.progress)
+    except (OSError, EOFError, lzma.LZMAError, zlib.error) as err:
+        raise ValueError(f"Could not read food data: {err}")
+    finally:
+        stream.close()
+
+def readRecordRange(filePath, start, end, uomsByCode=None):
+    """Parses a range of the members of the 'foodData' object of an uncompressed food data file, as split by
+        JsonFoodStorage.splitRecords(). Used to parse a file in several processes at once.
+
+    Args:
+        filePath (string): Path to the food data file.
+        start (int): Byte offset of the first member of the range.
+        end (int): Byte offset of the comma after the last member of the range, None for the last range of the file.
+        uomsByCode (dict, optional): Dictionary of UOM code to UOM dictionary, for files in the normalized layout.
+            Defaults to None.
+
+    Raises:
+        ValueError: Raised if the range does not hold whole members, or holds text that is not valid JSON.
+
+    Yields:
+        tuple: Returns (barcode, record) pairs, in file order. Whether the range holds whole members is only known
+            once every member is parsed.
+    """
+    with open(filePath, mode="rb") as f:
+        f.seek(start)
+        text = f.read().decode("utf-8") if end is None else f.read(end - start).decode("utf-8") + "}"
+
+    members = JsonRecordIndex.iterMembers(text, 0, json.JSONDecoder())
+
+    while True:
+        try:
+            barcode, record, valueStart, valueEnd = next(members)
+        except StopIteration as stop:
+            closingBrace = stop.value
+            break
+        yield (barcode, record if uomsByCode is None else expandRecord(record, uomsByCode))
+
+    # Only the last range holds the end of the file, every other one must end right where the next one starts.
+    if end is not None and closingBrace != len(text) - 1: raise ValueError("Range does not end on a whole record.")
+    if end is None and text[closingBrace + 1:].strip(" \t\n\r") != "}": raise ValueError("Range does not end with the food data file.")
+
+def openDecompressed(f):
+    """Wraps a food data file opened in binary mode in a reader that decompresses it as it is read, detecting compression
+        from the leading magic bytes. Returns the file itself if it is not compressed.
+    """
+    magic = f.read(len(LZMA_MAGIC))
+    f.seek(0)
+
+    if magic.startswith(GZIP_MAGIC): return gzip.GzipFile(fileobj=f, mode="rb")
+    if magic.startswith(LZMA_MAGIC): return lzma.LZMAFile(f)
+    return f
+
+
+
+class FoodRecordEncoder(object):
+    COMPACT_SEPARATORS = (",", ":")
+    # Records sit two levels deep in a pretty printed file.
+    PRETTY_RECORD_INDENT = "\n" + " " * 8
+
+    def __init__(self, fileFormat="pretty"):
+        """Creates a new FoodRecordEncoder object. Encodes records into JSON fragments one at a time and stitches
+            fragments into a complete food data file, so fragments of unchanged records can be kept and reused.
+
+        Args:
+            fileFormat (string, optional): See encodeFoodData(). Defaults to "pretty".
+
+        Raises:
+            ValueError: Raised if the format is not supported.
+        """
+        if fileFormat not in FILE_FORMATS: raise ValueError(f"File format must be one of {FILE_FORMATS}.")
+
+        self.fileFormat = fileFormat
+        # UOMs referenced by normalized fragments, in case a food uses a UOM missing from the list.
+        self.uomsByCode = {}
+
+    def encode(self, record):
+        """Encodes a single record.
+
+        Args:
+            record (dict): Record formatted like Food.toDict().
+
+        Returns:
+            string: Returns the JSON fragment for the record.
+        """
+        if self.fileFormat == "pretty":
+            return json.dumps(record, indent=4).replace("\n", FoodRecordEncoder.PRETTY_RECORD_INDENT)
+
+        if self.fileFormat == "normalized":
+            uom = record['servingSizeUom']
+            self.uomsByCode.setdefault(uom['code'], uom)
+
+            record = dict(record)
+            record['servingSizeUom'] = uom['code']
+
+        return json.dumps(record, separators=FoodRecordEncoder.COMPACT_SEPARATORS)
+
+    def encodeFile(self, servingUoms, fragments, offsets=None):
+        """Stitches record fragments into the contents of a food data file. The result matches encoding
+            the whole file in one go with the json module.
+
+        Args:
+            servingUoms (list): List of UOM dictionaries.
+            fragments (iterable): Iterable of (barcode, fragment) pairs, fragments as returned by encode().
+            offsets (dict, optional): Filled with barcode to the (start, end) character range of each fragment in the
+                contents, the way JsonRecordIndex records them. Defaults to None.
+
+        Returns:
+            string: Returns the file contents.
+        """
+        if self.fileFormat == "pretty":
+            uomText = json.dumps(servingUoms, indent=4).replace("\n", "\n    ")
+            header = "{\n    \"servingUoms\": " + uomText + ",\n    \"foodData\": "
+            members = self._joinMembers(fragments, "        ", ": ", ",\n", len(header) + 2, offsets)
+            foodText = "{\n" + members + "\n    }" if len(members) > 0 else "{}"
+            return header + foodText + "\n}"
+
+        if self.fileFormat == "normalized":
+            header = f'{{"layout":"{NORMALIZED_LAYOUT}","servingUoms":'
+        else:
+            header = '{"servingUoms":'
+
+        # Normalized fragments add the UOMs they reference as they are encoded, so the fragments are joined first.
+        members = self._joinMembers(fragments, "", ":", ",", 0, offsets)
+        header += json.dumps(self.fileServingUoms(servingUoms), separators=FoodRecordEncoder.COMPACT_SEPARATORS) + ',"foodData":{'
+
+        if offsets is not None:
+            for barcode, (start, end) in offsets.items():
+                offsets[barcode] = (start + len(header), end + len(header))
+
+        return header + members + "}}"
+
+    def fileServingUoms(self, servingUoms):
+        """Returns the UOM list written by encodeFile(), which for the normalized format also holds any UOM a fragment
+            encoded so far references but servingUoms is missing.
+
+        Args:
+            servingUoms (list): List of UOM dictionaries.
+
+        Returns:
+            list: Returns the list of UOM dictionaries.
+        """
+        if self.fileFormat != "normalized": return servingUoms
+
+        servingUoms = list(servingUoms)
+        knownCodes = set(uom['code'] for uom in servingUoms)
+        servingUoms.extend(uom for code, uom in self.uomsByCode.items() if code not in knownCodes)
+        return servingUoms
+
+    @staticmethod
+    def _joinMembers(fragments, indent, colon, separator, position, offsets):
+        """Joins (barcode, fragment) pairs into the members of the 'foodData' object, starting at a position.
+            Records the range of each fragment in offsets, unless it is None.
+        """
+        if offsets is None:
+            return separator.join(f"{indent}{json.dumps(barcode)}{colon}{fragment}" for barcode, fragment in fragments)
+
+        members = []
+        for barcode, fragment in fragments:
+            key = f"{indent}{json.dumps(barcode)}{colon}"
+            position += len(key)
+            offsets[barcode] = (position, position + len(fragment))
+            position += len(fragment) + len(separator)
+            members.append(key + fragment)
+
+        return separator.join(members)
+
+
+
+class FoodStorage(object):
+    """Base class for food data storage backends.
+
+    Backends deal in records, the dictionaries stored for each food in the food data file (see Food.toDict()),
+    keyed by barcode. Converting records to and from Food objects is left to CaloriePal.
+    """
+    # True if saveFoodDataFile() has to write every record through writeSnapshot().
+    WRITES_SNAPSHOTS = True
+    # True if read() returns a mapping that loads records on demand instead of a dict.
+    LAZY_RECORDS = False
+
+    def __init__(self, filePath):
+        """Creates a new FoodStorage object.
+
+        Args:
+            filePath (string): Path to the file holding the food data.
+        """
+        self.filePath = filePath
+
+    @staticmethod
+    def forFile(filePath, journalEnabled=False, lazyLoading=False, fileFormat="pretty", compression="none"):
+        """Creates the storage backend matching the file extension of the path provided.
+
+        Args:
+            filePath (string): Path to the food data file.
+            journalEnabled (bool, optional): Enables the change journal for JSON files. Defaults to False.
+            lazyLoading (bool, optional): Indexes JSON files instead of loading every record. Defaults to False.
+            fileFormat (string, optional): Format JSON files are written in, see encodeFoodData(). Defaults to "pretty".
+            compression (string, optional): Compression JSON files are written with, see encodeFoodData(). Defaults to "none".
+
+        Returns:
+            FoodStorage Object: SqliteFoodStorage for '.db', '.sqlite' and '.sqlite3' files, otherwise JsonFoodStorage.
+        """
+        if os.path.splitext(filePath)[1].lower() in SqliteFoodStorage.FILE_EXTENSIONS:
+            return SqliteFoodStorage(filePath)
+        return JsonFoodStorage(filePath, journalEnabled, lazyLoading, fileFormat, compression)
+
+    def read(self):
+        """Reads food data from storage.
+
+        Returns:
+            dict: Dictionary with a 'servingUoms' list and a 'foodData' mapping of barcode to record.
+                Returns None if there is no data or it could not be read.
+        """
+        raise NotImplementedError()
+
+    def readIncrementally(self):
+        """Reads food data a record at a time, for callers that have to stay responsive while a large file is read.
+            Backends that can parse their data piecewise override this, the default reads everything with read().
+
+        Returns:
+            tuple: Returns a tuple of (servingUoms, records), where records is an iterator of (barcode, record, progress) tuples
+                and progress the fraction read, from 0 to 1. Returns None if there is no data or it could not be read.
+        """
+        data = self.read()
+        if data is None: return None
+
+        foodData = data['foodData']
+        items = foodData.iterRecords() if hasattr(foodData, "iterRecords") else foodData.items()
+        total = max(1, len(foodData))
+
+        return (data['servingUoms'], ((barcode, record, position / total) for position, (barcode, record) in enumerate(items, 1)))
+
+    def splitRecords(self, parts, minPartSize=1024 * 1024):
+        """Splits the stored records into byte ranges that can be parsed apart with readRecordRange(), so a large file
+            can be parsed by several processes at once. Backends that can not be read that way return None.
+
+        Args:
+            parts (int): Number of ranges to split the records into, at most.
+            minPartSize (int, optional): Fewest bytes in a range. Defaults to 1 MiB.
+
+        Returns:
+            tuple: Returns a tuple of (servingUoms, layout, ranges). servingUoms is the list of UOM dictionaries, layout the
+                layout of the file, NORMALIZED_LAYOUT or None, and ranges a list of (start, end) pairs, see readRecordRange().
+                Returns None if the records can not be split, or would not make at least two ranges.
+        """
+        return None
+
+    def readChanges(self):
+        """Reads changes that have to be applied on top of the data returned by read().
+
+        Yields:
+            dict: Change record, see FoodJournal.readEntries().
+        """
+        return iter(())
+
+    def fingerprint(self):
+        """Identifies the stored food data, including changes readChanges() would return.
+
+        Returns:
+            tuple: Returns a tuple that changes whenever the stored data does. Returns None if nothing is stored.
+        """
+        if not os.path.exists(self.filePath): return None
+        return (FoodDataCache.fingerprint(self.filePath),)
+
+    def writeChange(self, op, key, data=None):
+        """Persists a single change without writing every record.
+
+        Args:
+            op (string): Change operation, see FoodJournal.
+            key (string): Barcode of the food changed, or the UOM code for FoodJournal.ADD_UOM.
+            data (dict, optional): Record data. Defaults to None.
+
+        Returns:
+            bool: True if the change was persisted, False if a full writeSnapshot() is required.
+        """
+        return False
+
+    def writeChanges(self, changes):
+        """Persists several changes at once.
+
+        Args:
+            changes (list): List of (op, key, data) tuples, see writeChange().
+
+        Returns:
+            bool: True if the changes were persisted, False if a full writeSnapshot() is required.
+        """
+        for op, key, data in changes:
+            if not self.writeChange(op, key, data): return False
+        return True
+
+    def needsCompaction(self):
+        """Returns True if changes written so far should be folded into a new snapshot.
+        """
+        return False
+
+    def beginSnapshot(self):
+        """Called while the data for the next writeSnapshot() is collected, before any further change can be made.
+        """
+        return
+
+    def writeSnapshot(self, data):
+        """Replaces everything in storage with the data provided.
+
+        Args:
+            data (dict): Dictionary with a 'servingUoms' list and a 'foodData' dict of barcode to record.
+        """
+        raise NotImplementedError()
+
+    def createRecordEncoder(self):
+        """Creates a FoodRecordEncoder for use with writeFragments(). Returns None if the backend does not support it.
+        """
+        return None
+
+    def writeFragments(self, servingUoms, fragments, encoder):
+        """Same as writeSnapshot(), but with records already encoded by the encoder from createRecordEncoder().
+
+        Args:
+            servingUoms (list): List of UOM dictionaries.
+            fragments (iterable): Iterable of (barcode, fragment) pairs.
+            encoder (FoodRecordEncoder Object): Encoder the fragments were created with.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        """Releases any resources held by the backend.
+        """
+        return
+
+
+
+class JsonTextStream(object):
+    def __init__(self, f, chunkSize=READ_CHUNK_SIZE, sourceFile=None):
+        """Creates a new JsonTextStream object. Decodes a UTF-8 JSON file a chunk at a time, so it can be scanned without
+            reading or decoding the whole file in one go. Only the text from the member being scanned on is kept.
+
+        Args:
+            f (file Object): File opened in binary mode, read from its current position.
+            chunkSize (int, optional): Bytes read at a time. Defaults to READ_CHUNK_SIZE.
+            sourceFile (file Object, optional): File on disk f reads from, such as when f decompresses it. Its position
+                gives the progress and it is closed along with f. Defaults to None, f itself.
+        """
+        self.file = f
+        self.sourceFile = f if sourceFile is None else sourceFile
+        self.chunkSize = chunkSize
+        # Fraction of the file on disk read so far, from 0 to 1.
+        self.progress = 0.0
+        self.size = max(1, os.fstat(self.sourceFile.fileno()).st_size)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.eof = False
+
+        # Text kept from the stream, and the character position of its first character in the whole stream.
+        self.text = ""
+        self.offset = 0
+        # True while the text kept is all ASCII, so characters and bytes line up.
+        self.isAscii = True
+
+        # Character and byte position up to which bytePosition() has counted, only ever moving forward.
+        self._countedChar = 0
+        self._countedByte = 0
+
+    def more(self, keepFrom):
+        """Reads the next chunk onto the end of the text, dropping the text before a position.
+
+        Args:
+            keepFrom (int): Stream position of the first character still needed.
+
+        Returns:
+            bool: Returns False if the stream has ended and nothing was read.
+        """
+        if self.eof: return False
+
+        self.bytePosition(keepFrom)
+        chunk = self.file.read(self.chunkSize)
+        self.eof = len(chunk) <= 0
+
+        self.text = self.text[keepFrom - self.offset:] + self.decoder.decode(chunk, final=self.eof)
+        self.offset = keepFrom
+        self.isAscii = self.text.isascii()
+        self.progress = 1.0 if self.eof else min(1.0, self.sourceFile.tell() / self.size)
+        return True
+
+    def close(self):
+        """Closes the file, and the file on disk if it is a different one.
+        """
+        self.file.close()
+        self.sourceFile.close()
+
+    def bytePosition(self, position):
+        """Converts a character position into a byte position. Positions must be asked for in increasing order,
+            from no earlier than the position kept by the last more() call.
+
+        Args:
+            position (int): Stream position of a character.
+
+        Returns:
+            int: Returns the byte offset of the character in the file.
+        """
+        if position > self._countedChar:
+            if self.isAscii:
+                self._countedByte += position - self._countedChar
+            else:
+                counted = self.text[self._countedChar - self.offset:position - self.offset]
+                self._countedByte += len(counted) if counted.isascii() else len(counted.encode("utf-8"))
+            self._countedChar = position
+
+        return self._countedByte
+
+    def scan(self, function, position, *args):
+        """Calls one of the scanning functions of JsonRecordIndex on the text, reading more of the stream until the text
+            holds everything the function looks at.
+
+        Args:
+            function (callable): Function taking (text, idx, *args), returning a position or a tuple ending in a position.
+            position (int): Stream position to scan from.
+
+        Raises:
+            json.JSONDecodeError: Raised if the text is not valid JSON, once the stream has ended.
+
+        Returns:
+            Returns the result of the function, with the position it returns converted to a stream position.
+        """
+        while True:
+            if position - self.offset < len(self.text) or self.eof:
+                try:
+                    result = function(self.text, position - self.offset, *args)
+                except (ValueError, StopIteration):
+                    if self.eof: raise
+                else:
+                    end = result[-1] if isinstance(result, tuple) else result
+                    # A scan stopping at the end of the text may have stopped short of the end of a value.
+                    if end < len(self.text) or self.eof:
+                        end += self.offset
+                        return result[:-1] + (end,) if isinstance(result, tuple) else end
+
+            self.more(position)
+
+    def iterMembers(self, position, decoder):
+        """Same as JsonRecordIndex.iterMembers(), reading more of the stream whenever a member runs past the end of the text.
+
+        Args:
+            position (int): Stream position of the first member, just after the opening brace.
+            decoder (json.JSONDecoder Object): Decoder to scan values with.
+
+        Raises:
+            json.JSONDecodeError: Raised when the text is not valid JSON, as the members reach the error.
+
+        Yields:
+            tuple: Returns (key, value, start, end) for each member, with stream positions.
+                Returns the stream position of the closing brace of the object once every member is parsed.
+        """
+        matchKey = JsonRecordIndex.MEMBER_KEY.match
+        matchEnd = JsonRecordIndex.MEMBER_END.match
+        scanValue = decoder.scan_once
+
+        text = self.text
+        offset = self.offset
+
+        while True:
+            idx = position - offset
+            endMatch = None
+
+            # A member is only taken once the comma or brace after it is in the text, so it can not have been cut short.
+            keyMatch = matchKey(text, idx)
+            if keyMatch is not None:
+                start = keyMatch.end()
+                try:
+                    value, end = scanValue(text, start)
+                except (ValueError, StopIteration):
+                    pass
+                else:
+                    endMatch = matchEnd(text, end)
+
+            if endMatch is None:
+                if self.more(position):
+                    text = self.text
+                    offset = self.offset
+                    continue
+
+                # The stream has ended, so parsing the member again raises the error in the right place.
+                for member in JsonRecordIndex.iterMembers(text, idx, decoder):
+                    pass
+
+            key = keyMatch.group(1)
+            if "\\" in key: key = json.loads(f'"{key}"')
+
+            yield (key, value, offset + start, offset + end)
+
+            if endMatch.group(1) == "}": return offset + endMatch.start(1)
+            position = offset + endMatch.end()
+
+
+
+class JsonRecordIndex(Mapping):
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+    MEMBER_KEY = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+    MEMBER_END = re.compile(r"[ \t\n\r]*([,}])")
+
+    def __init__(self, filePath):
+        """Creates a read only mapping of barcode to record for a JSON food data file.
+            Only the position of each record is kept in memory, records are read from the file when accessed.
+
+        Args:
+            filePath (string): Path to the JSON food data file.
+        """
+        self.filePath = filePath
+        self.offsets = {}
+        self.barcodes = []
+        self.starts = []
+        self.servingUoms = []
+        self.uomsByCode = None
+        # Held while the file is read or replaced, so a reader never uses offsets from a different version of the file.
+        self.lock = threading.RLock()
+
+    def build(self):
+        """Scans the food data file once, recording the byte range of every food record. The file is read a chunk at
+            a time and records are skipped over by the json module's C scanner without being kept.
+
+        Raises:
+            ValueError: Raised if the file is not a valid food data file.
+        """
+        decoder = json.JSONDecoder()
+        offsets = {}
+        servingUoms = None
+        layout = None
+
+        with open(self.filePath, mode="rb") as f:
+            stream = JsonTextStream(f)
+
+            idx = stream.scan(self._expect, 0, "{")
+            while stream.scan(self._peek, idx)[0] != "}":
+                key, idx = stream.scan(self._scanKey, idx)
+
+                if key == "foodData":
+                    idx = stream.scan(self._expect, idx, "{")
+                    if stream.scan(self._peek, idx)[0] != "}":
+                        idx = self._scanRecords(stream, idx, decoder, offsets)
+                    idx += 1
+                else:
+                    value, idx = stream.scan(decoder.raw_decode, idx)
+                    if key == "servingUoms": servingUoms = value
+                    if key == "layout": layout = value
+
+                idx = stream.scan(self._skipSeparator, idx, "}")
+
+        if servingUoms is None: raise ValueError("Food data file is missing 'servingUoms'.")
+
+        self.setOffsets(offsets, servingUoms, layout)
+
+    def setOffsets(self, offsets, servingUoms, layout=None):
+        """Replaces the positions of the records, such as with those of a file just written.
+
+        Args:
+            offsets (dict): Dictionary of barcode to the (start, end) byte range of its record, in file order.
+            servingUoms (list): List of UOM dictionaries in the file.
+            layout (string, optional): Layout of the file, NORMALIZED_LAYOUT or None. Defaults to None.
+        """
+        self.offsets = offsets
+        # Barcodes in file order, and the start of each record in the same order, for paging through the records.
+        self.barcodes = list(offsets)
+        self.starts = [start for start, end in offsets.values()]
+
+        self.servingUoms = servingUoms
+        self.uomsByCode = {uom['code']: uom for uom in servingUoms} if layout == NORMALIZED_LAYOUT else None
+
+    @staticmethod
+    def _scanRecords(stream, idx, decoder, offsets):
+        """Records the byte range of every member of the 'foodData' object.
+
+        Returns:
+            int: Stream position of the closing brace of the 'foodData' object.
+        """
+        members = stream.iterMembers(idx, decoder)
+        bytePosition = stream.bytePosition
+
+        while True:
+            try:
+                barcode, record, start, end = next(members)
+            except StopIteration as stop:
+                return stop.value
+            offsets[barcode] = (bytePosition(start), bytePosition(end))
+
+    @staticmethod
+    def iterMembers(text, idx, decoder):
+        """Parses the members of a non empty JSON object one at a time. This loop runs once per food,
+            so it matches each key with a single regular expression and calls the C scanner directly.
+
+        Args:
+            text (string): JSON text.
+            idx (int): Position of the first member, just after the opening brace.
+            decoder (json.JSONDecoder Object): Decoder to scan values with.
+
+        Raises:
+            json.JSONDecodeError: Raised when the text is not valid JSON, as the members reach the error.
+
+        Yields:
+            tuple: Returns (key, value, start, end) for each member, where start and end are the range of the value.
+                Returns the position of the closing brace of the object once every member is parsed.
+        """
+        matchKey = JsonRecordIndex.MEMBER_KEY.match
+        matchEnd = JsonRecordIndex.MEMBER_END.match
+        scanValue = decoder.scan_once
+
+        while True:
+            keyMatch = matchKey(text, idx)
+            if keyMatch is None: raise json.JSONDecodeError("Expecting property name", text, idx)
+
+            key = keyMatch.group(1)
+            if "\\" in key: key = json.loads(f'"{key}"')
+
+            start = keyMatch.end()
+            try:
+                value, end = scanValue(text, start)
+            except StopIteration:
+                raise json.JSONDecodeError("Expecting value", text, start)
+            yield (key, value, start, end)
+
+            endMatch = matchEnd(text, end)
+            if endMatch is None: raise json.JSONDecodeError("Expecting ',' or '}'", text, end)
+            if endMatch.group(1) == "}": return endMatch.start(1)
+            idx = endMatch.end()
+
+    @staticmethod
+    def _expect(text, idx, char):
+        """Checks the next non whitespace character is the one expected and returns the position after it.
+        """
+        idx = JsonRecordIndex.WHITESPACE.match(text, idx).end()
+        if text[idx:idx + 1] != char: raise json.JSONDecodeError(f"Expecting '{char}'", text, idx)
+        return JsonRecordIndex.WHITESPACE.match(text, idx + 1).end()
+
+    @staticmethod
+    def _peek(text, idx):
+        """Returns the character at a position, along with the position.
+        """
+        if idx >= len(text): raise json.JSONDecodeError("Unexpected end of data", text, idx)
+        return (text[idx], idx)
+
+    @staticmethod
+    def _scanKey(text, idx):
+        """Reads an object key and the colon after it. Returns the key and the position of its value.
+        """
+        if text[idx:idx + 1] != '"': raise json.JSONDecodeError("Expecting property name", text, idx)
+        key, idx = json.decoder.scanstring(text, idx + 1)
+        return (key, JsonRecordIndex._expect(text, idx, ":"))
+
+    @staticmethod
+    def _skipSeparator(text, idx, closingChar):
+        """Skips the comma between two members. Returns the position of the next member or of the closing character.
+        """
+        idx = JsonRecordIndex.WHITESPACE.match(text, idx).end()
+        if text[idx:idx + 1] == ",": return JsonRecordIndex.WHITESPACE.match(text, idx + 1).end()
+        if text[idx:idx + 1] != closingChar: raise json.JSONDecodeError(f"Expecting ',' or '{closingChar}'", text, idx)
+        return idx
+
+    @staticmethod
+    def _toByteOffsets(text, offsets):
+        """Converts character offsets into UTF-8 byte offsets.
+        """
+        converted = {}
+        previousChar = 0
+        previousByte = 0
+
+        for barcode, (start, end) in sorted(offsets.items(), key=lambda item: item[1][0]):
+            startByte = previousByte + len(text[previousChar:start].encode("utf-8"))
+            endByte = startByte + len(text[start:end].encode("utf-8"))
+            converted[barcode] = (startByte, endByte)
+            previousChar = end
+            previousByte = endByte
+
+        return converted
+
+    def __getitem__(self, barcode):
+        with self.lock:
+            start, end = self.offsets[barcode]
+
+            with open(self.filePath, mode="rb") as f:
+                f.seek(start)
+                return self._loadRecord(f.read(end - start))
+
+    def _loadRecord(self, content):
+        """Parses a single record, expanding its serving UOM if the file uses the normalized layout.
+        """
+        record = json.loads(content)
+        if self.uomsByCode is not None: record = expandRecord(record, self.uomsByCode)
+        return record
+
+    def iterRecords(self):
+        """Reads every record in file order, keeping a single file handle open.
+
+        Yields:
+            tuple: Returns (barcode, record) pairs.
+        """
+        with self.lock:
+            with open(self.filePath, mode="rb") as f:
+                for barcode, (start, end) in self.offsets.items():
+                    f.seek(start)
+                    yield (barcode, self._loadRecord(f.read(end - start)))
+
+    def count(self):
+        """Returns the number of records.
+        """
+        return len(self.offsets)
+
+    def page(self, offset, limit):
+        """Returns the barcodes of a run of records in file order.
+
+        Args:
+            offset (int): Position of the first record.
+            limit (int): Most barcodes to return.
+
+        Returns:
+            list: Returns a list of barcodes.
+        """
+        with self.lock:
+            return self.barcodes[offset:offset + limit]
+
+    def position(self, barcode):
+        """Returns the position of a record in file order, found by binary search on its byte offset.
+            Returns None if the barcode is not found.
+        """
+        with self.lock:
+            offsets = self.offsets.get(barcode)
+            if offsets is None: return None
+            return bisect.bisect_left(self.starts, offsets[0])
+
+    def __contains__(self, barcode):
+        return barcode in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+
+class JsonFoodStorage(FoodStorage):
+    def __init__(self, filePath, journalEnabled=False, lazyLoading=False, fileFormat="pretty", compression="none"):
+        """Creates a new JsonFoodStorage object. Stores all food data in a single JSON file,
+            optionally with a change journal beside it. Files in any format or compression are read,
+            the format and compression provided only apply to writes.
+
+        Args:
+            filePath (string): Path to the JSON food data file.
+            journalEnabled (bool, optional): Appends changes to a journal instead of rewriting the file. Defaults to False.
+            lazyLoading (bool, optional): Returns a JsonRecordIndex from read() instead of every record.
+                Compressed files are always read in full. Defaults to False.
+            fileFormat (string, optional): See encodeFoodData(). Defaults to "pretty".
+            compression (string, optional): See encodeFoodData(). Defaults to "none".
+
+        Raises:
+            ValueError: Raised if the format or compression is not supported.
+        """
+        if fileFormat not in FILE_FORMATS: raise ValueError(f"File format must be one of {FILE_FORMATS}.")
+        if compression not in COMPRESSIONS: raise ValueError(f"Compression must be one of {COMPRESSIONS}.")
+
+        super().__init__(filePath)
+        self.journalEnabled = journalEnabled
+        self.journal = FoodJournal.forDataFile(filePath)
+        self.LAZY_RECORDS = lazyLoading
+        self.fileFormat = fileFormat
+        self.compression = compression
+        self.records = None
+
+    def read(self):
+        if not os.path.exists(self.filePath): return None
+
+        if self.LAZY_RECORDS:
+            with open(self.filePath, mode="rb") as f:
+                magic = f.read(len(LZMA_MAGIC))
+
+            # Byte offsets only work on an uncompressed file.
+            if isCompressed(magic):
+                self.LAZY_RECORDS = False
+
+        if self.LAZY_RECORDS:
+            self.records = JsonRecordIndex(self.filePath)
+            try:
+                self.records.build()
+            except ValueError:
+                self.records = None
+                return None
+
+            return {'servingUoms': self.records.servingUoms, 'foodData': self.records}
+
+        with open(self.filePath, mode="rb") as f:
+            try:
+                return decodeFoodData(f.read())
+            except ValueError:
+                return None
+
+    def readIncrementally(self):
+        if self.LAZY_RECORDS or not os.path.exists(self.filePath): return super().readIncrementally()
+
+        f = open(self.filePath, mode="rb")
+        try:
+            return scanFoodData(JsonTextStream(openDecompressed(f), sourceFile=f))
+        except (ValueError, OSError, EOFError, lzma.LZMAError, zlib.error):
+            f.close()
+            return None
+
+    def splitRecords(self, parts, minPartSize=1024 * 1024):
+        """Splits the records of an uncompressed file written by FoodRecordEncoder, see FoodStorage.splitRecords().
+            Split points are found by searching for the end of a record near evenly spaced offsets, without reading the
+            rest of the file. A split point found inside a record instead makes readRecordRange() raise ValueError
+            for the range before it.
+        """
+        if self.LAZY_RECORDS or not os.path.exists(self.filePath): return None
+
+        with open(self.filePath, mode="rb") as f:
+            if isCompressed(f.read(len(LZMA_MAGIC))): return None
+            f.seek(0)
+
+            decoder = json.JSONDecoder()
+            stream = JsonTextStream(f)
+            servingUoms = None
+            layout = None
+
+            try:
+                idx = stream.scan(JsonRecordIndex._expect, 0, "{")
+                while stream.scan(JsonRecordIndex._peek, idx)[0] != "}":
+                    key, idx = stream.scan(JsonRecordIndex._scanKey, idx)
+                    if key == "foodData": break
+
+                    value, idx = stream.scan(decoder.raw_decode, idx)
+                    if key == "servingUoms": servingUoms = value
+                    if key == "layout": layout = value
+
+                    idx = stream.scan(JsonRecordIndex._skipSeparator, idx, "}")
+                else:
+                    return None
+
+                idx = stream.scan(JsonRecordIndex._expect, idx, "{")
+                if stream.scan(JsonRecordIndex._peek, idx)[0] == "}": return None
+            except (ValueError, StopIteration):
+                return None
+
+            # The records are only split when the UOMs they may reference have been read before them.
+            if not isinstance(servingUoms, list): return None
+
+            start = stream.bytePosition(idx)
+            size = os.fstat(f.fileno()).st_size
+            parts = min(parts, (size - start) // max(1, minPartSize))
+            if parts < 2: return None
+
+            ranges = []
+            for part in range(1, parts):
+                target = start + (size - start) * part // parts
+                if target < start: continue
+
+                f.seek(target)
+                boundary = RECORD_BOUNDARY.search(f.read(RECORD_BOUNDARY_WINDOW))
+                if boundary is None: continue
+
+                comma = target + boundary.start(1)
+                ranges.append((start, comma))
+                start = comma + 1
+
+        if len(ranges) <= 0: return None
+
+        ranges.append((start, None))
+        return (servingUoms, layout, ranges)
+
+    def readChanges(self):
+        return self.journal.readEntries()
+
+    def fingerprint(self):
+        fingerprint = super().fingerprint()
+        if fingerprint is None: return None
+        return fingerprint + self.journal.fingerprint()
+
+    def writeChange(self, op, key, data=None):
+        if not self.journalEnabled: return False
+
+        self.journal.append(op, key, data)
+        return True
+
+    def writeChanges(self, changes):
+        if not self.journalEnabled: return False
+
+        self.journal.appendMany(changes)
+        return True
+
+    def needsCompaction(self):
+        return self.journalEnabled and self.journal.needsCompaction()
+
+    def beginSnapshot(self):
+        self.journal.rotate()
+
+    def writeSnapshot(self, data):
+        if self.records is None:
+            self._writeContent(encodeFoodData(data, self.fileFormat, self.compression))
+            return
+
+        encoder = FoodRecordEncoder(self.fileFormat)
+        foodData = data['foodData']
+        self.writeFragments(data['servingUoms'], ((barcode, encoder.encode(foodData[barcode])) for barcode in foodData), encoder)
+
+    def createRecordEncoder(self):
+        return FoodRecordEncoder(self.fileFormat)
+
+    def writeFragments(self, servingUoms, fragments, encoder):
+        if self.records is None:
+            content = encoder.encodeFile(servingUoms, fragments).encode("utf-8")
+            self._writeContent(compressFoodData(content, self.compression))
+            return
+
+        # A lazily loaded file is read by byte offset, so it stays uncompressed and the offsets of the records written
+        # replace those of the previous file, rather than the new file being scanned again.
+        offsets = {}
+        text = encoder.encodeFile(servingUoms, fragments, offsets)
+        content = text.encode("utf-8")
+        if len(content) != len(text): offsets = JsonRecordIndex._toByteOffsets(text, offsets)
+
+        layout = NORMALIZED_LAYOUT if encoder.fileFormat == "normalized" else None
+        self._writeContent(content, (offsets, encoder.fileServingUoms(servingUoms), layout))
+
+    def _writeContent(self, content, recordOffsets=None):
+        """Writes the file contents to a temporary file, forces it to disk and then renames it over the food data file,
+            so the file on disk is always either the previous or the new version, never a partial one.
+
+        Args:
+            content (bytes): File contents.
+            recordOffsets (tuple, optional): Arguments of JsonRecordIndex.setOffsets() for the contents, when lazily loaded.
+                Defaults to None.
+        """
+        tempFilePath = self.filePath + ".tmp"
+
+        with open(tempFilePath, mode="wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self.records is not None:
+            # Record positions move with the new file, update them before any reader can use the old offsets.
+            with self.records.lock:
+                os.replace(tempFilePath, self.filePath)
+                self.records.setOffsets(*recordOffsets)
+        else:
+            os.replace(tempFilePath, self.filePath)
+
+        self.journal.clearRotated()
+
+
+
+class SqliteRecordMapping(Mapping):
+    # Rows fetched from a cursor at a time while iterating.
+    FETCH_SIZE = 1000
+
+    def __init__(self, connection):
+        """Creates a read only mapping of barcode to record, served by single row queries.
+
+        Args:
+            connection (sqlite3.Connection): Open connection to a food database.
+        """
+        self.connection = connection
+
+    def __getitem__(self, barcode):
+        row = self.connection.execute(f"SELECT {SqliteFoodStorage.FOOD_COLUMNS} FROM foods WHERE barcode = ?", (barcode,)).fetchone()
+        if row is None: raise KeyError(barcode)
+        return SqliteFoodStorage.rowToRecord(row)[1]
+
+    def __contains__(self, barcode):
+        return self.connection.execute("SELECT 1 FROM foods WHERE barcode = ?", (barcode,)).fetchone() is not None
+
+    def iterRecords(self):
+        """Reads every record with a single query, fetching FETCH_SIZE rows at a time so memory stays flat however
+            many records there are.
+
+        Yields:
+            tuple: Returns (barcode, record) pairs.
+        """
+        cursor = self.connection.execute(f"SELECT {SqliteFoodStorage.FOOD_COLUMNS} FROM foods")
+        try:
+            for rows in iter(lambda: cursor.fetchmany(SqliteRecordMapping.FETCH_SIZE), []):
+                for row in rows:
+                    yield SqliteFoodStorage.rowToRecord(row)
+        finally:
+            cursor.close()
+
+    def count(self):
+        """Returns the number of records.
+        """
+        return self.connection.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    def page(self, offset, limit):
+        """Returns the barcodes of a run of records in barcode order, read from the primary key index.
+
+        Args:
+            offset (int): Position of the first record.
+            limit (int): Most barcodes to return.
+
+        Returns:
+            list: Returns a list of barcodes.
+        """
+        rows = self.connection.execute("SELECT barcode FROM foods ORDER BY barcode LIMIT ? OFFSET ?", (limit, offset))
+        return [row[0] for row in rows]
+
+    def position(self, barcode):
+        """Returns the position of a record in barcode order. Returns None if the barcode is not found.
+        """
+        if barcode not in self: return None
+        return self.connection.execute("SELECT COUNT(*) FROM foods WHERE barcode < ?", (barcode,)).fetchone()[0]
+
+    def __iter__(self):
+        cursor = self.connection.execute("SELECT barcode FROM foods ORDER BY barcode")
+        try:
+            for rows in iter(lambda: cursor.fetchmany(SqliteRecordMapping.FETCH_SIZE), []):
+                for row in rows:
+                    yield row[0]
+        finally:
+            cursor.close()
+
+    def __len__(self):
+        return self.count()
+
+
+
+class SqliteFoodStorage(FoodStorage):
+    FILE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+    WRITES_SNAPSHOTS = False
+    LAZY_RECORDS = True
+
+    FOOD_COLUMNS = "barcode, description, detailedDescription, caloriesPerServing, servingSize, uomName, uomCode"
+    UOM_COLUMNS = "name, code, dimension, factor"
+
+    # Numeric columns are declared without a type so values keep the type they were saved with.
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS servingUoms (
+            position INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            code TEXT NOT NULL UNIQUE,
+            dimension TEXT,
+            factor REAL
+        );
+        CREATE TABLE IF NOT EXISTS foods (
+            barcode TEXT PRIMARY KEY,
+            description TEXT,
+            detailedDescription TEXT,
+            caloriesPerServing,
+            servingSize,
+            uomName TEXT,
+            uomCode TEXT
+        );
+    """
+
+    def __init__(self, filePath):
+        """Creates a new SqliteFoodStorage object. Each food is a row keyed by barcode,
+            so lookups and changes touch a single row no matter how large the catalog is.
+
+        Args:
+            filePath (string): Path to the SQLite database file. Created if it does not exist.
+        """
+        super().__init__(filePath)
+        # The database may be opened on a background thread and used from the GUI thread afterwards.
+        self.connection = sqlite3.connect(filePath, check_same_thread=False)
+        self.connection.executescript(SqliteFoodStorage.SCHEMA)
+
+        # Databases created before UOM conversions were stored lack the conversion columns.
+        uomColumns = [row[1] for row in self.connection.execute("PRAGMA table_info(servingUoms)")]
+        with self.connection:
+            for column, columnType in (("dimension", "TEXT"), ("factor", "REAL")):
+                if column not in uomColumns:
+                    self.connection.execute(f"ALTER TABLE servingUoms ADD COLUMN {column} {columnType}")
+
+    @staticmethod
+    def recordToRow(barcode, record):
+        """Converts a record into a row of values matching FOOD_COLUMNS.
+        """
+        uom = record['servingSizeUom']
+        return (barcode, record['description'], record['detailedDescription'], record['caloriesPerServing'],
+                record['servingSize'], uom['name'], uom['code'])
+
+    @staticmethod
+    def uomToRow(uom):
+        """Converts a UOM dictionary into a row of values matching UOM_COLUMNS.
+        """
+        return (uom['name'], uom['code'], uom.get('dimension'), uom.get('factor'))
+
+    @staticmethod
+    def rowToUom(row):
+        """Converts a row of values matching UOM_COLUMNS into a UOM dictionary.
+        """
+        name, code, dimension, factor = row
+        uom = {'name': name, 'code': code}
+        if dimension is not None:
+            uom['dimension'] = dimension
+            uom['factor'] = factor
+        return uom
+
+    @staticmethod
+    def rowToRecord(row):
+        """Converts a row of values matching FOOD_COLUMNS into a (barcode, record) pair.
+        """
+        barcode, description, detailedDescription, caloriesPerServing, servingSize, uomName, uomCode = row
+        record = {
+            'description': description,
+            'detailedDescription': detailedDescription,
+            'caloriesPerServing': caloriesPerServing,
+            'servingSize': servingSize,
+            'servingSizeUom': {'name': uomName, 'code': uomCode}
+        }
+        return (barcode, record)
+
+    def read(self):
+        uoms = [SqliteFoodStorage.rowToUom(row) for row in self.connection.execute(f"SELECT {SqliteFoodStorage.UOM_COLUMNS} FROM servingUoms ORDER BY position")]
+        foodData = SqliteRecordMapping(self.connection)
+
+        if len(uoms) <= 0 and len(foodData) <= 0: return None
+
+        return {'servingUoms': uoms, 'foodData': foodData}
+
+    def writeChange(self, op, key, data=None):
+        return self.writeChanges([(op, key, data)])
+
+    def writeChanges(self, changes):
+        with self.connection:
+            for op, key, data in changes:
+                if op == FoodJournal.ADD or op == FoodJournal.UPDATE:
+                    self.connection.execute(f"INSERT OR REPLACE INTO foods ({SqliteFoodStorage.FOOD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                            SqliteFoodStorage.recordToRow(key, data))
+
+                elif op == FoodJournal.REMOVE:
+                    self.connection.execute("DELETE FROM foods WHERE barcode = ?", (key,))
+
+                elif op == FoodJournal.ADD_UOM:
+                    self.connection.execute(f"INSERT OR IGNORE INTO servingUoms ({SqliteFoodStorage.UOM_COLUMNS}) VALUES (?, ?, ?, ?)",
+                                            SqliteFoodStorage.uomToRow(data))
+
+        return True
+
+    def writeSnapshot(self, data):
+        foodData = data['foodData']
+
+        with self.connection:
+            self.connection.execute("DELETE FROM servingUoms")
+            self.connection.execute("DELETE FROM foods")
+
+            self.connection.executemany(f"INSERT OR IGNORE INTO servingUoms ({SqliteFoodStorage.UOM_COLUMNS}) VALUES (?, ?, ?, ?)",
+                                        (SqliteFoodStorage.uomToRow(uom) for uom in data['servingUoms']))
+            self.connection.executemany(f"INSERT OR REPLACE INTO foods ({SqliteFoodStorage.FOOD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        (SqliteFoodStorage.recordToRow(barcode, foodData[barcode]) for barcode in foodData))
+
+    def close(self):
+        self.connection.close()
+
+
+
+def migrateJsonToSqlite(jsonFilePath, sqliteFilePath):
+    """One-shot migration of a JSON food data file, including any journaled changes, into a SQLite database.
+        Existing data in the database is replaced.
+
+    Args:
+        jsonFilePath (string): Path to the JSON food data file.
+        sqliteFilePath (string): Path to the SQLite database to write.
+
+    Raises:
+        ValueError: Raised if the JSON food data file is missing or could not be read.
+
+    Returns:
+        int: Number of foods migrated.
+    """
+    source = JsonFoodStorage(jsonFilePath)
+    data = source.read()
+
+    if data is None: raise ValueError(f"Could not read food data file '{jsonFilePath}'.")
+
+    for entry in source.readChanges():
+        op = entry["op"]
+        key = entry["key"]
+
+        if op == FoodJournal.ADD or op == FoodJournal.UPDATE:
+            data["foodData"][key] = entry["data"]
+        elif op == FoodJournal.REMOVE:
+            data["foodData"].pop(key, None)
+        elif op == FoodJournal.ADD_UOM:
+            data["servingUoms"].append(entry["data"])
+
+    target = SqliteFoodStorage(sqliteFilePath)
+    try:
+        target.writeSnapshot(data)
+    finally:
+        target.close()
+
+    return len(data["foodData"])
@@ -0,0 +1,103 @@
+"""Looks up barcodes without the GUI, writing one JSON result per line.
+
+Usage:
+    python lookup.py [barcodeFile] [--data-file PATH] [--batch-size N] [--stats] < barcodes.txt
+
+Reads one barcode per line from barcodeFile, or from stdin when it is '-' or left out. Blank lines are skipped.
+Each result is a line of JSON: {"barcode": ..., "food": ...}, where food is null if the barcode was not found.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import islice
+from caloriePal import CaloriePal, Food
+
+DEFAULT_BATCH_SIZE = 1000
+
+def iterBarcodes(lines):
+    """Yields the barcode on each line, skipping blank lines.
+    """
+    for line in lines:
+        barcode = line.strip()
+        if len(barcode) > 0: yield barcode
+
+def lookupBarcodes(calPal, lines, output, batchSize=DEFAULT_BATCH_SIZE):
+    """Looks up barcodes in batches and writes a JSON result line for each.
+
+    Args:
+        calPal (CaloriePal Object): CaloriePal holding the food data.
+        lines (iterable): Lines holding one barcode each.
+        output (file): Text file to write results to.
+        batchSize (int, optional): Number of barcodes looked up at a time. Defaults to DEFAULT_BATCH_SIZE.
+
+    Returns:
+        tuple: Returns a tuple of (lookups, found).
+    """
+    barcodes = iterBarcodes(lines)
+    lookups = 0
+    found = 0
+
+    while True:
+        batch = list(islice(barcodes, batchSize))
+        if len(batch) <= 0: break
+
+        results = []
+        for barcode, food in zip(batch, calPal.findFoodsByBarcodes(batch)):
+            if food is not None:
+                found += 1
+                food = Food.toDict(food, removeBarcode=False)
+            results.append(json.dumps({"barcode": barcode, "food": food}) + "\n")
+
+        output.write("".join(results))
+        lookups += len(batch)
+
+    return (lookups, found)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Looks up barcodes and writes the foods found as NDJSON.")
+    parser.add_argument("barcodeFile", nargs="?", default="-", help="File with one barcode per line. Defaults to stdin.")
+    parser.add_argument("--data-file", help="Food data file to use instead of the one in Settings.json.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Number of barcodes looked up at a time.")
+    parser.add_argument("--stats", action="store_true", help="Writes load time and lookups per second to stderr.")
+    args = parser.parse_args(args)
+
+    if args.batch_size < 1: parser.error("--batch-size must be at least 1.")
+
+    startTime = time.perf_counter()
+    # Only the file looked up in is read, rather than reading the one in Settings.json first and then replacing it.
+    calPal = CaloriePal(readFoodData=False)
+
+    if args.data_file is None:
+        calPal.readFoodDataFile()
+    else:
+        changed, msg = calPal.changeFoodDataFile(args.data_file)
+        # No file was read before, so changeFoodDataFile() has nothing to revert to and reports a file that failed as changed.
+        if not changed or not calPal.foodDataFileOk:
+            sys.stderr.write(f"{msg if not changed else 'Food data file could not be read.'}\n")
+            return 2
+
+    loadTime = time.perf_counter() - startTime
+
+    barcodeFile = sys.stdin if args.barcodeFile == "-" else open(args.barcodeFile, mode="r")
+    try:
+        startTime = time.perf_counter()
+        lookups, found = lookupBarcodes(calPal, barcodeFile, sys.stdout, args.batch_size)
+        sys.stdout.flush()
+        lookupTime = time.perf_counter() - startTime
+    except BrokenPipeError:
+        # The reader stopped early, such as when piped into head. Points stdout at devnull so exiting does not raise again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if barcodeFile is not sys.stdin: barcodeFile.close()
+
+    if args.stats:
+        rate = lookups / lookupTime if lookupTime > 0 else 0
+        sys.stderr.write(f"load: {loadTime:.3f}s, {lookups} lookups, {found} found, {lookupTime:.3f}s, {rate:,.0f} lookups/s\n")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,47 @@
+import time
+# Taken before the other imports, so --profile-startup times them too.
+STARTUP_TIME = time.perf_counter()
+
+import argparse
+import gc
+import os.path
+import threading
 from tkinter import *
 from tkinter import ttk
 import tkinter as tk
 import tkinter.messagebox as messagebox
-from tkinter import filedialog
 import json
-from caloriePal import CaloriePal, ServingUom, Food
-import staticVariables
+# caloriePal and the modules built on it are imported where they are first used, caloriePal by the food data loader,
+# so the main window is shown without waiting for them.
+
+
+class StartupProfile(object):
+    def __init__(self, startTime):
+        """Creates a new StartupProfile object. Records how long each phase of startup takes.
+
+        Args:
+            startTime (float): time.perf_counter() value startup began at.
+        """
+        self.startTime = startTime
+        self.lastTime = startTime
+        self.phases = []
+
+    def mark(self, phase):
+        """Ends a phase, timing it from the end of the previous one.
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.lastTime))
+        self.lastTime = now
+
+    def report(self):
+        """Prints the time taken by each phase and in total.
+        """
+        width = max(len(phase) for phase, seconds in self.phases)
+
+        print("Startup profile:")
+        for phase, seconds in self.phases:
+            print(f"  {phase:<{width}}  {seconds * 1000:8.1f}ms")
+        print(f"  {'total':<{width}}  {(self.lastTime - self.startTime) * 1000:8.1f}ms")
 
 
 class GUI:
@@ -13,12 +49,27 @@ class GUI:
     PROGRAM_NAME = f"Calorie Pal {VERSION}"
     FLOAT_START = 0.0
     START = 0
-    PROGRAM_ICON = staticVariables.PROGRAM_ICON
-
-    def __init__(self, parentWindow, calPal):
+    # Window icons shipped beside main.py, tried in order. staticVariables.PROGRAM_ICON is the fallback if neither exists.
+    RESOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+    ICON_FILES = ("IconSmall.png", "Icon.png")
+    LOAD_POLL_MS = 50
+    # Most record errors listed at once when saving from the raw food data viewer.
+    RAW_FOOD_DATA_ERRORS_SHOWN = 10
+    # Rows the food browser shows. Only these rows exist in its Treeview, they are filled from the foods scrolled into view.
+    FOOD_BROWSER_ROWS = 20
+    FOOD_BROWSER_COLUMNS = (("barcode", "Barcode", 150), ("description", "Description", 400),
+                            ("caloriesPerServing", "Calories", 100), ("servingSize", "Serving Size", 130))
+    FOOD_BROWSER_SEARCH_DELAY_MS = 250
+    FOOD_BROWSER_WHEEL_ROWS = 3
+
+    def __init__(self, parentWindow, profile=None):
         self.mainWindow = parentWindow
-        self.calPal = calPal
+        # Created by the food data loader, see _loadFoodData().
+        self.calPal = None
+        self.profile = profile
         self.barcodeValue = ""
+        self.icon = None
+        self.foodBrowserWindow = None
 
         self.font = ("TkDefaultFont", 16, "normal")
 
@@ -40,9 +91,10 @@ class GUI:
         self.rawFoodDataWindowHeight = 700
         self.rawFoodDataWindowWidth = 700
 
-        self.mainWindow.title(self.PROGRAM_NAME)
-        self.icon = PhotoImage(data = GUI.PROGRAM_ICON)
-        self.mainWindow.iconphoto(True, self.icon)
+        self.foodBrowserWindowHeight = 600
+        self.foodBrowserWindowWidth = 850
+
+        self.mainWindow.title(f"{self.PROGRAM_NAME} - Loading food data...")
         self.mainWindow.geometry(f"{self.mainWindowWidth}x{self.mainWindowHeight}")
         self.mainWindow.minsize(self.mainWindowWidth, self.mainWindowHeight)
 
@@ -51,13 +103,105 @@ class GUI:
         self.mainWindow.bind("<Tab>", self.onMainWindowEvent)
 
         self._populateMainWindow()
+        self._markStartup("main window built")
+
+        # The icon and the food data load once the main window is up, the food data on a background thread a chunk at a time.
+        # A progress bar stands in for the Find button until it is loaded, a barcode scanned meanwhile is looked up then.
+        self.foodDataLoaded = False
+        self._foodDataLoadError = None
+        self._foodDataLoadProgress = 0.0
+        self._findWhenLoaded = False
+        self.rootMenubar.entryconfig("Data", state=DISABLED)
+
+        self.mainWindowFindButton.grid_remove()
+        self.mainWindowLoadProgressbar = ttk.Progressbar(self.mainWindow, mode="determinate", maximum=100, length=400)
+        self.mainWindowLoadProgressbar.grid(row=10, column=0, columnspan=2, pady=3)
+
+        # Full collections over the foods built so far stall the Tk thread too, and find nothing to free, so collection
+        # is paused here on the Tk thread while the catalog loads, and resumed by _checkFoodDataLoaded() once it is done.
+        gc.disable()
+        try:
+            self._foodDataLoader = threading.Thread(target=self._loadFoodData, name="FoodDataLoader", daemon=True)
+            self._foodDataLoader.start()
+            self.mainWindow.after(GUI.LOAD_POLL_MS, self._checkFoodDataLoaded)
+        except BaseException:
+            gc.enable()
+            raise
+        self.mainWindow.after_idle(self.loadIcon)
+
+    def _markStartup(self, phase):
+        if self.profile is not None: self.profile.mark(phase)
+
+    def loadIcon(self):
+        self._markStartup("main window shown")
+
+        for fileName in GUI.ICON_FILES:
+            filePath = os.path.join(GUI.RESOURCE_DIRECTORY, fileName)
+            if os.path.exists(filePath):
+                self.icon = PhotoImage(file=filePath)
+                break
+        else:
+            import staticVariables
+            self.icon = PhotoImage(data=staticVariables.PROGRAM_ICON)
+
+        self.mainWindow.iconphoto(True, self.icon)
+        self._markStartup("icon")
+
+    def _loadFoodData(self):
+        try:
+            from caloriePal import CaloriePal
+            self.calPal = CaloriePal(readFoodData=False)
+
+            for progress in self.calPal.readFoodDataFileIncrementally():
+                self._foodDataLoadProgress = progress
+        except Exception as err:
+            self._foodDataLoadError = err
+
+    def _checkFoodDataLoaded(self):
+        if self._foodDataLoader.is_alive():
+            # Polled again first, so an error showing the progress can not stop collection being resumed.
+            self.mainWindow.after(GUI.LOAD_POLL_MS, self._checkFoodDataLoaded)
+
+            percent = int(self._foodDataLoadProgress * 100)
+            self.mainWindowLoadProgressbar.config(value=percent)
+            self.mainWindow.title(f"{self.PROGRAM_NAME} - Loading food data... {percent}%")
+            return
+
+        # Resumed before anything else, so no error below can leave collection paused. Freezing keeps the loaded foods
+        # out of later full collections.
+        gc.freeze()
+        gc.enable()
+
+        if self._foodDataLoadError is not None:
+            messagebox.showerror(self.PROGRAM_NAME, f"Food data could not be loaded.\n\nError: {self._foodDataLoadError}", parent=self.mainWindow)
+            self.mainWindow.destroy()
+            return
+
+        self.foodDataLoaded = True
+        self.mainWindow.title(self.PROGRAM_NAME)
+        self.mainWindowLoadProgressbar.destroy()
+        self.mainWindowFindButton.grid()
+        self.rootMenubar.entryconfig("Data", state=NORMAL)
+
+        self._markStartup(f"food data ({self.calPal.foodDataCacheStatus} cache), finished in background")
+        if self.profile is not None: self.profile.report()
 
-        # For testing.
-        self.mainWindowBarcodeEntry.insert(END, "041271025903")
-        self.mainWindowFindButton.invoke()
+        if self._findWhenLoaded: self.findFoodByBarcode()
 
     def cleanExit(self):
+        # Nothing can have changed before the food data is loaded.
+        if not self.foodDataLoaded:
+            if self.calPal is not None: self.calPal.saveSettingsFile()
+            exit()
+
         self.calPal.saveFoodDataFile()
+
+        try:
+            self.calPal.flush()
+            self.calPal.saveSearchIndexes()
+        except Exception as err:
+            messagebox.showerror(self.PROGRAM_NAME, f"Food data could not be saved.\n\nError: {err}", parent=self.mainWindow)
+
         self.calPal.saveSettingsFile()
         exit()
     
@@ -76,7 +220,9 @@ class GUI:
         self.rootFilemenu.add_command(label="Exit", command=self.cleanExit)
 
         self.rootDatamenu.add_command(label="Change Food Data File", command=self.changeFoodDataFile)
+        self.rootDatamenu.add_command(label="Browse Foods", command=self.openFoodBrowserWindow)
         self.rootDatamenu.add_command(label="View Raw Food Data", command=self.openViewRawFoodDataWindow)
+        self.rootDatamenu.add_command(label="Export Food Data", command=self.exportFoodData)
 
 
 
@@ -96,6 +242,11 @@ class GUI:
     
 
     def findFoodByBarcode(self):
+        if not self.foodDataLoaded:
+            self._findWhenLoaded = True
+            return
+        self._findWhenLoaded = False
+
         self.barcodeValue = self.mainWindowBarcodeEntry.get().strip()
         if len(self.barcodeValue) <= 0:
             messagebox.showerror(self.PROGRAM_NAME, "Please scan or enter a barcode to lookup.",parent=self.mainWindow)
@@ -105,6 +256,8 @@ class GUI:
         data = self.calPal.findFoodDataByBarcode(self.barcodeValue)
 
         if data:
+            # The food may be stored under another variant of the barcode scanned.
+            self.barcodeValue = data.barcode
             self.openUpdateFoodWindow()
             self.resetMainWindow()
             return
@@ -133,7 +286,8 @@ class GUI:
         response = messagebox.askyesno(self.mainWindow.title(), msg, parent=self.mainWindow)
 
         if response:
-            filePath = filedialog.askopenfilename(filetypes =[('Food Data Files', '*.json')])
+            from tkinter import filedialog
+            filePath = filedialog.askopenfilename(filetypes =[('Food Data Files', '*.json'), ('Food Databases', '*.db *.sqlite *.sqlite3')])
             changeOk, msg = self.calPal.changeFoodDataFile(filePath)
 
             if changeOk == False:
@@ -144,6 +298,23 @@ class GUI:
 
         return
 
+    def exportFoodData(self):
+        from tkinter import filedialog
+        filePath = filedialog.asksaveasfilename(defaultextension=".ndjson",
+                                                filetypes=[('Newline Delimited JSON', '*.ndjson *.jsonl'), ('CSV Files', '*.csv')])
+        if not filePath: return
+
+        fileFormat = "csv" if filePath.lower().endswith(".csv") else "ndjson"
+
+        try:
+            with open(filePath, mode="w", encoding="utf-8", newline="") as f:
+                count = self.calPal.exportFoods(f, fileFormat)
+        except Exception as err:
+            messagebox.showerror(self.mainWindow.title(), f"Food data could not be exported.\n\nError: {err}", parent=self.mainWindow)
+            return
+
+        messagebox.showinfo(self.mainWindow.title(), f"Exported {count} items.", parent=self.mainWindow)
+
     def openViewRawFoodDataWindow(self):
         self.rawFoodDataWindow = Toplevel(self.mainWindow)
         self.rawFoodDataWindow.title("Raw Food Data Viewer")
@@ -151,36 +322,489 @@ class GUI:
         self.rawFoodDataWindow.geometry(f"{self.rawFoodDataWindowWidth}x{self.rawFoodDataWindowHeight}")
         self.rawFoodDataWindow.minsize(self.rawFoodDataWindowWidth, self.rawFoodDataWindowHeight)
 
+        # Only one page of foods is shown at a time, so opening and paging cost the same however large the catalog is.
+        self.rawFoodDataStart = 0
+        self.rawFoodDataPage = {}
+        self._rawFoodDataChecker = None
+
         self.rawFoodDataLabel = Label(self.rawFoodDataWindow, text="", font=self.font)
         self.rawFoodDataLabel.pack(fill='x')
 
-        self.rawFoodDataText = Text(self.rawFoodDataWindow, relief=SUNKEN, borderwidth=1, font=self.font)
-        self.rawFoodDataText.pack(expand=True, fill='both')
-        self.rawFoodDataText.bind("<KeyRelease>", self.onRawFoodDataTextEvent)
+        self.rawFoodDataJumpFrame = Frame(self.rawFoodDataWindow)
+        self.rawFoodDataJumpFrame.pack(fill='x')
 
-        self.insertRawFoodData()
+        self.rawFoodDataJumpLabel = Label(self.rawFoodDataJumpFrame, text="Barcode:", font=self.font)
+        self.rawFoodDataJumpLabel.pack(side=LEFT)
+
+        self.rawFoodDataJumpEntry = Entry(self.rawFoodDataJumpFrame, font=self.font)
+        self.rawFoodDataJumpEntry.pack(side=LEFT, expand=True, fill='x')
+        self.rawFoodDataJumpEntry.bind("<Return>", self.jumpToRawFoodDataBarcode)
+
+        self.rawFoodDataJumpButton = Button(self.rawFoodDataJumpFrame, text="Go", font=self.font, command=self.jumpToRawFoodDataBarcode)
+        self.rawFoodDataJumpButton.pack(side=LEFT, padx=3)
+
+        self.rawFoodDataPageFrame = Frame(self.rawFoodDataWindow)
+        self.rawFoodDataPageFrame.pack(fill='x')
+
+        self.rawFoodDataPreviousButton = Button(self.rawFoodDataPageFrame, text="< Previous", font=self.font, command=self.showPreviousRawFoodDataPage)
+        self.rawFoodDataPreviousButton.pack(side=LEFT)
+
+        self.rawFoodDataNextButton = Button(self.rawFoodDataPageFrame, text="Next >", font=self.font, command=self.showNextRawFoodDataPage)
+        self.rawFoodDataNextButton.pack(side=RIGHT)
+
+        self.rawFoodDataPageLabel = Label(self.rawFoodDataPageFrame, text="", font=self.font)
+        self.rawFoodDataPageLabel.pack(side=LEFT, expand=True)
 
         self.rawFoodDataSaveButton = Button(self.rawFoodDataWindow, text="Save", font=self.font, command=self.saveFoodDataFromRaw)
-        self.rawFoodDataSaveButton.pack(ipadx=10, ipady=5)
+        self.rawFoodDataSaveButton.pack(side=BOTTOM, ipadx=10, ipady=5)
+
+        self.rawFoodDataScrollbar = Scrollbar(self.rawFoodDataWindow)
+        self.rawFoodDataScrollbar.pack(side=RIGHT, fill='y')
+
+        self.rawFoodDataText = Text(self.rawFoodDataWindow, relief=SUNKEN, borderwidth=1, font=self.font, yscrollcommand=self.rawFoodDataScrollbar.set)
+        self.rawFoodDataText.pack(expand=True, fill='both')
+        self.rawFoodDataText.tag_config("jump", background="yellow")
+        self.rawFoodDataText.tag_config("error", background="#ffc0c0")
+        self.rawFoodDataScrollbar.config(command=self.rawFoodDataText.yview)
+        # Fires once when the text is first changed, rather than on every key press.
+        self.rawFoodDataText.bind("<<Modified>>", self.onRawFoodDataTextEvent)
+
+        self.insertRawFoodData()
 
     def onRawFoodDataTextEvent(self, event=None):
-        self.rawFoodDataLabel.config(text="Unsaved Changes Exists")
+        if self.rawFoodDataText.edit_modified():
+            self.rawFoodDataLabel.config(text="Unsaved Changes Exists")
+
+    def insertRawFoodData(self, start=None):
+        """Shows a page of foods in the raw food data viewer.
+
+        Args:
+            start (int, optional): Position of the first food to show. Defaults to None, which shows the current page again.
+        """
+        if start is not None: self.rawFoodDataStart = start
+
+        pageSize = self.calPal.RECORDS_PAGE_SIZE
+        total = len(self.calPal.foodData)
+        # Falls back to the last page if foods were removed since the page was shown.
+        self.rawFoodDataStart = max(0, min(self.rawFoodDataStart, (total - 1) // pageSize * pageSize))
+
+        self.rawFoodDataPage = self.calPal.getFoodRecordsPage(self.rawFoodDataStart, pageSize)
 
-    def insertRawFoodData(self):
         self.rawFoodDataText.delete(GUI.FLOAT_START, END)
+        self.rawFoodDataText.insert(GUI.FLOAT_START, json.dumps(self.rawFoodDataPage, indent=4))
+        self.rawFoodDataText.edit_modified(False)
+        self.rawFoodDataLabel.config(text="")
+
+        if len(self.rawFoodDataPage) > 0:
+            pageText = f"Foods {self.rawFoodDataStart + 1}-{self.rawFoodDataStart + len(self.rawFoodDataPage)} of {total}"
+        else:
+            pageText = "No foods"
+        self.rawFoodDataPageLabel.config(text=pageText)
+
+        self.rawFoodDataPreviousButton.config(state=NORMAL if self.rawFoodDataStart > 0 else DISABLED)
+        self.rawFoodDataNextButton.config(state=NORMAL if self.rawFoodDataStart + pageSize < total else DISABLED)
+
+    def confirmDiscardRawFoodData(self):
+        """Asks before unsaved edits in the raw food data viewer are thrown away.
+
+        Returns:
+            bool: Returns True if there are no unsaved edits or the user chose to discard them. Returns False while the edits are being saved.
+        """
+        if self._rawFoodDataChecker is not None and self._rawFoodDataChecker.is_alive(): return False
+        if not self.rawFoodDataText.edit_modified(): return True
+
+        msg = "The changes made to this page have not been saved.\n\nDo you want to discard them?"
+        return messagebox.askyesno(self.rawFoodDataWindow.title(), msg, parent=self.rawFoodDataWindow)
+
+    def showPreviousRawFoodDataPage(self):
+        if not self.confirmDiscardRawFoodData(): return
+        self.insertRawFoodData(self.rawFoodDataStart - self.calPal.RECORDS_PAGE_SIZE)
 
-        data = {}
-        data = self.calPal.getFoodDataJson()
-        dataString = json.dumps(data, indent=4)
+    def showNextRawFoodDataPage(self):
+        if not self.confirmDiscardRawFoodData(): return
+        self.insertRawFoodData(self.rawFoodDataStart + self.calPal.RECORDS_PAGE_SIZE)
 
-        self.rawFoodDataText.insert(GUI.FLOAT_START, dataString)
+    def jumpToRawFoodDataBarcode(self, event=None):
+        barcode = self.rawFoodDataJumpEntry.get().strip()
+        if len(barcode) <= 0: return
+
+        found = self.calPal.findFoodPosition(barcode)
+        if found is None:
+            messagebox.showinfo(self.rawFoodDataWindow.title(), "Could not find item matching that barcode.", parent=self.rawFoodDataWindow)
+            return
+
+        if not self.confirmDiscardRawFoodData(): return
+
+        position, barcode = found
+        self.insertRawFoodData(position - position % self.calPal.RECORDS_PAGE_SIZE)
+
+        index = self.rawFoodDataText.search(f"{json.dumps(barcode)}: {{", GUI.FLOAT_START, END)
+        if index:
+            self.rawFoodDataText.tag_add("jump", index, f"{index} lineend")
+            self.rawFoodDataText.mark_set(INSERT, index)
+            self.rawFoodDataText.see(index)
 
     def saveFoodDataFromRaw(self):
-        self.rawFoodDataLabel.config(text="File Saved")
+        if self._rawFoodDataChecker is not None and self._rawFoodDataChecker.is_alive(): return
+
+        if not self.rawFoodDataText.edit_modified():
+            self.rawFoodDataLabel.config(text="No Changes To Save")
+            return
+
+        text = self.rawFoodDataText.get(GUI.FLOAT_START, "end-1c")
+        self.rawFoodDataText.tag_remove("error", GUI.FLOAT_START, END)
+
+        # The text is parsed and compared on a background thread, and left read only until the changes are applied.
+        self.rawFoodDataText.config(state=DISABLED)
+        self.rawFoodDataSaveButton.config(state=DISABLED)
+        self.rawFoodDataLabel.config(text="Checking Changes...")
+
+        self._rawFoodDataChanges = None
+        self._rawFoodDataError = None
+        self._rawFoodDataChecker = threading.Thread(target=self._diffRawFoodData, args=(self.rawFoodDataPage, text),
+                                                    name="RawFoodDataChecker", daemon=True)
+        self._rawFoodDataChecker.start()
+        self.rawFoodDataWindow.after(GUI.LOAD_POLL_MS, self._checkRawFoodDataDiffed, self.rawFoodDataWindow)
+
+    def _diffRawFoodData(self, shownRecords, text):
+        from foodRecordEdits import diffFoodRecords
+
+        try:
+            self._rawFoodDataChanges = diffFoodRecords(self.calPal, shownRecords, text)
+        except ValueError as err:
+            self._rawFoodDataError = err
+
+    def _checkRawFoodDataDiffed(self, window):
+        # The viewer may have been closed while the changes were checked, they are thrown away with it.
+        if window is not self.rawFoodDataWindow or not window.winfo_exists(): return
+
+        if self._rawFoodDataChecker.is_alive():
+            window.after(GUI.LOAD_POLL_MS, self._checkRawFoodDataDiffed, window)
+            return
+
+        self.rawFoodDataText.config(state=NORMAL)
+        self.rawFoodDataSaveButton.config(state=NORMAL)
+        changes = self._rawFoodDataChanges
+
+        if self._rawFoodDataError is not None:
+            self.rawFoodDataLabel.config(text="Not Saved")
+            lineNumber = getattr(self._rawFoodDataError, "lineno", None)
+            if lineNumber is not None: self._markRawFoodDataLine(lineNumber, "error")
+
+            messagebox.showerror(self.rawFoodDataWindow.title(), f"The food data could not be read.\n\nError: {self._rawFoodDataError}",
+                                 parent=self.rawFoodDataWindow)
+            return
+
+        if len(changes.errors) > 0:
+            self.rawFoodDataLabel.config(text="Not Saved")
+            for lineNumber, barcode, reason in changes.errors:
+                self._markRawFoodDataLine(lineNumber, "error")
+            self.rawFoodDataText.see(f"{changes.errors[0][0]}.0")
+
+            lines = [f"Line {lineNumber}, barcode '{barcode}': {reason}" for lineNumber, barcode, reason in changes.errors[:GUI.RAW_FOOD_DATA_ERRORS_SHOWN]]
+            if len(changes.errors) > GUI.RAW_FOOD_DATA_ERRORS_SHOWN:
+                lines.append(f"...and {len(changes.errors) - GUI.RAW_FOOD_DATA_ERRORS_SHOWN} more.")
+
+            messagebox.showerror(self.rawFoodDataWindow.title(), "Nothing was saved, some items are not valid.\n\n" + "\n".join(lines),
+                                 parent=self.rawFoodDataWindow)
+            return
+
+        if len(changes) <= 0:
+            self.rawFoodDataText.edit_modified(False)
+            self.rawFoodDataLabel.config(text="No Changes To Save")
+            return
+
+        try:
+            changes.apply(self.calPal)
+        except Exception as err:
+            self.rawFoodDataLabel.config(text="Not Saved")
+            messagebox.showerror(self.rawFoodDataWindow.title(), f"Changes could not be saved.\n\nError: {err}", parent=self.rawFoodDataWindow)
+            return
+
+        self.insertRawFoodData()
+        self.rawFoodDataLabel.config(text=f"Saved {len(changes.added)} Added, {len(changes.updated)} Updated, {len(changes.removed)} Removed")
+
+    def _markRawFoodDataLine(self, lineNumber, tag):
+        self.rawFoodDataText.tag_add(tag, f"{lineNumber}.0", f"{lineNumber}.0 lineend")
+        self.rawFoodDataText.mark_set(INSERT, f"{lineNumber}.0")
+
+
+
+    def openFoodBrowserWindow(self):
+        self.foodBrowserWindow = Toplevel(self.mainWindow)
+        self.foodBrowserWindow.title("Browse Foods")
+
+        self.foodBrowserWindow.geometry(f"{self.foodBrowserWindowWidth}x{self.foodBrowserWindowHeight}")
+        self.foodBrowserWindow.minsize(self.foodBrowserWindowWidth, self.foodBrowserWindowHeight)
+
+        # The Treeview only ever holds FOOD_BROWSER_ROWS items. Scrolling fills them from the foods in view, so the window
+        # costs the same however large the catalog is.
+        self.foodBrowserView = None
+        self.foodBrowserTop = 0
+        self.foodBrowserSelected = None
+        self._foodBrowserSearchJob = None
+        self._foodBrowserSearching = False
+        self._foodBrowserSorter = None
+
+        self.foodBrowserSearchFrame = Frame(self.foodBrowserWindow)
+        self.foodBrowserSearchFrame.pack(fill='x')
+
+        self.foodBrowserSearchLabel = Label(self.foodBrowserSearchFrame, text="Search:", font=self.font)
+        self.foodBrowserSearchLabel.pack(side=LEFT)
+
+        self.foodBrowserSearchEntry = Entry(self.foodBrowserSearchFrame, font=self.font)
+        self.foodBrowserSearchEntry.pack(side=LEFT, expand=True, fill='x')
+        self.foodBrowserSearchEntry.bind("<KeyRelease>", self.onFoodBrowserSearchEvent)
+
+        self.foodBrowserCountLabel = Label(self.foodBrowserWindow, text="Sorting...", font=self.font)
+        self.foodBrowserCountLabel.pack(fill='x')
+
+        self.foodBrowserEditButton = Button(self.foodBrowserWindow, text="Edit", font=self.font, command=self.editBrowsedFood)
+        self.foodBrowserEditButton.pack(side=BOTTOM, ipadx=10, ipady=5)
 
+        self.foodBrowserScrollbar = ttk.Scrollbar(self.foodBrowserWindow, orient=VERTICAL, command=self.scrollFoodBrowser)
+        self.foodBrowserScrollbar.pack(side=RIGHT, fill='y')
 
+        columns = [column for column, heading, width in GUI.FOOD_BROWSER_COLUMNS]
+        self.foodBrowserTree = ttk.Treeview(self.foodBrowserWindow, columns=columns, show="headings", selectmode="browse",
+                                            height=GUI.FOOD_BROWSER_ROWS)
+        self.foodBrowserTree.pack(expand=True, fill='both')
 
+        for column, heading, width in GUI.FOOD_BROWSER_COLUMNS:
+            self.foodBrowserTree.heading(column, text=heading, command=lambda field=column: self.sortFoodBrowser(field))
+            self.foodBrowserTree.column(column, width=width, stretch=(column == "description"))
 
+        self.foodBrowserItems = [self.foodBrowserTree.insert("", END) for row in range(GUI.FOOD_BROWSER_ROWS)]
+        self.foodBrowserItemBarcodes = {}
+
+        self.foodBrowserTree.bind("<<TreeviewSelect>>", self.onFoodBrowserSelectEvent)
+        self.foodBrowserTree.bind("<Double-1>", self.editBrowsedFood)
+        self.foodBrowserTree.bind("<Return>", self.editBrowsedFood)
+        self.foodBrowserTree.bind("<MouseWheel>", self.onFoodBrowserWheelEvent)
+        self.foodBrowserTree.bind("<Button-4>", self.onFoodBrowserWheelEvent)
+        self.foodBrowserTree.bind("<Button-5>", self.onFoodBrowserWheelEvent)
+        self.foodBrowserTree.bind("<Up>", lambda event: self.moveFoodBrowserSelection(-1))
+        self.foodBrowserTree.bind("<Down>", lambda event: self.moveFoodBrowserSelection(1))
+        self.foodBrowserTree.bind("<Prior>", lambda event: self.moveFoodBrowserSelection(-GUI.FOOD_BROWSER_ROWS))
+        self.foodBrowserTree.bind("<Next>", lambda event: self.moveFoodBrowserSelection(GUI.FOOD_BROWSER_ROWS))
+        self.foodBrowserTree.bind("<Home>", lambda event: self.moveFoodBrowserSelection(-len(self.foodBrowserView or ())))
+        self.foodBrowserTree.bind("<End>", lambda event: self.moveFoodBrowserSelection(len(self.foodBrowserView or ())))
+        # Shows changes made from the update window once the browser has the focus again.
+        self.foodBrowserWindow.bind("<FocusIn>", self.onFoodBrowserFocusEvent)
+
+        self.renderFoodBrowser()
+        self.sortFoodBrowser("description")
+        self.foodBrowserSearchEntry.focus()
+
+    def sortFoodBrowser(self, field):
+        """Sorts the food browser by a field, or reverses the sort if it is already sorted by that field.
+            The sort order is read on a background thread, as the sorted index behind it is built the first time.
+
+        Args:
+            field (string): One of CaloriePal.SORT_FIELDS.
+        """
+        if self._foodBrowserSorter is not None and self._foodBrowserSorter.is_alive(): return
+
+        view = self.foodBrowserView
+        descending = view is not None and view.sortField == field and not view.descending
+
+        self.foodBrowserCountLabel.config(text="Sorting...")
+        self._foodBrowserSortedBarcodes = None
+        self._foodBrowserSortError = None
+        self._foodBrowserSorter = threading.Thread(target=self._readFoodBrowserSortOrder, args=(field, descending),
+                                                   name="FoodBrowserSorter", daemon=True)
+        self._foodBrowserSorter.start()
+        self.foodBrowserWindow.after(GUI.LOAD_POLL_MS, self._checkFoodBrowserSorted, self.foodBrowserWindow, field, descending)
+
+    def _readFoodBrowserSortOrder(self, field, descending):
+        try:
+            self._foodBrowserSortedBarcodes = self.calPal.getSortOrder(field, descending)
+        except Exception as err:
+            self._foodBrowserSortError = err
+
+    def _checkFoodBrowserSorted(self, window, field, descending):
+        if window is not self.foodBrowserWindow or not window.winfo_exists(): return
+
+        if self._foodBrowserSorter.is_alive():
+            window.after(GUI.LOAD_POLL_MS, self._checkFoodBrowserSorted, window, field, descending)
+            return
+
+        if self._foodBrowserSortError is not None:
+            messagebox.showerror(window.title(), f"Foods could not be sorted.\n\nError: {self._foodBrowserSortError}", parent=window)
+            self.renderFoodBrowser()
+            return
+
+        if self.foodBrowserView is None:
+            from foodBrowser import FoodBrowserView
+            self.foodBrowserView = FoodBrowserView(self.calPal, field, descending, self._foodBrowserSortedBarcodes)
+            self.foodBrowserView.search(self.foodBrowserSearchEntry.get())
+        else:
+            self.foodBrowserView.sort(field, descending, self._foodBrowserSortedBarcodes)
+
+        for column, heading, width in GUI.FOOD_BROWSER_COLUMNS:
+            if column == field: heading += " \u25bc" if descending else " \u25b2"
+            self.foodBrowserTree.heading(column, text=heading)
+
+        self.foodBrowserTop = 0
+        self.renderFoodBrowser()
+        self._stepFoodBrowserSearch()
+
+    def onFoodBrowserSearchEvent(self, event=None):
+        # Waits for a pause in typing, so a search runs once for a burst of key presses.
+        if self._foodBrowserSearchJob is not None: self.foodBrowserWindow.after_cancel(self._foodBrowserSearchJob)
+        self._foodBrowserSearchJob = self.foodBrowserWindow.after(GUI.FOOD_BROWSER_SEARCH_DELAY_MS, self.searchFoodBrowser)
+
+    def searchFoodBrowser(self):
+        self._foodBrowserSearchJob = None
+        if self.foodBrowserView is None or not self.foodBrowserWindow.winfo_exists(): return
+
+        if self.foodBrowserView.search(self.foodBrowserSearchEntry.get()):
+            self.foodBrowserTop = 0
+            self.renderFoodBrowser()
+            self._stepFoodBrowserSearch()
+
+    def _stepFoodBrowserSearch(self):
+        """Runs a step of the current search each time Tk is idle, showing the foods found so far, until it is finished.
+        """
+        if self._foodBrowserSearching: return
+        self._foodBrowserSearching = True
+        self.foodBrowserWindow.after(1, self._runFoodBrowserSearchStep, self.foodBrowserWindow)
+
+    def _runFoodBrowserSearchStep(self, window):
+        if window is not self.foodBrowserWindow or not window.winfo_exists(): return
+
+        # A sort being read holds the food data lock, and starts the search over once it is done anyway.
+        if self._foodBrowserSorter.is_alive():
+            window.after(GUI.LOAD_POLL_MS, self._runFoodBrowserSearchStep, window)
+            return
+
+        finished = self.foodBrowserView.searchStep()
+        self.renderFoodBrowser()
+
+        if finished:
+            self._foodBrowserSearching = False
+        else:
+            window.after(1, self._runFoodBrowserSearchStep, window)
+
+    def renderFoodBrowser(self):
+        """Fills the rows of the food browser from the foods scrolled into view.
+        """
+        view = self.foodBrowserView
+        count = 0 if view is None else len(view)
+
+        self.foodBrowserTop = max(0, min(self.foodBrowserTop, count - GUI.FOOD_BROWSER_ROWS))
+        rows = [] if view is None else view.rows(self.foodBrowserTop, GUI.FOOD_BROWSER_ROWS)
+        self.foodBrowserItemBarcodes = {}
+
+        for position, item in enumerate(self.foodBrowserItems):
+            if position >= len(rows):
+                self.foodBrowserTree.detach(item)
+                continue
+
+            barcode, food = rows[position]
+            if food is None:
+                values = (barcode, "(removed)", "", "")
+            else:
+                values = (barcode, food.description, food.caloriesPerServing, f"{food.servingSize} {food.servingSizeUom.code}")
+
+            self.foodBrowserTree.item(item, values=values)
+            self.foodBrowserTree.move(item, "", position)
+            self.foodBrowserItemBarcodes[item] = barcode
+
+        selectedItem = next((item for item, barcode in self.foodBrowserItemBarcodes.items() if barcode == self.foodBrowserSelected), None)
+        if selectedItem is None:
+            self.foodBrowserTree.selection_remove(self.foodBrowserTree.selection())
+        else:
+            self.foodBrowserTree.selection_set(selectedItem)
+            self.foodBrowserTree.focus(selectedItem)
+
+        if count > 0:
+            self.foodBrowserScrollbar.set(self.foodBrowserTop / count, min(1.0, (self.foodBrowserTop + GUI.FOOD_BROWSER_ROWS) / count))
+        else:
+            self.foodBrowserScrollbar.set(0.0, 1.0)
+
+        if view is None:
+            countText = "Sorting..."
+        elif view.searching:
+            countText = f"Searching... {count:,} found"
+        elif len(view.query) > 0:
+            countText = f"{count:,} found"
+        else:
+            countText = f"{count:,} foods"
+        self.foodBrowserCountLabel.config(text=countText)
+
+    def scrollFoodBrowser(self, action, amount, unit=None):
+        if self.foodBrowserView is None: return
+
+        if action == "moveto":
+            self.foodBrowserTop = int(float(amount) * len(self.foodBrowserView))
+        else:
+            self.foodBrowserTop += int(amount) * (GUI.FOOD_BROWSER_ROWS if unit == "pages" else 1)
+
+        self.renderFoodBrowser()
+
+    def onFoodBrowserWheelEvent(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scrollFoodBrowser("scroll", -GUI.FOOD_BROWSER_WHEEL_ROWS)
+        else:
+            self.scrollFoodBrowser("scroll", GUI.FOOD_BROWSER_WHEEL_ROWS)
+        return "break"
+
+    def onFoodBrowserSelectEvent(self, event=None):
+        # Rows emptied or scrolled out of view are deselected, the food selected stays selected until another row is.
+        for item in self.foodBrowserTree.selection():
+            self.foodBrowserSelected = self.foodBrowserItemBarcodes.get(item, self.foodBrowserSelected)
+
+    def moveFoodBrowserSelection(self, rows):
+        """Moves the selection up or down, scrolling it into view.
+
+        Args:
+            rows (int): Rows to move by, negative to move up.
+        """
+        view = self.foodBrowserView
+        if view is None or len(view) <= 0: return "break"
+
+        visibleBarcodes = list(self.foodBrowserItemBarcodes.values())
+        if self.foodBrowserSelected in visibleBarcodes:
+            position = self.foodBrowserTop + visibleBarcodes.index(self.foodBrowserSelected) + rows
+        else:
+            position = self.foodBrowserTop
+
+        position = max(0, min(position, len(view) - 1))
+        if position < self.foodBrowserTop: self.foodBrowserTop = position
+        if position >= self.foodBrowserTop + GUI.FOOD_BROWSER_ROWS: self.foodBrowserTop = position - GUI.FOOD_BROWSER_ROWS + 1
+
+        self.foodBrowserSelected = view.barcodes[position]
+        self.renderFoodBrowser()
+        return "break"
+
+    def onFoodBrowserFocusEvent(self, event=None):
+        self.renderFoodBrowser()
+
+    def refreshFoodBrowser(self):
+        """Re-reads the sort order of an open food browser, so foods added or with a changed sort value are shown in place.
+        """
+        if self.foodBrowserWindow is None or not self.foodBrowserWindow.winfo_exists(): return
+        if self.foodBrowserView is None: return
+        # A sort being read picks up the change already.
+        if self._foodBrowserSorter is not None and self._foodBrowserSorter.is_alive(): return
+
+        self.foodBrowserView.refresh()
+        self.renderFoodBrowser()
+        self._stepFoodBrowserSearch()
+
+    def editBrowsedFood(self, event=None):
+        barcode = self.foodBrowserSelected
+        if barcode is None:
+            messagebox.showinfo(self.foodBrowserWindow.title(), "Select an item to edit.", parent=self.foodBrowserWindow)
+            return
+
+        if barcode not in self.calPal.foodData:
+            messagebox.showinfo(self.foodBrowserWindow.title(), "This item has been removed.", parent=self.foodBrowserWindow)
+            return
+
+        self.barcodeValue = barcode
+        self.openUpdateFoodWindow()
 
     def openAddFoodWindow(self):
         self.addNewFoodWindow = Toplevel(self.mainWindow)
@@ -271,10 +895,10 @@ class GUI:
 
         if insertValues:
             uomName = self.calPal.foodData[self.barcodeValue].servingSizeUom.name
+            uom = self.calPal.servingUoms.findByName(uomName)
 
-            for x, uom in enumerate(self.calPal.servingUoms):
-                if uomName == uom.name:
-                    self.foodServingSizeUomCombobox.current(x)
+            if uom is not None:
+                self.foodServingSizeUomCombobox.current(self.calPal.servingUoms.index(uom))
 
         self.foodDescriptionEntry.focus()
 
@@ -284,11 +908,7 @@ class GUI:
         Args:
             index (int, optional): Used to set selected item in the combobox by item index. Defaults to 0.
         """
-        values = []
-        for uom in self.calPal.servingUoms:
-            values.append(uom.name)
-
-        self.foodServingSizeUomCombobox['values'] = tuple(values)
+        self.foodServingSizeUomCombobox['values'] = self.calPal.servingUoms.names()
         self.foodServingSizeUomCombobox.current(index)
 
     def validateFoodWindow(self):
@@ -303,47 +923,71 @@ class GUI:
         return formValid
 
     def addFood(self, event=None):
-        if not self.validateFoodWindow():
-            messagebox.showerror(self.addNewFoodWindow.title(), "All fields are required.", parent=self.addNewFoodWindow)
+        food = self._readFoodWindow(self.addNewFoodWindow, "added")
+        if food is None: return
+
+        try:
+            self.calPal.addFood(food)
+        except Exception as err:
+            messagebox.showerror(self.addNewFoodWindow.title(), f"Could not add item to database.\n\nError: {err}", parent=self.addNewFoodWindow)
             return
 
+        messagebox.showinfo(self.addNewFoodWindow.title(), "Item added.", parent=self.addNewFoodWindow)
+        self.addNewFoodWindow.destroy()
+        self.refreshFoodBrowser()
+        return
+    
+    def updateFood(self, event=None):
+        food = self._readFoodWindow(self.updateFoodWindow, "updated")
+        if food is None: return
+
+        try:
+            self.calPal.updateFood(food)
+        except Exception as err:
+            messagebox.showerror(self.updateFoodWindow.title(), f"Could not update item in database.\n\nError: {err}", parent=self.updateFoodWindow)
+            return
+
+        messagebox.showinfo(self.updateFoodWindow.title(), "Item updated.", parent=self.updateFoodWindow)
+        self.updateFoodWindow.destroy()
+        self.refreshFoodBrowser()
+        return
+
+    def _readFoodWindow(self, parentWindow, action):
+        """Builds a food from the fields of an add or update food window, showing an error if they are not valid.
+
+        Args:
+            parentWindow (Toplevel Object): Window holding the fields.
+            action (string): What is done with the food, used in the error messages, such as "added".
+
+        Returns:
+            Food Object: Returns the food, None if an error was shown.
+        """
+        if not self.validateFoodWindow():
+            messagebox.showerror(parentWindow.title(), "All fields are required.", parent=parentWindow)
+            return None
+
         #TODO: Write a more detailed error msg.
         uomName = self.foodServingSizeUomValue.get()
         if uomName == None or len(uomName) <= 0:
             err = "Serving UOM combobox returned a value of 'None'."
-            messagebox.showerror(self.addNewFoodWindow.title(), f"An internal error ocurred. Item will not be added. Error: {err}",
-                                    parent=self.addNewFoodWindow)
-            return
+            messagebox.showerror(parentWindow.title(), f"An internal error ocurred. Item will not be {action}. Error: {err}",
+                                    parent=parentWindow)
+            return None
 
         selectedUom = self.calPal.findUomByName(uomName)
         if selectedUom == None:
             err = f"findUomByName('{uomName}') returned 'None'."
-            messagebox.showerror(self.addNewFoodWindow.title(), f"An internal error ocurred. Item will not be added. Error: {err}",
-                                    parent=self.addNewFoodWindow)
-            return
+            messagebox.showerror(parentWindow.title(), f"An internal error ocurred. Item will not be {action}. Error: {err}",
+                                    parent=parentWindow)
+            return None
 
-        food = Food(self.barcodeEntry.get().strip(),
+        from caloriePal import Food
+        return Food(self.barcodeEntry.get().strip(),
                     self.foodDescriptionEntry.get().strip(),
                     self.foodDetailedDescriptionEntry.get(GUI.FLOAT_START, END).strip(),
                     self.foodCaloriesPerServingEntry.get().strip(),
                     self.foodServingSizeEntry.get().strip(),
                     selectedUom)
-        
-        try:
-            self.calPal.addFood(food)
-        except Exception as err:
-            messagebox.showerror(self.addNewFoodWindow.title(), f"Could not add item to database.\n\nError: {err}", parent=self.addNewFoodWindow)
-            return
-
-        messagebox.showinfo(self.addNewFoodWindow.title(), "Item added.", parent=self.addNewFoodWindow)
-        self.addNewFoodWindow.destroy()
-        return
-    
-    def updateFood(self, event=None):
-        #TODO: Code updateFood().
-        messagebox.showinfo(self.updateFoodWindow.title(), "Item updated.", parent=self.updateFoodWindow)
-        self.updateFoodWindow.destroy()
-        return
 
     def openAddUomWindow(self):
         self.addUomWindow = Toplevel(self.mainWindow)
@@ -408,14 +1052,15 @@ class GUI:
         uomName = self.uomWindowNameEntry.get().strip()
         uomCode = self.uomWindowCodeEntry.get().strip()
 
-        for uom in self.calPal.servingUoms:
-            if uomName == uom.name or uomCode == uom.code:
-                messagebox.showerror(self.addUomWindow.title(), "A UOM with this name and or code already exists.", parent=self.addUomWindow)
-                return
-        
+        from caloriePal import ServingUom
         uom = ServingUom(uomName, uomCode)
 
-        self.calPal.addUom(uom)
+        try:
+            self.calPal.addUom(uom)
+        except ValueError:
+            messagebox.showerror(self.addUomWindow.title(), "A UOM with this name and or code already exists.", parent=self.addUomWindow)
+            return
+
         self.updateFoodServingUomCombobox(index = len(self.calPal.servingUoms) - 1)
         # messagebox.showinfo(self.addUomWindow.title(), "UOM added.", parent=self.addUomWindow)
         self.addUomWindow.destroy()
@@ -445,7 +1090,15 @@ class GUI:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs Calorie Pal.")
+    parser.add_argument("--profile-startup", action="store_true", help="Prints how long each phase of startup takes.")
+    args = parser.parse_args()
+
+    profile = StartupProfile(STARTUP_TIME) if args.profile_startup else None
+    if profile is not None: profile.mark("imports")
+
     root = Tk()
-    calPal = CaloriePal()
-    app = GUI(root, calPal)
+    if profile is not None: profile.mark("Tk")
+
+    app = GUI(root, profile)
     root.mainloop()
\ No newline at end of file
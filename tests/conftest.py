@@ -0,0 +1,63 @@
+"""Fixtures shared by the CaloriePal tests.
+
+The modules live at the top of the repository, so it is put on the import path for the tests.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caloriePal import CaloriePal
+
+SERVING_UOMS = [
+    {'name': 'Grams', 'code': 'g'},
+    {'name': 'Pounds', 'code': 'lbs'},
+    {'name': 'Ounce', 'code': 'oz'}
+]
+
+def makeFoodData(count):
+    """Creates food data laid out like a food data file, with a dictionary of barcode to record.
+    """
+    foodData = {}
+
+    for x in range(count):
+        foodData[f"food-{x:04d}"] = {
+            'description': f"Food {x}",
+            'detailedDescription': f"Détails \"{x}\" {{}}, 中",
+            'caloriesPerServing': (x * 37) % 900,
+            'servingSize': 10 + x % 240,
+            'servingSizeUom': dict(SERVING_UOMS[x % len(SERVING_UOMS)])
+        }
+
+    return {'servingUoms': [dict(uom) for uom in SERVING_UOMS], 'foodData': foodData}
+
+@pytest.fixture
+def workDir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory, where CaloriePal keeps FoodData.json and Settings.json.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def openCalPal(workDir):
+    """Returns a function creating a CaloriePal with the settings provided. Saves are written before a change returns,
+        rather than by the background saver, unless the settings say otherwise.
+    """
+    opened = []
+
+    def openCalPal(**settings):
+        with open("Settings.json", mode="w") as f:
+            f.write(json.dumps({'writeBehindEnabled': False, **settings}))
+
+        calPal = CaloriePal()
+        opened.append(calPal)
+        return calPal
+
+    yield openCalPal
+
+    for calPal in opened:
+        calPal.flush()
+        calPal.storage.close()
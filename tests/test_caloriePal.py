@@ -0,0 +1,139 @@
+import os.path
+
+import pytest
+
+from caloriePal import Food, ServingUom
+from foodJournal import FoodJournal
+
+STORAGE_SETTINGS = [
+    {},
+    {'journalEnabled': True},
+    {'lazyLoading': True},
+    {'foodDataFileFormat': 'normalized', 'foodDataFileCompression': 'gzip'},
+    {'storageBackend': 'sqlite'}
+]
+
+def makeFood(calPal, barcode, calories=100):
+    return Food(barcode, f"Food {barcode}", "Détails \"quoted\"", calories, 28, calPal.servingUoms.findByCode("g"))
+
+def storedCalories(calPal):
+    return {barcode: food.caloriesPerServing for barcode, food in calPal.foodData.items()}
+
+@pytest.mark.parametrize("settings", STORAGE_SETTINGS)
+def testChangesPersistAcrossReads(openCalPal, settings):
+    calPal = openCalPal(**settings)
+    for x in range(5):
+        calPal.addFood(makeFood(calPal, f"food-{x}", x))
+
+    calPal.updateFood(makeFood(calPal, "food-1", 500))
+    calPal.removeFood(makeFood(calPal, "food-3"))
+    calPal.addUom(ServingUom("Kilograms", "kg"))
+    calPal.flush()
+
+    calPal = openCalPal(**settings)
+    assert storedCalories(calPal) == {"food-0": 0, "food-1": 500, "food-2": 2, "food-4": 4}
+    assert calPal.findFoodDataByBarcode("food-2").servingSizeUom.code == "g"
+    if settings.get('storageBackend') == "sqlite" or settings.get('journalEnabled'):
+        assert calPal.servingUoms.findByCode("kg") is not None
+
+def testJournalReplayedOnRead(openCalPal):
+    calPal = openCalPal(journalEnabled=True)
+    calPal.addFood(makeFood(calPal, "food-1"))
+    calPal.removeFood(makeFood(calPal, "food-1"))
+    calPal.addFood(makeFood(calPal, "food-2", 250))
+
+    # Single changes are journaled rather than written to the food data file.
+    assert [change['op'] for change in calPal.storage.readChanges()] == [FoodJournal.ADD, FoodJournal.REMOVE, FoodJournal.ADD]
+    assert os.path.exists(calPal.foodDataFilePath + FoodJournal.FILE_SUFFIX)
+
+    calPal = openCalPal(journalEnabled=True)
+    assert storedCalories(calPal) == {"food-2": 250}
+
+@pytest.mark.parametrize("settings", STORAGE_SETTINGS)
+def testBatchPersistsOnExit(openCalPal, settings):
+    calPal = openCalPal(**settings)
+
+    with calPal.batch():
+        for x in range(3):
+            calPal.addFood(makeFood(calPal, f"food-{x}", x))
+        calPal.removeFood(makeFood(calPal, "food-0"))
+
+    calPal = openCalPal(**settings)
+    assert storedCalories(calPal) == {"food-1": 1, "food-2": 2}
+
+def testJournaledBatchWritesChangesOnce(openCalPal, monkeypatch):
+    calPal = openCalPal(journalEnabled=True)
+    writes = []
+    writeChanges = calPal.storage.writeChanges
+    monkeypatch.setattr(calPal.storage, "writeChanges", lambda changes: writes.append(list(changes)) or writeChanges(changes))
+
+    with calPal.batch():
+        calPal.addFood(makeFood(calPal, "food-1"))
+
+        # A batch inside a batch joins the outer one.
+        with calPal.batch():
+            calPal.addFood(makeFood(calPal, "food-2"))
+        assert writes == []
+
+    assert [[key for op, key, data in changes] for changes in writes] == [["food-1", "food-2"]]
+
+def testBatchRolledBackOnError(openCalPal):
+    calPal = openCalPal()
+    calPal.addFood(makeFood(calPal, "food-1", 100))
+    calPal.addFood(makeFood(calPal, "food-2", 200))
+
+    with pytest.raises(RuntimeError):
+        with calPal.batch():
+            calPal.updateFood(makeFood(calPal, "food-1", 999))
+            calPal.removeFood(makeFood(calPal, "food-2"))
+            calPal.addFood(makeFood(calPal, "food-3", 300))
+            calPal.addUom(ServingUom("Kilograms", "kg"))
+            raise RuntimeError("stop")
+
+    assert storedCalories(calPal) == {"food-1": 100, "food-2": 200}
+    assert calPal.servingUoms.findByCode("kg") is None
+    assert calPal.searchFoods("food-3") == []
+    assert [food.barcode for food in calPal.searchFoods("food-2")] == ["food-2"]
+
+    calPal = openCalPal()
+    assert storedCalories(calPal) == {"food-1": 100, "food-2": 200}
+
+def testBatchRolledBackWhenSnapshotFails(openCalPal, monkeypatch):
+    calPal = openCalPal()
+    calPal.addFood(makeFood(calPal, "food-1", 100))
+    writeFragments = calPal.storage.writeFragments
+
+    def failWrite(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(calPal.storage, "writeFragments", failWrite)
+
+    with pytest.raises(OSError):
+        with calPal.batch():
+            calPal.updateFood(makeFood(calPal, "food-1", 999))
+            calPal.addFood(makeFood(calPal, "food-2", 200))
+
+    assert storedCalories(calPal) == {"food-1": 100}
+
+    # The next save writes the restored foods, not the fragments encoded for the failed batch.
+    monkeypatch.setattr(calPal.storage, "writeFragments", writeFragments)
+    calPal.addFood(makeFood(calPal, "food-3", 300))
+    calPal = openCalPal()
+    assert storedCalories(calPal) == {"food-1": 100, "food-3": 300}
+
+def testBatchRolledBackWhenJournalFails(openCalPal, monkeypatch):
+    calPal = openCalPal(journalEnabled=True)
+    calPal.addFood(makeFood(calPal, "food-1", 100))
+
+    def failWrite(changes):
+        raise OSError("disk full")
+    monkeypatch.setattr(calPal.storage, "writeChanges", failWrite)
+
+    with pytest.raises(OSError):
+        with calPal.batch():
+            calPal.removeFood(makeFood(calPal, "food-1"))
+            calPal.addFood(makeFood(calPal, "food-2", 200))
+
+    assert storedCalories(calPal) == {"food-1": 100}
+
+    calPal = openCalPal(journalEnabled=True)
+    assert storedCalories(calPal) == {"food-1": 100}
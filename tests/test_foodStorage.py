@@ -0,0 +1,179 @@
+import pytest
+
+from conftest import makeFoodData
+from foodJournal import FoodJournal
+from foodStorage import (COMPRESSIONS, FILE_FORMATS, FoodStorage, JsonFoodStorage, JsonRecordIndex, SqliteFoodStorage,
+                         SqliteRecordMapping, readRecordRange)
+
+@pytest.mark.parametrize("fileFormat", FILE_FORMATS)
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def testJsonRoundTrip(workDir, fileFormat, compression):
+    data = makeFoodData(20)
+    storage = JsonFoodStorage("FoodData.json", fileFormat=fileFormat, compression=compression)
+    storage.writeSnapshot(data)
+
+    # Any format is read whatever the storage writes.
+    assert JsonFoodStorage("FoodData.json").read() == data
+
+    servingUoms, records = JsonFoodStorage("FoodData.json").readIncrementally()
+    records = list(records)
+    assert servingUoms == data['servingUoms']
+    assert {barcode: record for barcode, record, progress in records} == data['foodData']
+    assert records[-1][2] == 1.0
+
+def testJsonReadMissingOrDamagedFile(workDir):
+    storage = JsonFoodStorage("FoodData.json")
+    assert storage.read() is None
+    assert storage.readIncrementally() is None
+
+    with open("FoodData.json", mode="w") as f:
+        f.write('{"servingUoms": [], "foodData": {"a": ')
+    assert storage.read() is None
+
+def testForFileChoosesBackendByExtension(workDir):
+    assert isinstance(FoodStorage.forFile("FoodData.json"), JsonFoodStorage)
+
+    storage = FoodStorage.forFile("FoodData.db")
+    assert isinstance(storage, SqliteFoodStorage)
+    storage.close()
+
+def testJournalRecordsChangesUntilSnapshot(workDir):
+    storage = JsonFoodStorage("FoodData.json", journalEnabled=True)
+    storage.writeSnapshot(makeFoodData(3))
+    fingerprint = storage.fingerprint()
+
+    record = makeFoodData(1)['foodData']['food-0000']
+    assert storage.writeChange(FoodJournal.ADD, "new", record)
+    assert storage.writeChanges([(FoodJournal.REMOVE, "food-0001", None), (FoodJournal.ADD_UOM, "kg", {'name': 'Kilograms', 'code': 'kg'})])
+    assert storage.fingerprint() != fingerprint
+
+    assert list(storage.readChanges()) == [
+        {'op': FoodJournal.ADD, 'key': "new", 'data': record},
+        {'op': FoodJournal.REMOVE, 'key': "food-0001"},
+        {'op': FoodJournal.ADD_UOM, 'key': "kg", 'data': {'name': 'Kilograms', 'code': 'kg'}}
+    ]
+
+    # A snapshot written after the journal is rotated folds the changes in, and clears the journal.
+    storage.beginSnapshot()
+    storage.writeSnapshot(makeFoodData(3))
+    assert list(storage.readChanges()) == []
+
+def testJournalSkipsLineCutShort(workDir):
+    storage = JsonFoodStorage("FoodData.json", journalEnabled=True)
+    storage.writeChange(FoodJournal.REMOVE, "food-0001")
+
+    with open(storage.journal.filePath, mode="a") as f:
+        f.write('{"op": "remove", "ke')
+
+    assert list(storage.readChanges()) == [{'op': FoodJournal.REMOVE, 'key': "food-0001"}]
+
+def testChangesNeedSnapshotWithoutJournal(workDir):
+    storage = JsonFoodStorage("FoodData.json")
+    assert not storage.writeChange(FoodJournal.REMOVE, "food-0001")
+    assert not storage.writeChanges([(FoodJournal.REMOVE, "food-0001", None)])
+
+@pytest.mark.parametrize("fileFormat", FILE_FORMATS)
+def testLazyRecordsReadOnDemand(workDir, fileFormat):
+    data = makeFoodData(20)
+    JsonFoodStorage("FoodData.json", fileFormat=fileFormat).writeSnapshot(data)
+
+    storage = JsonFoodStorage("FoodData.json", lazyLoading=True)
+    records = storage.read()['foodData']
+
+    assert isinstance(records, JsonRecordIndex)
+    assert len(records) == 20
+    assert records["food-0007"] == data['foodData']["food-0007"]
+    assert records.page(5, 3) == ["food-0005", "food-0006", "food-0007"]
+    assert records.position("food-0012") == 12
+    assert dict(records.iterRecords()) == data['foodData']
+
+def testLazyOffsetsFollowWrites(workDir):
+    data = makeFoodData(20)
+    storage = JsonFoodStorage("FoodData.json", lazyLoading=True)
+    storage.writeSnapshot(data)
+    records = storage.read()['foodData']
+
+    data['foodData']["food-0003"]['description'] = "A much longer description than the one written before"
+    storage.writeSnapshot(data)
+
+    assert records["food-0003"] == data['foodData']["food-0003"]
+    assert records["food-0019"] == data['foodData']["food-0019"]
+
+def testLazyLoadingReadsCompressedFileInFull(workDir):
+    JsonFoodStorage("FoodData.json", compression="gzip").writeSnapshot(makeFoodData(5))
+
+    storage = JsonFoodStorage("FoodData.json", lazyLoading=True)
+    assert isinstance(storage.read()['foodData'], dict)
+    assert not storage.LAZY_RECORDS
+
+def testSqliteRoundTrip(workDir):
+    data = makeFoodData(20)
+    storage = SqliteFoodStorage("FoodData.db")
+    assert storage.read() is None
+
+    storage.writeSnapshot(data)
+    read = storage.read()
+
+    assert read['servingUoms'] == data['servingUoms']
+    assert isinstance(read['foodData'], SqliteRecordMapping)
+    assert dict(read['foodData'].iterRecords()) == data['foodData']
+    assert list(read['foodData']) == sorted(data['foodData'])
+    assert read['foodData'].page(2, 2) == ["food-0002", "food-0003"]
+    assert read['foodData'].position("food-0010") == 10
+    storage.close()
+
+def testSqliteWritesChangesToRows(workDir):
+    storage = SqliteFoodStorage("FoodData.db")
+    storage.writeSnapshot(makeFoodData(3))
+
+    record = dict(makeFoodData(1)['foodData']['food-0000'], description="Changed")
+    assert storage.writeChanges([
+        (FoodJournal.UPDATE, "food-0000", record),
+        (FoodJournal.REMOVE, "food-0001", None),
+        (FoodJournal.ADD_UOM, "kg", {'name': 'Kilograms', 'code': 'kg', 'dimension': 'mass', 'factor': 1000.0})
+    ])
+    storage.close()
+
+    read = SqliteFoodStorage("FoodData.db").read()
+    assert read['foodData']["food-0000"] == record
+    assert "food-0001" not in read['foodData']
+    assert read['servingUoms'][-1] == {'name': 'Kilograms', 'code': 'kg', 'dimension': 'mass', 'factor': 1000.0}
+
+def testSqliteIteratesMoreRowsThanOneFetch(workDir, monkeypatch):
+    monkeypatch.setattr(SqliteRecordMapping, "FETCH_SIZE", 3)
+    storage = SqliteFoodStorage("FoodData.db")
+    storage.writeSnapshot(makeFoodData(10))
+
+    records = storage.read()['foodData']
+    assert len(list(records)) == 10
+    assert len(list(records.iterRecords())) == 10
+    storage.close()
+
+@pytest.mark.parametrize("fileFormat", FILE_FORMATS)
+def testSplitRecordsIntoRanges(workDir, fileFormat):
+    data = makeFoodData(200)
+    JsonFoodStorage("FoodData.json", fileFormat=fileFormat).writeSnapshot(data)
+
+    servingUoms, layout, ranges = JsonFoodStorage("FoodData.json").splitRecords(8, minPartSize=1)
+    uomsByCode = {uom['code']: uom for uom in servingUoms} if layout is not None else None
+
+    assert 1 < len(ranges) <= 8
+    assert ranges[-1][1] is None
+    assert [pair for start, end in ranges for pair in readRecordRange("FoodData.json", start, end, uomsByCode)] == list(data['foodData'].items())
+
+def testRangeCutInsideRecordIsRejected(workDir):
+    JsonFoodStorage("FoodData.json", fileFormat="compact").writeSnapshot(makeFoodData(20))
+    servingUoms, layout, ranges = JsonFoodStorage("FoodData.json").splitRecords(2, minPartSize=1)
+    start, end = ranges[0]
+
+    with pytest.raises(ValueError):
+        list(readRecordRange("FoodData.json", start, end - 10))
+
+def testSplitRecordsOnlyForPlainFiles(workDir):
+    JsonFoodStorage("FoodData.json", compression="gzip").writeSnapshot(makeFoodData(200))
+    assert JsonFoodStorage("FoodData.json").splitRecords(8, minPartSize=1) is None
+
+    JsonFoodStorage("FoodData.json").writeSnapshot(makeFoodData(200))
+    assert JsonFoodStorage("FoodData.json", lazyLoading=True).splitRecords(8, minPartSize=1) is None
+    # Too small for more than one range.
+    assert JsonFoodStorage("FoodData.json").splitRecords(8) is None
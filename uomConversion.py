@@ -0,0 +1,202 @@
+import math
+
+MASS = "mass"
+VOLUME = "volume"
+COUNT = "count"
+DIMENSIONS = (MASS, VOLUME, COUNT)
+
+# Base unit of each dimension: grams for mass, millilitres for volume and single items for count.
+# Factors give the size of one unit in the base unit of its dimension.
+STANDARD_CONVERSIONS = {
+    'mg': (MASS, 0.001),
+    'g': (MASS, 1.0),
+    'kg': (MASS, 1000.0),
+    'oz': (MASS, 28.349523125),
+    'lb': (MASS, 453.59237),
+    'lbs': (MASS, 453.59237),
+    'ml': (VOLUME, 1.0),
+    'l': (VOLUME, 1000.0),
+    'tsp': (VOLUME, 4.92892159375),
+    'tbsp': (VOLUME, 14.78676478125),
+    'floz': (VOLUME, 29.5735295625),
+    'cup': (VOLUME, 236.5882365),
+    'pt': (VOLUME, 473.176473),
+    'qt': (VOLUME, 946.352946),
+    'ea': (COUNT, 1.0),
+    'each': (COUNT, 1.0),
+    'pc': (COUNT, 1.0),
+    'dozen': (COUNT, 12.0)
+}
+
+def standardConversion(code):
+    """Looks up the dimension and factor of a commonly used UOM code.
+
+    Args:
+        code (string): UOM abbreviation, compared case insensitively.
+
+    Returns:
+        tuple: Returns a tuple of (dimension, factor). Returns (None, None) if the code is not a standard unit.
+    """
+    if not isinstance(code, str): return (None, None)
+    return STANDARD_CONVERSIONS.get(code.strip().lower(), (None, None))
+
+def validateConversion(dimension, factor):
+    """Checks a UOM dimension and factor pair.
+
+    Args:
+        dimension (string): One of DIMENSIONS, or None for a UOM that can not be converted.
+        factor (float): Size of one unit in the base unit of the dimension, or None when dimension is None.
+
+    Raises:
+        ValueError: Raised if the dimension is unknown, or the factor is not a positive number.
+    """
+    if dimension is None and factor is None: return
+
+    if dimension not in DIMENSIONS: raise ValueError(f"Dimension must be one of {DIMENSIONS}, not '{dimension}'.")
+    if isinstance(factor, bool) or not isinstance(factor, (int, float)) or not math.isfinite(factor) or factor <= 0:
+        raise ValueError(f"Factor must be a positive number, not '{factor}'.")
+
+def toNumber(value):
+    """Converts an amount that may have been stored as text, as the GUI does, into a number.
+
+    Returns:
+        float: Returns the amount as a number. Returns None if it is not a finite number.
+    """
+    if isinstance(value, bool): return None
+    if isinstance(value, (int, float)): return value if math.isfinite(value) else None
+
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class UomConverter(object):
+    def __init__(self, servingUoms):
+        """Creates a new UomConverter object. Precomputes the conversion ratio between every pair of the UOMs provided,
+            so converting many serving sizes is a table lookup and a multiplication each.
+
+        Args:
+            servingUoms (iterable): ServingUom objects to convert between. Only the first UOM of each code is used.
+        """
+        self.codes = []
+        self.positions = {}
+        self.dimensions = []
+        self.factors = []
+
+        for servingUom in servingUoms:
+            if servingUom.code in self.positions: continue
+
+            self.positions[servingUom.code] = len(self.codes)
+            self.codes.append(servingUom.code)
+            self.dimensions.append(servingUom.dimension)
+            self.factors.append(servingUom.factor)
+
+        # matrix[i][j] converts an amount in codes[i] into codes[j]. None where the units can not be converted.
+        self.matrix = []
+        for fromDimension, fromFactor in zip(self.dimensions, self.factors):
+            row = []
+            for toDimension, toFactor in zip(self.dimensions, self.factors):
+                if fromDimension is None or fromDimension != toDimension:
+                    row.append(None)
+                else:
+                    row.append(fromFactor / toFactor)
+            self.matrix.append(row)
+
+    def ratio(self, fromUom, toUom):
+        """Returns the number to multiply an amount in fromUom by to get the amount in toUom.
+
+        Args:
+            fromUom (ServingUom Object): UOM to convert from.
+            toUom (ServingUom Object): UOM to convert to.
+
+        Returns:
+            float: Returns the conversion ratio. Returns None if either UOM is unknown or their dimensions differ.
+        """
+        fromPosition = self.positions.get(fromUom.code)
+        toPosition = self.positions.get(toUom.code)
+
+        if fromPosition is None or toPosition is None: return None
+        return self.matrix[fromPosition][toPosition]
+
+    def ratiosTo(self, toUom):
+        """Returns the column of the conversion matrix for a target UOM.
+
+        Args:
+            toUom (ServingUom Object): UOM to convert to.
+
+        Returns:
+            dict: Dictionary of UOM code to the ratio converting it into toUom. Codes that can not be converted are left out.
+        """
+        toPosition = self.positions.get(toUom.code)
+        if toPosition is None: return {}
+
+        ratios = {}
+        for code, row in zip(self.codes, self.matrix):
+            if row[toPosition] is not None: ratios[code] = row[toPosition]
+        return ratios
+
+    def ratiosToBase(self, dimension):
+        """Returns the ratio converting each UOM of a dimension into the base unit of that dimension.
+
+        Args:
+            dimension (string): One of DIMENSIONS.
+
+        Returns:
+            dict: Dictionary of UOM code to ratio. UOMs of other dimensions are left out.
+        """
+        return {code: factor for code, uomDimension, factor in zip(self.codes, self.dimensions, self.factors) if uomDimension == dimension}
+
+    def convert(self, amount, fromUom, toUom):
+        """Converts a single amount.
+
+        Returns:
+            float: Returns the converted amount. Returns None if the UOMs can not be converted.
+        """
+        ratio = self.ratio(fromUom, toUom)
+        amount = toNumber(amount)
+
+        if ratio is None or amount is None: return None
+        return amount * ratio
+
+    def convertMany(self, pairs, toUom):
+        """Converts many amounts into a single UOM.
+
+        Args:
+            pairs (iterable): Iterable of (amount, ServingUom) tuples, such as (food.servingSize, food.servingSizeUom).
+            toUom (ServingUom Object): UOM to convert to.
+
+        Returns:
+            list: Returns the converted amounts in the order provided. Holds None for amounts that can not be converted.
+        """
+        return UomConverter._applyRatios(pairs, self.ratiosTo(toUom))
+
+    def convertManyToBase(self, pairs, dimension):
+        """Converts many amounts into the base unit of a dimension, such as grams for MASS.
+
+        Args:
+            pairs (iterable): Iterable of (amount, ServingUom) tuples.
+            dimension (string): One of DIMENSIONS.
+
+        Returns:
+            list: Returns the converted amounts in the order provided. Holds None for amounts that can not be converted.
+        """
+        return UomConverter._applyRatios(pairs, self.ratiosToBase(dimension))
+
+    @staticmethod
+    def _applyRatios(pairs, ratios):
+        getRatio = ratios.get
+
+        converted = []
+        for amount, servingUom in pairs:
+            ratio = getRatio(servingUom.code)
+
+            if ratio is None:
+                converted.append(None)
+            elif type(amount) is int or (type(amount) is float and math.isfinite(amount)):
+                converted.append(amount * ratio)
+            else:
+                amount = toNumber(amount)
+                converted.append(None if amount is None else amount * ratio)
+        return converted